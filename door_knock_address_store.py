@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ * *
+ * This program is free software; you can redistribute it and/or modify  *
+ * it under the terms of the GNU General Public License as published by  *
+ * the Free Software Foundation; either version 2 of the License, or     *
+ * (at your option) any later version.                                   *
+ * *
+ ***************************************************************************/
+
+ Preprocessed address store for very large address lists (e.g. a state-wide
+ G-NAF snapshot). The addresses are written once into a folder of flat
+ binary columns sorted by the cell of a uniform grid, with the attributes
+ as JSON lines. The planner memory-maps the columns and reads only the
+ grid cells under the area of interest, so extraction cost follows the size
+ of the area rather than of the state.
+"""
+
+__author__ = 'Darren Green'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2025 by Darren Green'
+
+import json
+import math
+import os
+
+import numpy as np
+
+from .door_knock_fields import json_value
+
+STORE_VERSION = 1
+META_FILE = 'store.json'
+ATTRIBUTES_FILE = 'attributes.jsonl'
+# Attribute lines in layer order while a store is being built.
+UNSORTED_FILE = 'attributes.unsorted.jsonl'
+# Automatic cell size: about this many addresses per occupied cell.
+ADDRESSES_PER_CELL = 64
+MAX_CELLS = 4000000
+
+
+def write_store(path, fids, xy, attribute_rows, fields, crs_wkt, cell_size=0.0):
+    """
+    Writes an address store to the folder path. fids are the source feature
+    ids, xy the point coordinates in the CRS given by crs_wkt,
+    attribute_rows one list of JSON-ready values per address and fields a
+    list of (name, type name) pairs. A cell_size of 0 picks one giving about
+    ADDRESSES_PER_CELL addresses per cell.
+    """
+    def line(source):
+        return json.dumps(attribute_rows[source], ensure_ascii=False).encode('utf-8') + b'\n'
+    _write_store(path, fids, xy, line, fields, crs_wkt, cell_size)
+
+
+def _write_store(path, fids, xy, line, fields, crs_wkt, cell_size):
+    """
+    Writes the store, with line(i) giving the encoded attribute line of
+    address i.
+    """
+    fids = np.asarray(fids, dtype=np.int64)
+    xy = np.asarray(xy, dtype=float).reshape(-1, 2)
+    lower = xy.min(axis=0) if len(xy) else np.zeros(2)
+    span = np.maximum(xy.max(axis=0) - lower, 1e-9) if len(xy) else np.ones(2)
+    if not cell_size:
+        cell_size = math.sqrt(span[0] * span[1] * ADDRESSES_PER_CELL / max(len(xy), 1))
+    cell_size = max(cell_size, math.sqrt(span[0] * span[1] / MAX_CELLS), 1e-9)
+    shape = (np.floor(span / cell_size).astype(np.int64) + 1).tolist()
+
+    cell = _cells(xy, lower, cell_size, shape)
+    order = np.argsort(cell, kind='stable')
+    cell_start = np.zeros(shape[0] * shape[1] + 1, dtype=np.int64)
+    np.cumsum(np.bincount(cell, minlength=shape[0] * shape[1]), out=cell_start[1:])
+
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, 'fid.npy'), fids[order])
+    np.save(os.path.join(path, 'x.npy'), xy[order, 0])
+    np.save(os.path.join(path, 'y.npy'), xy[order, 1])
+    np.save(os.path.join(path, 'cell_start.npy'), cell_start)
+
+    offsets = np.zeros(len(order) + 1, dtype=np.int64)
+    with open(os.path.join(path, ATTRIBUTES_FILE), 'wb') as f:
+        for row, source in enumerate(order.tolist()):
+            encoded = line(source)
+            f.write(encoded)
+            offsets[row + 1] = offsets[row] + len(encoded)
+    np.save(os.path.join(path, 'attribute_offset.npy'), offsets)
+
+    meta = {
+        'version': STORE_VERSION, 'count': int(len(order)), 'crs': crs_wkt, 'fields': [list(f) for f in fields],
+        'origin': lower.tolist(), 'cell_size': float(cell_size), 'shape': shape,
+    }
+    with open(os.path.join(path, META_FILE), 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+
+
+def _cells(xy, lower, cell_size, shape):
+    cx = np.clip(((xy[:, 0] - lower[0]) // cell_size).astype(np.int64), 0, shape[0] - 1)
+    cy = np.clip(((xy[:, 1] - lower[1]) // cell_size).astype(np.int64), 0, shape[1] - 1)
+    return cy * shape[0] + cx
+
+
+def is_store(path):
+    return bool(path) and os.path.isfile(os.path.join(path, META_FILE))
+
+
+class AddressStore:
+    """
+    Read side of an address store. The coordinate columns are memory-mapped
+    and sorted by grid cell, so the addresses of a row of cells are one
+    contiguous slice; the rows returned by the queries index those columns.
+    """
+
+    def __init__(self, path):
+        with open(os.path.join(path, META_FILE), encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('version') != STORE_VERSION:
+            raise ValueError(f"'{path}' was written by a different version of the address store.")
+        self.path = path
+        self.count = meta['count']
+        self.crs_wkt = meta['crs']
+        self.field_specs = [tuple(f) for f in meta['fields']]
+        self.origin = np.array(meta['origin'], dtype=float)
+        self.cell_size = meta['cell_size']
+        self.shape = meta['shape']
+
+        def load(name):
+            return np.load(os.path.join(path, name), mmap_mode='r')
+
+        self.fid = load('fid.npy')
+        self.x = load('x.npy')
+        self.y = load('y.npy')
+        self.cell_start = load('cell_start.npy')
+        self.attribute_offset = load('attribute_offset.npy')
+        self._attributes = None
+        self._fields = None
+        self._crs = None
+
+    def __len__(self):
+        return self.count
+
+    def cell_range(self, rect):
+        """
+        Returns the inclusive cell column and row ranges covering
+        rect = (xmin, ymin, xmax, ymax), or None when it misses the grid.
+        """
+        lower = np.floor((np.array(rect[:2]) - self.origin) / self.cell_size).astype(np.int64)
+        upper = np.floor((np.array(rect[2:]) - self.origin) / self.cell_size).astype(np.int64)
+        if np.any(upper < 0) or upper[0] < lower[0] or upper[1] < lower[1] \
+                or lower[0] >= self.shape[0] or lower[1] >= self.shape[1]:
+            return None
+        lower = np.maximum(lower, 0)
+        upper = np.minimum(upper, np.array(self.shape) - 1)
+        return int(lower[0]), int(upper[0]), int(lower[1]), int(upper[1])
+
+    def rows_in_cells(self, cells):
+        """
+        Returns the store rows of the given cell ids in one index array.
+        """
+        cells = np.asarray(cells, dtype=np.int64)
+        start, end = self.cell_start[cells], self.cell_start[cells + 1]
+        counts = end - start
+        return np.repeat(start - np.cumsum(counts) + counts, counts) + np.arange(int(counts.sum()))
+
+    def rows_in_rect(self, rect):
+        """
+        Returns the rows of every address in the grid cells that overlap
+        rect. Each row of cells is read as one slice of the columns.
+        """
+        cells = self.cell_range(rect)
+        if cells is None:
+            return np.zeros(0, dtype=np.int64)
+        x0, x1, y0, y1 = cells
+        slices = [
+            np.arange(self.cell_start[cy * self.shape[0] + x0], self.cell_start[cy * self.shape[0] + x1 + 1])
+            for cy in range(y0, y1 + 1)
+        ]
+        return np.concatenate(slices) if slices else np.zeros(0, dtype=np.int64)
+
+    def cell_rect(self, cell):
+        cx, cy = cell % self.shape[0], cell // self.shape[0]
+        x0, y0 = self.origin + np.array([cx, cy]) * self.cell_size
+        return x0, y0, x0 + self.cell_size, y0 + self.cell_size
+
+    def attributes(self, rows):
+        """
+        Returns {row: attribute list} for the given rows, decoded from the
+        memory-mapped attribute file.
+        """
+        if self._attributes is None:
+            self._attributes = np.memmap(os.path.join(self.path, ATTRIBUTES_FILE), dtype=np.uint8, mode='r') \
+                if self.count else np.zeros(0, dtype=np.uint8)
+        result = {}
+        for row in rows:
+            start, end = self.attribute_offset[row], self.attribute_offset[row + 1]
+            result[row] = json.loads(self._attributes[start:end].tobytes().decode('utf-8'))
+        return result
+
+    def require_field(self, name, numeric=False):
+        """
+        Raises ValueError unless the store has a field called name (with
+        numbers in it when numeric).
+        """
+        types = dict(self.field_specs)
+        if name not in types:
+            raise ValueError(f"The address store has no field '{name}'; it has {', '.join(types) or 'none'}.")
+        if numeric and types[name] not in ('int', 'double'):
+            raise ValueError(f"The address store field '{name}' is {types[name]}, not a number.")
+
+    def fields(self):
+        """
+        Returns the stored address fields as QgsFields.
+        """
+        if self._fields is None:
+            from qgis.PyQt.QtCore import QVariant
+            from qgis.core import QgsField, QgsFields
+            types = {'int': QVariant.LongLong, 'double': QVariant.Double, 'bool': QVariant.Bool}
+            self._fields = QgsFields()
+            for name, type_name in self.field_specs:
+                self._fields.append(QgsField(name, types.get(type_name, QVariant.String)))
+        return self._fields
+
+    def crs(self):
+        if self._crs is None:
+            from qgis.core import QgsCoordinateReferenceSystem
+            self._crs = QgsCoordinateReferenceSystem.fromWkt(self.crs_wkt)
+        return self._crs
+
+
+def field_type_name(field):
+    """
+    Returns the store type of a QgsField: 'int', 'double', 'bool' or 'text'
+    (dates and everything else are stored as text).
+    """
+    from qgis.PyQt.QtCore import QVariant
+    if field.type() in (QVariant.Int, QVariant.LongLong, QVariant.UInt, QVariant.ULongLong):
+        return 'int'
+    if field.type() == QVariant.Double:
+        return 'double'
+    if field.type() == QVariant.Bool:
+        return 'bool'
+    return 'text'
+
+
+def build_store(layer, path, cell_size=0.0, feedback=None):
+    """
+    Reads every point of the layer with its attributes and writes the
+    address store. Returns the number of addresses written. Attribute rows
+    are streamed to a file as they are read, so only the coordinates are
+    held in memory; the file is then copied into grid-cell order.
+    """
+    os.makedirs(path, exist_ok=True)
+    unsorted_path = os.path.join(path, UNSORTED_FILE)
+    fids, xy, offsets = [], [], [0]
+    total = max(layer.featureCount(), 1)
+    try:
+        with open(unsorted_path, 'wb') as f:
+            for number, feature in enumerate(layer.getFeatures()):
+                if feedback and number % 10000 == 0:
+                    if feedback.isCanceled():
+                        return 0
+                    feedback.setProgress(90.0 * number / total)
+                if not feature.hasGeometry():
+                    continue
+                point = feature.geometry().centroid().asPoint()
+                fids.append(feature.id())
+                xy.append((point.x(), point.y()))
+                encoded = json.dumps(
+                    [json_value(value) for value in feature.attributes()], ensure_ascii=False
+                ).encode('utf-8') + b'\n'
+                f.write(encoded)
+                offsets.append(offsets[-1] + len(encoded))
+        lines = np.memmap(unsorted_path, dtype=np.uint8, mode='r') if fids else np.zeros(0, dtype=np.uint8)
+        offsets = np.array(offsets, dtype=np.int64)
+
+        def line(source):
+            return lines[offsets[source]:offsets[source + 1]].tobytes()
+
+        fields = [(field.name(), field_type_name(field)) for field in layer.fields()]
+        _write_store(path, fids, xy, line, fields, layer.crs().toWkt(), cell_size)
+        lines = None
+    finally:
+        if os.path.exists(unsorted_path):
+            os.remove(unsorted_path)
+    return len(fids)
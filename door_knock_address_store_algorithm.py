@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ * *
+ * This program is free software; you can redistribute it and/or modify  *
+ * it under the terms of the GNU General Public License as published by  *
+ * the Free Software Foundation; either version 2 of the License, or     *
+ * (at your option) any later version.                                   *
+ * *
+ ***************************************************************************/
+"""
+
+__author__ = 'Darren Green'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2025 by Darren Green'
+
+from qgis.PyQt.QtCore import QCoreApplication
+from qgis.core import (
+    QgsProcessing,
+    QgsProcessingAlgorithm,
+    QgsProcessingException,
+    QgsProcessingOutputNumber,
+    QgsProcessingParameterDefinition,
+    QgsProcessingParameterFeatureSource,
+    QgsProcessingParameterFolderDestination,
+    QgsProcessingParameterNumber
+)
+
+
+class DoorKnockAddressStoreAlgorithm(QgsProcessingAlgorithm):
+    """
+    One-off conversion of a large address layer into a preprocessed
+    address store that the planner reads by area of interest.
+    """
+    INPUT_ADDRESSES = 'INPUT_ADDRESSES'
+    INPUT_CELL_SIZE = 'INPUT_CELL_SIZE'
+    OUTPUT_STORE = 'OUTPUT_STORE'
+    OUTPUT_COUNT = 'OUTPUT_COUNT'
+
+    def tr(self, string):
+        return QCoreApplication.translate('Processing', string)
+
+    def createInstance(self):
+        return DoorKnockAddressStoreAlgorithm()
+
+    def name(self):
+        return 'doorknockaddressstore'
+
+    def displayName(self):
+        return self.tr('Door Knock Address Store (Preprocess)')
+
+    def group(self):
+        return ''
+
+    def groupId(self):
+        return ''
+
+    def shortHelpString(self):
+        return self.tr("Converts a large address layer (such as a state-wide G-NAF extract) once into a preprocessed address store. Give the store to the Route Planner instead of Address Points to read only the addresses near the area of interest.")
+
+    def initAlgorithm(self, config=None):
+        self.addParameter(QgsProcessingParameterFeatureSource(
+            self.INPUT_ADDRESSES, self.tr('Address Points'), [QgsProcessing.TypeVectorPoint]
+        ))
+        cell_size_param = QgsProcessingParameterNumber(
+            self.INPUT_CELL_SIZE, self.tr('Grid Cell Size (layer units, 0 = automatic)'),
+            QgsProcessingParameterNumber.Double, defaultValue=0.0, minValue=0.0
+        )
+        cell_size_param.setFlags(cell_size_param.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(cell_size_param)
+        self.addParameter(QgsProcessingParameterFolderDestination(
+            self.OUTPUT_STORE, self.tr('Address Store Folder')
+        ))
+        self.addOutput(QgsProcessingOutputNumber(
+            self.OUTPUT_COUNT, self.tr('Addresses Stored')
+        ))
+
+    def processAlgorithm(self, parameters, context, feedback):
+        from .door_knock_address_store import build_store
+
+        address_layer = self.parameterAsVectorLayer(parameters, self.INPUT_ADDRESSES, context)
+        if not address_layer:
+            raise QgsProcessingException("The address layer is invalid.")
+        cell_size = self.parameterAsDouble(parameters, self.INPUT_CELL_SIZE, context)
+        store_path = self.parameterAsString(parameters, self.OUTPUT_STORE, context)
+
+        feedback.pushInfo(f"Reading {address_layer.featureCount()} addresses...")
+        count = build_store(address_layer, store_path, cell_size, feedback)
+        if feedback.isCanceled():
+            return {}
+        feedback.pushInfo(f" -> Wrote {count} addresses to {store_path}.")
+        return {self.OUTPUT_STORE: store_path, self.OUTPUT_COUNT: count}
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ * *
+ * This program is free software; you can redistribute it and/or modify  *
+ * it under the terms of the GNU General Public License as published by  *
+ * the Free Software Foundation; either version 2 of the License, or     *
+ * (at your option) any later version.                                   *
+ * *
+ ***************************************************************************/
+
+ Columnar address table used by the planning stages. Each address is a row
+ in a set of NumPy arrays (feature id, working coordinates, stop, crew,
+ road node, cost and visit order); the address attributes are only read
+ from the source layer, in one request, when output features are built.
+"""
+
+__author__ = 'Darren Green'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2025 by Darren Green'
+
+import numpy as np
+from qgis.core import QgsFeatureRequest
+
+from .door_knock_crs import transform_xy
+
+
+class AddressTable:
+    """
+    Addresses as parallel arrays. x and y are in the working CRS and
+    source_xy in the address layer CRS (used for the output geometry).
+    stop, cluster, node and order are -1 and cost is NaN until a stage
+    fills them in.
+    """
+
+    def __init__(self, fid, xy, source_xy=None, attribute_source=None):
+        self.fid = np.asarray(fid, dtype=np.int64)
+        xy = np.asarray(xy, dtype=float).reshape(-1, 2)
+        self.x = xy[:, 0].copy()
+        self.y = xy[:, 1].copy()
+        self.source_xy = xy.copy() if source_xy is None else np.asarray(source_xy, dtype=float).reshape(-1, 2)
+        count = len(self.fid)
+        self.stop = np.full(count, -1, dtype=np.int64)
+        self.cluster = np.full(count, -1, dtype=np.int64)
+        self.node = np.full(count, -1, dtype=np.int64)
+        self.cost = np.full(count, np.nan)
+        self.order = np.full(count, -1, dtype=np.int64)
+        self.hazard = np.full(count, np.nan)
+        self._attribute_source = attribute_source
+        self._attributes = {}
+
+    def __len__(self):
+        return len(self.fid)
+
+    @property
+    def xy(self):
+        return np.column_stack([self.x, self.y])
+
+    @classmethod
+    def from_points(cls, fids, points, source_crs, work_crs, transform_context, attribute_source=None):
+        """
+        Builds the table from feature ids and their QgsPointXY locations in
+        source_crs, reprojecting them into work_crs in one batch.
+        """
+        source_xy = np.array([(p.x(), p.y()) for p in points], dtype=float).reshape(-1, 2)
+        xy = transform_xy(source_xy, source_crs, work_crs, transform_context)
+        return cls(fids, xy, source_xy, attribute_source)
+
+    def attributes(self, rows):
+        """
+        Returns the attribute lists of the given rows. Rows not read before
+        are fetched from the attribute source in one request and kept.
+        """
+        fids = self.fid[np.asarray(rows, dtype=np.int64)].tolist()
+        missing = [fid for fid in fids if fid not in self._attributes]
+        if missing and self._attribute_source is not None:
+            self._attributes.update(self._attribute_source(missing))
+        return [self._attributes.get(fid) for fid in fids]
+
+    def column(self, index):
+        """
+        Returns attribute number index of every row as floats, NaN where
+        it is empty or not a number. The attributes read are kept for the
+        output features.
+        """
+        values = np.full(len(self), np.nan)
+        for row, attributes in enumerate(self.attributes(np.arange(len(self)))):
+            try:
+                values[row] = float(attributes[index])
+            except (TypeError, ValueError, IndexError):
+                pass
+        return values
+
+
+def layer_attribute_source(layer):
+    """
+    Returns a function that reads the attributes of the given feature ids
+    from the layer without their geometries.
+    """
+    def read(fids):
+        request = QgsFeatureRequest().setFilterFids(fids).setFlags(QgsFeatureRequest.NoGeometry)
+        return {feature.id(): feature.attributes() for feature in layer.getFeatures(request)}
+    return read
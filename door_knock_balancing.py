@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ * *
+ * This program is free software; you can redistribute it and/or modify  *
+ * it under the terms of the GNU General Public License as published by  *
+ * the Free Software Foundation; either version 2 of the License, or     *
+ * (at your option) any later version.                                   *
+ * *
+ ***************************************************************************/
+
+ Workload balancing between crews. A crew's working time is its travel time
+ plus the time spent at each door. Starting from the K-Means clusters, stops
+ on the border of the busiest crew are moved to a neighbouring crew of the
+ same depot while that shortens the busiest crew's day, using straight-line
+ tours and insertion/removal deltas rather than re-sequencing every crew.
+"""
+
+__author__ = 'Darren Green'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2025 by Darren Green'
+
+import numpy as np
+
+from .door_knock_sequencing import straight_line_tour
+
+# Each move looks at this many stops of the busiest crew nearest to each of
+# this many neighbouring crews (by centroid), inserting them only next to
+# the receiving crew's nearest path edges.
+BORDER_CANDIDATES = 40
+NEIGHBOUR_CREWS = 3
+INSERTION_EDGES = 64
+MAX_REBALANCE_MOVES = 2000
+
+
+def insertion_deltas(tour_xy, points, max_edges=INSERTION_EDGES):
+    """
+    Returns, for every point, the cheapest extra distance of inserting it
+    into the open path tour_xy (whose first row is the fixed start) and the
+    path position after which it goes. Only the max_edges path edges
+    nearest to the points (and the end of the path) are tried.
+    """
+    edges = np.arange(len(tour_xy) - 1)
+    if len(edges) > max_edges:
+        gaps = np.hypot(*(tour_xy[:-1] - points.mean(axis=0)).T)
+        edges = np.argpartition(gaps, max_edges)[:max_edges]
+    a, b = tour_xy[edges], tour_xy[edges + 1]
+    to_a = np.hypot(*(points[:, None, :] - a[None, :, :]).transpose(2, 0, 1))
+    to_b = np.hypot(*(points[:, None, :] - b[None, :, :]).transpose(2, 0, 1))
+    between = to_a + to_b - np.hypot(*(b - a).T)[None, :]
+    at_end = np.hypot(*(points - tour_xy[-1]).T)[:, None]
+    deltas = np.hstack([between, at_end])
+    best = np.argmin(deltas, axis=1)
+    after = np.append(edges, len(tour_xy) - 1)[best]
+    return deltas[np.arange(len(points)), best], after
+
+
+def removal_deltas(tour_xy, positions):
+    """
+    Returns the distance saved by removing the path rows at positions
+    (never 0, the start) from the open path tour_xy.
+    """
+    previous, current = tour_xy[positions - 1], tour_xy[positions]
+    following = tour_xy[np.minimum(positions + 1, len(tour_xy) - 1)]
+    last = positions == len(tour_xy) - 1
+    detour = np.where(last, 0.0, np.hypot(*(following - current).T) - np.hypot(*(following - previous).T))
+    return np.hypot(*(current - previous).T) + detour
+
+
+def rebalance(stop_xy, stop_minutes, labels, crew_start_xy, crew_groups, metres_per_minute,
+              detour=1.0, max_moves=MAX_REBALANCE_MOVES):
+    """
+    Moves border stops between neighbouring crews of the same group until
+    the longest estimated working day cannot be shortened. stop_minutes is
+    the time spent at each stop, travel is the straight-line tour length
+    times detour at metres_per_minute. Returns the new crew label of every
+    stop and each crew's estimated minutes.
+    """
+    labels = labels.copy()
+    num_crews = len(crew_start_xy)
+    crew_start_xy = np.asarray(crew_start_xy, dtype=float).reshape(-1, 2)
+    crew_groups = np.asarray(crew_groups)
+    minutes_per_metre = detour / metres_per_minute
+
+    tours = []
+    for crew in range(num_crews):
+        members = np.flatnonzero(labels == crew)
+        order, _ = straight_line_tour(crew_start_xy[crew], stop_xy[members])
+        tours.append(members[order])
+
+    def path_xy(crew):
+        return np.vstack([crew_start_xy[crew], stop_xy[tours[crew]]])
+
+    def duration(crew):
+        xy = path_xy(crew)
+        travel = np.hypot(*np.diff(xy, axis=0).T).sum() if len(xy) > 1 else 0.0
+        return travel * minutes_per_metre + stop_minutes[tours[crew]].sum()
+
+    durations = np.array([duration(crew) for crew in range(num_crews)])
+    centroids = np.array([
+        stop_xy[tour].mean(axis=0) if len(tour) else crew_start_xy[crew] for crew, tour in enumerate(tours)
+    ]).reshape(-1, 2)
+
+    for _ in range(max_moves):
+        busiest = int(np.argmax(durations))
+        if len(tours[busiest]) < 2:
+            break
+        others = np.flatnonzero((crew_groups == crew_groups[busiest]) & (np.arange(num_crews) != busiest))
+        if not len(others):
+            break
+        others = others[np.argsort(np.hypot(*(centroids[others] - centroids[busiest]).T))[:NEIGHBOUR_CREWS]]
+
+        busy_xy = path_xy(busiest)
+        best = None
+        for crew in others.tolist():
+            # Border stops: those of the busiest crew closest to this crew.
+            gaps = np.hypot(*(stop_xy[tours[busiest]] - centroids[crew]).T)
+            positions = np.argsort(gaps)[:BORDER_CANDIDATES] + 1
+            stops = tours[busiest][positions - 1]
+            saved = removal_deltas(busy_xy, positions) * minutes_per_metre + stop_minutes[stops]
+            added, after = insertion_deltas(path_xy(crew), stop_xy[stops])
+            added = added * minutes_per_metre + stop_minutes[stops]
+            worst = np.maximum(durations[busiest] - saved, durations[crew] + added)
+            k = int(np.argmin(worst))
+            if best is None or worst[k] < best[0]:
+                best = (worst[k], crew, int(positions[k]), int(after[k]), saved[k], added[k])
+
+        worst, crew, position, after, saved, added = best
+        if worst >= durations[busiest] - 1e-9:
+            break
+        stop = tours[busiest][position - 1]
+        tours[busiest] = np.delete(tours[busiest], position - 1)
+        tours[crew] = np.insert(tours[crew], after, stop)
+        labels[stop] = crew
+        durations[busiest] -= saved
+        durations[crew] += added
+        for changed in (busiest, crew):
+            centroids[changed] = stop_xy[tours[changed]].mean(axis=0)
+    return labels, durations
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ * *
+ * This program is free software; you can redistribute it and/or modify  *
+ * it under the terms of the GNU General Public License as published by  *
+ * the Free Software Foundation; either version 2 of the License, or     *
+ * (at your option) any later version.                                   *
+ * *
+ ***************************************************************************/
+
+ Headless batch planning. Runs the route planner for every scenario in a
+ JSON or YAML file inside one QGIS session, so the road graph and address
+ index built for the first scenario are reused by the rest, and writes a
+ comparison table of the results.
+
+ Run from the QGIS plugins folder with the QGIS Python environment:
+
+     python -m door_knock_planner.door_knock_batch scenarios.json
+
+ The scenario file is either a list of parameter sets or an object with
+ "defaults" (shared by every scenario) and "scenarios". Parameter names
+ are the planner's, e.g.:
+
+     {
+       "defaults": {"INPUT_ROADS": "roads.gpkg", "INPUT_ADDRESSES": "addresses.gpkg",
+                    "INPUT_POLYGON": "aoi.gpkg"},
+       "scenarios": [
+         {"name": "4 crews", "INPUT_NUM_CREWS": 4, "INPUT_START_POINT": "151.2,-33.8 [EPSG:4326]"},
+         {"name": "6 crews", "INPUT_NUM_CREWS": 6, "INPUT_START_POINT": "151.2,-33.8 [EPSG:4326]"}
+       ]
+     }
+"""
+
+__author__ = 'Darren Green'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2025 by Darren Green'
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+from qgis.core import (
+    QgsApplication,
+    QgsProcessing,
+    QgsProcessingContext,
+    QgsProcessingFeedback,
+    QgsProject,
+    QgsRasterLayer,
+    QgsVectorLayer
+)
+from .door_knock_planner_algorithm import DoorKnockPlannerAlgorithm
+from .door_knock_planner_provider import doorknockplannerProvider
+
+ALGORITHM_ID = 'doorknockplanner:doorknockplanner'
+LAYER_PARAMETERS = (
+    DoorKnockPlannerAlgorithm.INPUT_POLYGON,
+    DoorKnockPlannerAlgorithm.INPUT_ADDRESSES,
+    DoorKnockPlannerAlgorithm.INPUT_ROADS,
+    DoorKnockPlannerAlgorithm.INPUT_DEPOTS,
+    DoorKnockPlannerAlgorithm.INPUT_CLOSURES,
+    DoorKnockPlannerAlgorithm.INPUT_HAZARD_RASTER,
+)
+# Layer inputs among LAYER_PARAMETERS that are read as rasters.
+RASTER_PARAMETERS = (
+    DoorKnockPlannerAlgorithm.INPUT_HAZARD_RASTER,
+)
+OUTPUT_PARAMETERS = (
+    DoorKnockPlannerAlgorithm.OUTPUT_VISIT_POINTS,
+    DoorKnockPlannerAlgorithm.OUTPUT_CSV,
+)
+COMPARISON_FIELDS = ['scenario', 'crews', 'total_cost', 'max_crew_cost', 'max_crew_minutes', 'run_seconds', 'status']
+
+QGIS_APP = None
+
+
+def start_qgis():
+    """
+    Starts one QGIS application without a GUI and registers the planner's
+    Processing provider. Make sure QGIS_PREFIX_PATH is set if needed.
+    """
+    global QGIS_APP  # pylint: disable=W0603
+    if QGIS_APP is None:
+        QGIS_APP = QgsApplication(sys.argv, False)
+        QGIS_APP.initQgis()
+        QgsApplication.processingRegistry().addProvider(doorknockplannerProvider())
+    return QGIS_APP
+
+
+def read_document(path):
+    """
+    Reads a JSON or YAML file. YAML files need PyYAML.
+    """
+    with open(path, encoding='utf-8') as f:
+        if path.lower().endswith(('.yml', '.yaml')):
+            try:
+                import yaml
+            except ImportError:
+                raise RuntimeError("Reading YAML files needs PyYAML; use a JSON file instead.")
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+def read_scenarios(path):
+    """
+    Reads a scenario file and returns a list of (name, parameters) pairs
+    with the defaults applied. YAML files need PyYAML.
+    """
+    data = read_document(path)
+    if isinstance(data, list):
+        defaults, scenarios = {}, data
+    else:
+        defaults, scenarios = data.get('defaults', {}), data.get('scenarios', [])
+
+    result = []
+    for number, scenario in enumerate(scenarios, start=1):
+        parameters = dict(defaults)
+        parameters.update(scenario)
+        name = str(parameters.pop('name', f"Scenario {number}"))
+        result.append((name, parameters))
+    return result
+
+
+def load_layers(parameters, keys, base_folder, layers):
+    """
+    Replaces the layer paths among parameters[keys] with vector layers (or
+    raster layers for RASTER_PARAMETERS), relative paths being read from
+    base_folder. layers maps each path to
+    its loaded layer and is shared between runs so every file is read once.
+    """
+    for key in keys:
+        source = parameters.get(key)
+        if isinstance(source, str) and source:
+            if source not in layers:
+                path = source if os.path.isabs(source) else os.path.join(base_folder, source)
+                if key in RASTER_PARAMETERS:
+                    layer = QgsRasterLayer(path, key)
+                else:
+                    layer = QgsVectorLayer(path, key, 'ogr')
+                if not layer.isValid():
+                    raise RuntimeError(f"Could not load layer '{source}'.")
+                layers[source] = layer
+            parameters[key] = layers[source]
+    return parameters
+
+
+def run_scenarios(scenarios, base_folder, feedback=None):
+    """
+    Runs the planner for every scenario and returns one comparison row per
+    scenario. Layers given as paths are loaded once and shared, which keeps
+    the planner's cached road graph and address index warm between runs.
+    """
+    algorithm = QgsApplication.processingRegistry().createAlgorithmById(ALGORITHM_ID)
+    layers = {}
+    rows = []
+    for name, parameters in scenarios:
+        parameters = load_layers(dict(parameters), LAYER_PARAMETERS, base_folder, layers)
+        for key in OUTPUT_PARAMETERS:
+            parameters.setdefault(key, QgsProcessing.TEMPORARY_OUTPUT)
+
+        context = QgsProcessingContext()
+        context.setProject(QgsProject.instance())
+        started = time.perf_counter()
+        results, ok = algorithm.run(parameters, context, feedback or QgsProcessingFeedback())
+        elapsed = time.perf_counter() - started
+
+        planned = ok and DoorKnockPlannerAlgorithm.OUTPUT_TOTAL_COST in results
+        rows.append({
+            'scenario': name,
+            'crews': parameters.get(DoorKnockPlannerAlgorithm.INPUT_NUM_CREWS, ''),
+            'total_cost': round(results[DoorKnockPlannerAlgorithm.OUTPUT_TOTAL_COST], 1) if planned else '',
+            'max_crew_cost': round(results[DoorKnockPlannerAlgorithm.OUTPUT_MAX_CREW_COST], 1) if planned else '',
+            'max_crew_minutes': round(results[DoorKnockPlannerAlgorithm.OUTPUT_MAX_CREW_MINUTES], 1) if planned else '',
+            'run_seconds': round(elapsed, 2),
+            'status': 'ok' if planned else 'failed',
+        })
+    return rows
+
+
+def write_comparison(path, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=COMPARISON_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run door knock planning scenarios without the QGIS GUI.")
+    parser.add_argument('scenarios', help="JSON or YAML scenario file")
+    parser.add_argument('-o', '--output', help="comparison CSV (default: <scenarios>_comparison.csv)")
+    args = parser.parse_args(argv)
+
+    scenarios = read_scenarios(args.scenarios)
+    output = args.output or os.path.splitext(args.scenarios)[0] + '_comparison.csv'
+
+    app = start_qgis()
+    try:
+        rows = run_scenarios(scenarios, os.path.dirname(os.path.abspath(args.scenarios)))
+    finally:
+        app.exitQgis()
+
+    write_comparison(output, rows)
+    for row in rows:
+        print(f"{row['scenario']}: total {row['total_cost']}, max crew {row['max_crew_cost']}, "
+              f"{row['run_seconds']} s ({row['status']})")
+    print(f"Comparison written to {output}")
+    return 0 if all(row['status'] == 'ok' for row in rows) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ * *
+ * This program is free software; you can redistribute it and/or modify  *
+ * it under the terms of the GNU General Public License as published by  *
+ * the Free Software Foundation; either version 2 of the License, or     *
+ * (at your option) any later version.                                   *
+ * *
+ ***************************************************************************/
+
+ Street blocks. Crews walk one side of a street at a time, so stops snapped
+ to the same street segment and side are grouped into a block, ordered by
+ their distance along the street. Clustering and sequencing then work on
+ blocks instead of stops, and each block is expanded back into its stops,
+ walked from the end nearest to where the crew comes from.
+"""
+
+__author__ = 'Darren Green'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2025 by Darren Green'
+
+import math
+
+import numpy as np
+
+# Long streets without junctions are cut into blocks of at most this
+# length, so one block never holds a whole rural road.
+MAX_BLOCK_METRES = 250.0
+
+
+def street_blocks(network, stop_xy, stop_edges, stop_offsets, max_length=MAX_BLOCK_METRES):
+    """
+    Returns the block id of every stop and its position in metres along
+    its street segment. stop_edges and stop_offsets are the edge each stop
+    was snapped to and the offset from that edge's first node (as returned
+    by RoadNetwork.snap). Stops on opposite sides of a street, or more than
+    max_length apart along it, are in different blocks.
+    """
+    street, edge_start, reverse = network.street_segments()
+    length = network.edge_length[stop_edges]
+    position = edge_start[stop_edges] + np.where(reverse[stop_edges], length - stop_offsets, stop_offsets)
+
+    a = network.node_xy[network.edge_from[stop_edges]]
+    direction = network.node_xy[network.edge_to[stop_edges]] - a
+    fraction = np.divide(stop_offsets, length, out=np.zeros(len(length)), where=length > 0)
+    offset = stop_xy - (a + fraction[:, None] * direction)
+    left = (direction[:, 0] * offset[:, 1] - direction[:, 1] * offset[:, 0] > 0) != reverse[stop_edges]
+
+    piece = np.floor(position / max_length).astype(np.int64)
+    keys = np.column_stack([street[stop_edges], left, piece])
+    _, block = np.unique(keys, axis=0, return_inverse=True)
+    return block.reshape(-1), position
+
+
+def block_representatives(stop_block, stop_position):
+    """
+    Returns the stops ordered block by block along the street, the start
+    of each block in that order (with the end appended) and the middle
+    stop of every block, which stands in for the block when routing.
+    """
+    order = np.lexsort((stop_position, stop_block))
+    counts = np.bincount(stop_block)
+    bounds = np.concatenate([[0], np.cumsum(counts)])
+    return order, bounds, order[bounds[:-1] + counts // 2]
+
+
+def walk_blocks(blocks, block_arrival, order, bounds, stop_xy, stop_position, start_xy, cost_per_metre=1.0):
+    """
+    Expands the crew's blocks, in visiting order, into stops. Each block
+    is walked from the end nearest to the previous stop (or start_xy).
+    A stop's cost is the block's arrival cost plus the walk along this and
+    every earlier block (metres times cost_per_metre), so costs rise along
+    the route. Returns the stops and their costs.
+    """
+    stops, costs = [], []
+    walked = 0.0
+    here = np.asarray(start_xy, dtype=float)
+    for block, arrival in zip(blocks, block_arrival):
+        members = order[bounds[block]:bounds[block + 1]]
+        if np.hypot(*(stop_xy[members[-1]] - here)) < np.hypot(*(stop_xy[members[0]] - here)):
+            members = members[::-1]
+        along = np.abs(stop_position[members] - stop_position[members[0]]) * cost_per_metre
+        stops.extend(members.tolist())
+        costs.extend((arrival + walked + along).tolist() if math.isfinite(arrival) else [math.inf] * len(members))
+        if math.isfinite(arrival):
+            walked += float(along[-1])
+        here = stop_xy[members[-1]]
+    return np.array(stops, dtype=np.int64), np.array(costs)
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ * *
+ * This program is free software; you can redistribute it and/or modify  *
+ * it under the terms of the GNU General Public License as published by  *
+ * the Free Software Foundation; either version 2 of the License, or     *
+ * (at your option) any later version.                                   *
+ * *
+ ***************************************************************************/
+
+ Session cache shared by the planner, tracker and pipeline algorithms so the
+ road graph, snapping and clustering results survive between runs.
+"""
+
+__author__ = 'Darren Green'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2025 by Darren Green'
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+MAX_ENTRIES = 32
+
+_entries = OrderedDict()
+_lock = threading.RLock()
+# Data change counts of the layers seen, by layer id.
+_versions = {}
+
+
+def _watch(layer):
+    """
+    Counts the data changes of a layer (edits, committed or not, and
+    provider reloads), so layers changed in place get a new key.
+    """
+    layer_id = layer.id()
+    if layer_id in _versions:
+        return
+
+    def changed(*args):
+        _versions[layer_id] += 1
+
+    _versions[layer_id] = 0
+    layer.dataChanged.connect(changed)
+    provider = layer.dataProvider()
+    if provider is not None and hasattr(provider, 'dataChanged'):
+        provider.dataChanged.connect(changed)
+
+
+def _modified_time(source):
+    """
+    Returns the latest modification time of a file source and its
+    SQLite write-ahead log, or None when the source is not a file.
+    """
+    path = source.split('|')[0]
+    times = [os.path.getmtime(p) for p in (path, path + '-wal') if os.path.isfile(p)]
+    return max(times) if times else None
+
+
+def layer_key(layer):
+    """
+    Returns a key that changes whenever the layer's source, filter, CRS,
+    feature count or extent changes, when its file is written to and when
+    it is edited in place.
+    """
+    extent = layer.extent()
+    memory = layer.providerType() == 'memory'
+    source = layer.id() if memory else layer.source()
+    with _lock:
+        _watch(layer)
+        version = _versions[layer.id()]
+    return (
+        source, layer.subsetString(), layer.crs().authid(), layer.featureCount(),
+        round(extent.xMinimum(), 6), round(extent.yMinimum(), 6),
+        round(extent.xMaximum(), 6), round(extent.yMaximum(), 6),
+        None if memory else _modified_time(source), version, layer.isModified()
+    )
+
+
+def array_key(*arrays):
+    """
+    Returns a content hash of one or more NumPy arrays.
+    """
+    digest = hashlib.sha1()
+    for array in arrays:
+        digest.update(array.tobytes())
+    return digest.hexdigest()
+
+
+def get(kind, key):
+    with _lock:
+        value = _entries.get((kind, key))
+        if value is not None:
+            _entries.move_to_end((kind, key))
+        return value
+
+
+def put(kind, key, value):
+    with _lock:
+        _entries[(kind, key)] = value
+        _entries.move_to_end((kind, key))
+        while len(_entries) > MAX_ENTRIES:
+            _entries.popitem(last=False)
+    return value
+
+
+def cached(kind, key, factory):
+    """
+    Returns the cached value for (kind, key), calling factory() to build
+    and store it on a miss.
+    """
+    value = get(kind, key)
+    if value is None:
+        value = put(kind, key, factory())
+    return value
+
+
+def clear():
+    with _lock:
+        _entries.clear()
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ * *
+ * This program is free software; you can redistribute it and/or modify  *
+ * it under the terms of the GNU General Public License as published by  *
+ * the Free Software Foundation; either version 2 of the License, or     *
+ * (at your option) any later version.                                   *
+ * *
+ ***************************************************************************/
+
+ Road closures applied as an overlay on the cached road graph. Closure
+ geometries are matched against a spatial index of the graph edges and the
+ matching edges get new weights in a copy of the weight array, so the graph
+ itself is never rebuilt.
+"""
+
+__author__ = 'Darren Green'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2025 by Darren Green'
+
+import hashlib
+import math
+
+import numpy as np
+from qgis.core import (
+    QgsCoordinateTransform,
+    QgsGeometry,
+    QgsPointXY,
+    QgsRectangle,
+    QgsSpatialIndex,
+    QgsUnitTypes,
+    QgsWkbTypes
+)
+from . import door_knock_cache as cache
+from .door_knock_network import EARTH_RADIUS
+
+# Line closures drawn along a road close the edges lying within this
+# distance of the line.
+CLOSURE_TOLERANCE_METRES = 1.0
+
+
+def edge_index(network):
+    """
+    Returns a spatial index of the graph edges, keyed by edge id.
+    """
+    index = QgsSpatialIndex()
+    a = network.node_xy[network.edge_from]
+    b = network.node_xy[network.edge_to]
+    lower = np.minimum(a, b)
+    upper = np.maximum(a, b)
+    for edge in range(network.edge_count):
+        index.addFeature(edge, QgsRectangle(lower[edge, 0], lower[edge, 1], upper[edge, 0], upper[edge, 1]))
+    return index
+
+
+def closed_edges(network, index, closure_geometries, tolerance):
+    """
+    Returns the delay factor of every edge touched by a closure as a dict
+    {edge: factor}. closure_geometries is a list of (geometry, factor)
+    pairs in the graph CRS, with factor None for a full closure. Polygons
+    close every edge they intersect; lines close the edges they cross or
+    run along (within tolerance).
+    """
+    factors = {}
+    for geom, factor in closure_geometries:
+        is_line = geom.type() == QgsWkbTypes.LineGeometry
+        search = geom.boundingBox()
+        if is_line:
+            search.grow(tolerance)
+        engine = QgsGeometry.createGeometryEngine(geom.constGet())
+        engine.prepareGeometry()
+        for edge in index.intersects(search):
+            a = network.node_xy[network.edge_from[edge]]
+            b = network.node_xy[network.edge_to[edge]]
+            segment = QgsGeometry.fromPolylineXY([QgsPointXY(*a), QgsPointXY(*b)])
+            if is_line:
+                midpoint = QgsGeometry.fromPointXY(QgsPointXY(*((a + b) / 2)))
+                hit = engine.crosses(segment.constGet()) or geom.distance(midpoint) <= tolerance
+            else:
+                hit = engine.intersects(segment.constGet())
+            if hit:
+                current = factors.get(edge, 1.0)
+                factors[edge] = None if factor is None or current is None else max(current, factor)
+    return factors
+
+
+def read_closures(closures_layer, factor_field, road_crs, transform_context):
+    """
+    Reads the closure geometries in the road CRS with their delay factors.
+    An empty or non-positive factor means the road is fully closed.
+    """
+    transform = None
+    if closures_layer.crs() != road_crs:
+        transform = QgsCoordinateTransform(closures_layer.crs(), road_crs, transform_context)
+    closures = []
+    for feature in closures_layer.getFeatures():
+        geom = QgsGeometry(feature.geometry())
+        if geom.isEmpty():
+            continue
+        if transform:
+            geom.transform(transform)
+        factor = feature[factor_field] if factor_field else None
+        closures.append((geom, float(factor) if factor and float(factor) > 0 else None))
+    return closures
+
+
+def closures_key(closures):
+    """
+    Returns a content hash of the closures, so edited closures are picked
+    up even when the layer's feature count and extent stay the same.
+    """
+    digest = hashlib.sha1()
+    for geom, factor in closures:
+        digest.update(bytes(geom.asWkb()))
+        digest.update(repr(factor).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def apply_closures(network, road_key, closures, road_crs):
+    """
+    Returns a copy of the network sharing its structure, with the edges
+    under the closures penalised (multiplied by their factor) or removed
+    (infinite weight), and the number of edges changed. The edge index is
+    cached with the graph.
+    """
+    index = cache.cached('edge_index', road_key, lambda: edge_index(network))
+    if road_crs.isGeographic():
+        tolerance = CLOSURE_TOLERANCE_METRES / (math.radians(1.0) * EARTH_RADIUS)
+    else:
+        tolerance = CLOSURE_TOLERANCE_METRES / QgsUnitTypes.fromUnitToUnitFactor(road_crs.mapUnits(), QgsUnitTypes.DistanceMeters)
+
+    factors = closed_edges(network, index, closures, tolerance)
+    edge_length = network.edge_length.copy()
+    for edge, factor in factors.items():
+        edge_length[edge] = math.inf if factor is None else edge_length[edge] * factor
+    return network.with_edge_lengths(edge_length), len(factors)
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ * *
+ * This program is free software; you can redistribute it and/or modify  *
+ * it under the terms of the GNU General Public License as published by  *
+ * the Free Software Foundation; either version 2 of the License, or     *
+ * (at your option) any later version.                                   *
+ * *
+ ***************************************************************************/
+
+ Clustering helpers used to divide addresses among crews.
+"""
+
+__author__ = 'Darren Green'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2025 by Darren Green'
+
+import numpy as np
+
+CHUNK_SIZE = 65536
+
+
+def _nearest_center(xy, centers):
+    """
+    Returns the index of the nearest center for every point, computed in
+    chunks so the point/center distance table never gets too large.
+    """
+    labels = np.empty(len(xy), dtype=np.int64)
+    center_sq = (centers ** 2).sum(axis=1)
+    for start in range(0, len(xy), CHUNK_SIZE):
+        block = xy[start:start + CHUNK_SIZE]
+        d2 = center_sq[None, :] - 2.0 * block @ centers.T
+        labels[start:start + CHUNK_SIZE] = np.argmin(d2, axis=1)
+    return labels
+
+
+def kmeans(xy, k, seed=0, max_iter=100):
+    """
+    Divides the points into k clusters with k-means++ seeding, the same
+    approach as native:kmeansclustering. Returns a cluster id (0 to k-1)
+    for every point. The seed is fixed so repeated runs give the same
+    clusters.
+    """
+    n = len(xy)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    k = max(1, min(k, n))
+    rng = np.random.default_rng(seed)
+
+    # Work relative to the centroid to keep the squared terms small.
+    xy = xy - xy.mean(axis=0)
+    centers = np.empty((k, 2))
+    centers[0] = xy[rng.integers(n)]
+    d2 = ((xy - centers[0]) ** 2).sum(axis=1)
+    for c in range(1, k):
+        total = d2.sum()
+        index = rng.choice(n, p=d2 / total) if total > 0 else rng.integers(n)
+        centers[c] = xy[index]
+        d2 = np.minimum(d2, ((xy - centers[c]) ** 2).sum(axis=1))
+
+    labels = _nearest_center(xy, centers)
+    for _ in range(max_iter):
+        counts = np.bincount(labels, minlength=k)
+        new_centers = centers.copy()
+        filled = counts > 0
+        new_centers[filled, 0] = np.bincount(labels, xy[:, 0], minlength=k)[filled] / counts[filled]
+        new_centers[filled, 1] = np.bincount(labels, xy[:, 1], minlength=k)[filled] / counts[filled]
+        new_labels = _nearest_center(xy, new_centers)
+        centers = new_centers
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+    return labels
+
+
+def group_colocated(xy, tolerance):
+    """
+    Groups points that lie within tolerance of each other (single linkage)
+    into stops using a grid hash. Returns the stop id of every point; stop
+    ids are numbered in order of first appearance.
+    """
+    n = len(xy)
+    if n == 0 or tolerance <= 0:
+        return np.arange(n)
+
+    # With cells of tolerance / sqrt(2), points sharing a cell are always
+    # within tolerance, and neighbours can only be up to two cells away.
+    cell_size = tolerance / np.sqrt(2.0)
+    cells, point_cell = np.unique(np.floor((xy - xy.min(axis=0)) / cell_size).astype(np.int64),
+                                  axis=0, return_inverse=True)
+    point_cell = point_cell.reshape(-1)
+    order = np.argsort(point_cell, kind='stable')
+    starts = np.searchsorted(point_cell[order], np.arange(len(cells) + 1))
+    lookup = {(int(cx), int(cy)): c for c, (cx, cy) in enumerate(cells)}
+
+    parent = list(range(len(cells)))
+
+    def find(c):
+        while parent[c] != c:
+            parent[c] = parent[parent[c]]
+            c = parent[c]
+        return c
+
+    # Half of the 5x5 neighbourhood, so each pair of cells is checked once.
+    offsets = [(dx, dy) for dx in range(-2, 3) for dy in range(-2, 3) if (dx, dy) > (0, 0)]
+    for c, (cx, cy) in enumerate(cells):
+        members = xy[order[starts[c]:starts[c + 1]]]
+        for dx, dy in offsets:
+            other = lookup.get((int(cx) + dx, int(cy) + dy))
+            if other is None or find(c) == find(other):
+                continue
+            other_members = xy[order[starts[other]:starts[other + 1]]]
+            gaps = members[:, None, :] - other_members[None, :, :]
+            if (np.hypot(gaps[..., 0], gaps[..., 1]) <= tolerance).any():
+                parent[find(other)] = find(c)
+
+    roots = np.array([find(c) for c in range(len(cells))])[point_cell]
+    _, first, stop_ids = np.unique(roots, return_index=True, return_inverse=True)
+    # Renumber so stop ids follow the order in which points appear.
+    rank = np.empty(len(first), dtype=np.int64)
+    rank[np.argsort(first, kind='stable')] = np.arange(len(first))
+    return rank[stop_ids.reshape(-1)]
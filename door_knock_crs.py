@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ * *
+ * This program is free software; you can redistribute it and/or modify  *
+ * it under the terms of the GNU General Public License as published by  *
+ * the Free Software Foundation; either version 2 of the License, or     *
+ * (at your option) any later version.                                   *
+ * *
+ ***************************************************************************/
+
+ Working CRS for planning. All planning inputs are reprojected once into a
+ single projected CRS in metres (the local MGA zone in Australia, otherwise
+ the local UTM zone), so every later stage works on plain coordinate arrays
+ where distances are metres.
+"""
+
+__author__ = 'Darren Green'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2025 by Darren Green'
+
+import numpy as np
+from qgis.core import (
+    QgsCoordinateReferenceSystem,
+    QgsCoordinateTransform,
+    QgsLineString,
+    QgsUnitTypes
+)
+
+# MGA zones by datum: EPSG code of zone 0 and the zones that exist.
+MGA_ZONES = {
+    'EPSG:7844': (7800, range(46, 60)),   # GDA2020 -> MGA2020
+    'EPSG:4283': (28300, range(48, 59)),  # GDA94 -> MGA94
+}
+
+
+def zone_authid(lon, lat, datum_authid=''):
+    """
+    Returns the authority id of the projected zone covering lon/lat: the
+    MGA zone when the datum is GDA94 or GDA2020 and the point is in an MGA
+    zone south of the equator, otherwise the WGS 84 UTM zone.
+    """
+    zone = min(max(int((lon + 180.0) // 6.0) + 1, 1), 60)
+    if datum_authid in MGA_ZONES and lat < 0:
+        base, zones = MGA_ZONES[datum_authid]
+        if zone in zones:
+            return f"EPSG:{base + zone}"
+    return f"EPSG:{(32700 if lat < 0 else 32600) + zone}"
+
+
+def working_crs(road_layer, area_layer, transform_context):
+    """
+    Returns the working CRS for planning. A road layer that is already
+    projected in metres keeps its CRS, so the largest input needs no
+    reprojection; otherwise (or without a road layer) the zone under the
+    centre of the area layer is used.
+    """
+    road_crs = road_layer.crs() if road_layer is not None else area_layer.crs()
+    if road_layer is not None and not road_crs.isGeographic() and road_crs.mapUnits() == QgsUnitTypes.DistanceMeters:
+        return road_crs
+
+    wgs84 = QgsCoordinateReferenceSystem('EPSG:4326')
+    centre = area_layer.extent().center()
+    if area_layer.crs() != wgs84:
+        centre = QgsCoordinateTransform(area_layer.crs(), wgs84, transform_context).transform(centre)
+    return QgsCoordinateReferenceSystem(zone_authid(centre.x(), centre.y(), road_crs.geographicCrsAuthId()))
+
+
+def transform_xy(xy, source_crs, dest_crs, transform_context):
+    """
+    Returns an (n, 2) array of coordinates transformed from source_crs to
+    dest_crs in one batched call rather than point by point.
+    """
+    xy = np.asarray(xy, dtype=float).reshape(-1, 2)
+    if source_crs == dest_crs or len(xy) == 0:
+        return xy
+    line = QgsLineString(xy[:, 0].tolist(), xy[:, 1].tolist())
+    line.transform(QgsCoordinateTransform(source_crs, dest_crs, transform_context))
+    return np.array([(p.x(), p.y()) for p in line.points()], dtype=float).reshape(-1, 2)
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ * *
+ * This program is free software; you can redistribute it and/or modify  *
+ * it under the terms of the GNU General Public License as published by  *
+ * the Free Software Foundation; either version 2 of the License, or     *
+ * (at your option) any later version.                                   *
+ * *
+ ***************************************************************************/
+
+ Duplicate detection for new addresses. Intelligence layers often hold a
+ house that is already on the master list under another id, so new points
+ are matched against the master list (and the new points before them):
+ nearby points are found with a grid hash, and a pair is a duplicate when
+ its address labels carry the same numbers and are otherwise similar.
+"""
+
+__author__ = 'Darren Green'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2025 by Darren Green'
+
+import difflib
+import re
+
+import numpy as np
+
+STREET_TYPES = {
+    'street': 'st', 'road': 'rd', 'avenue': 'ave', 'av': 'ave', 'drive': 'dr', 'court': 'ct', 'place': 'pl',
+    'crescent': 'cres', 'terrace': 'tce', 'parade': 'pde', 'highway': 'hwy', 'lane': 'ln', 'close': 'cl',
+    'boulevard': 'bvd', 'circuit': 'cct', 'esplanade': 'esp', 'grove': 'gr', 'square': 'sq',
+}
+# Words that only say what kind of number follows.
+UNIT_WORDS = {'unit', 'u', 'flat', 'apartment', 'apt', 'shop', 'lot', 'no', 'number'}
+
+
+def normalise_label(label):
+    """
+    Returns an address label as lower case words without punctuation, with
+    street types abbreviated and unit words dropped, so '3/12 Smith Street'
+    and 'Unit 3, 12 Smith St' are the same.
+    """
+    words = re.sub(r'[^0-9a-z]+', ' ', str(label or '').lower()).split()
+    return ' '.join(STREET_TYPES.get(word, word) for word in words if word not in UNIT_WORDS)
+
+
+def label_similarity(a, b):
+    """
+    Returns how alike two normalised labels are, from 0 to 1. Labels whose
+    numbers differ (e.g. 12 and 14 Smith St, next door to each other), and
+    empty labels, are never alike.
+    """
+    if not a or not b:
+        return 0.0
+    if [w for w in a.split() if any(c.isdigit() for c in w)] != [w for w in b.split() if any(c.isdigit() for c in w)]:
+        return 0.0
+    return difflib.SequenceMatcher(None, a, b).ratio()
+
+
+def pairs_within(reference_xy, query_xy, tolerance):
+    """
+    Returns the query index, reference index and distance of every pair of
+    points closer than tolerance. Reference points are hashed into cells
+    of the tolerance, so each query point only looks at the points of its
+    own and the eight neighbouring cells.
+    """
+    reference_xy = np.asarray(reference_xy, dtype=float).reshape(-1, 2)
+    query_xy = np.asarray(query_xy, dtype=float).reshape(-1, 2)
+    empty = np.zeros(0, dtype=np.int64)
+    if tolerance <= 0 or not len(reference_xy) or not len(query_xy):
+        return empty, empty, np.zeros(0)
+
+    origin = np.minimum(reference_xy.min(axis=0), query_xy.min(axis=0))
+    reference_cells = np.floor((reference_xy - origin) / tolerance).astype(np.int64) + 1
+    query_cells = np.floor((query_xy - origin) / tolerance).astype(np.int64) + 1
+    height = max(reference_cells[:, 1].max(), query_cells[:, 1].max()) + 2
+    keys = reference_cells[:, 0] * height + reference_cells[:, 1]
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+
+    queries, references = [], []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            neighbour = (query_cells[:, 0] + dx) * height + query_cells[:, 1] + dy
+            low = np.searchsorted(sorted_keys, neighbour, 'left')
+            counts = np.searchsorted(sorted_keys, neighbour, 'right') - low
+            total = int(counts.sum())
+            if not total:
+                continue
+            starts = np.repeat(low - np.cumsum(counts) + counts, counts)
+            queries.append(np.repeat(np.arange(len(query_xy)), counts))
+            references.append(order[starts + np.arange(total)])
+    if not queries:
+        return empty, empty, np.zeros(0)
+    query, reference = np.concatenate(queries), np.concatenate(references)
+    distance = np.hypot(*(query_xy[query] - reference_xy[reference]).T)
+    close = distance <= tolerance
+    return query[close], reference[close], distance[close]
+
+
+def find_duplicates(original_xy, original_labels, new_xy, new_labels, tolerance, min_similarity):
+    """
+    Matches every new point to the address it duplicates: an original
+    point, or a new point listed before it, within tolerance and with a
+    label similarity of at least min_similarity. Returns, per new point,
+    the match (an original index, or len(original_xy) + the new index; -1
+    for none), its distance and its label similarity. The most similar
+    label wins, then the closest point.
+    """
+    count = len(original_xy)
+    reference_xy = np.concatenate([np.asarray(original_xy, dtype=float).reshape(-1, 2),
+                                   np.asarray(new_xy, dtype=float).reshape(-1, 2)])
+    labels = list(original_labels) + list(new_labels)
+    normalised = {}
+
+    def label(index):
+        if index not in normalised:
+            normalised[index] = normalise_label(labels[index])
+        return normalised[index]
+
+    query, reference, distance = pairs_within(reference_xy, new_xy, tolerance)
+    earlier = (reference < count) | (reference - count < query)
+    query, reference, distance = query[earlier], reference[earlier], distance[earlier]
+
+    match = np.full(len(new_labels), -1, dtype=np.int64)
+    match_distance = np.full(len(new_labels), np.nan)
+    match_similarity = np.full(len(new_labels), np.nan)
+    for q, r, d in zip(query.tolist(), reference.tolist(), distance.tolist()):
+        similarity = label_similarity(label(count + q), label(r))
+        if similarity < min_similarity:
+            continue
+        if match[q] < 0 or (similarity, -d) > (match_similarity[q], -match_distance[q]):
+            match[q], match_distance[q], match_similarity[q] = r, d, similarity
+    return match, match_distance, match_similarity
@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ * *
+ * This program is free software; you can redistribute it and/or modify  *
+ * it under the terms of the GNU General Public License as published by  *
+ * the Free Software Foundation; either version 2 of the License, or     *
+ * (at your option) any later version.                                   *
+ * *
+ ***************************************************************************/
+
+ Per-crew GeoPackages for field devices. Each crew gets a small package
+ holding only its own visit points; on re-plans a delta package with just
+ the added, updated and removed rows is written next to it so devices on a
+ weak link only have to sync the changes.
+"""
+
+__author__ = 'Darren Green'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2025 by Darren Green'
+
+import hashlib
+import json
+import os
+from datetime import datetime
+
+from qgis.PyQt.QtCore import QVariant
+from qgis.core import (
+    QgsDefaultValue,
+    QgsEditorWidgetSetup,
+    QgsFeature,
+    QgsField,
+    QgsFields,
+    QgsVectorFileWriter,
+    QgsVectorLayer
+)
+
+MANIFEST_NAME = 'crew_packages.json'
+PACKAGE_LAYER_NAME = 'visit_points'
+CHANGE_FIELD = 'change_type'
+# The assignment a row is signed by. Visit order, costs, times and stop
+# numbers shift for every later stop whenever one door drops out, so they
+# travel with the row but are left out of its signature.
+ASSIGNMENT_FIELDS = ['crew_id']
+
+OUTCOME_VALUES = [
+    'No Person/s home',
+    'Residents Contacted',
+    'Unable to Locate/Attend Address',
+    'Outstanding'
+]
+
+
+def configure_outcome_field(layer):
+    """
+    Applies the 'Outstanding' default and the Outcome value map to a layer.
+    Returns False if the layer has no 'Outcome' field.
+    """
+    outcome_idx = layer.fields().indexOf('Outcome')
+    if outcome_idx == -1:
+        return False
+
+    layer.setDefaultValueDefinition(outcome_idx, QgsDefaultValue("'Outstanding'"))
+    outcomes_list = [{value: value} for value in OUTCOME_VALUES]
+    layer.setEditorWidgetSetup(outcome_idx, QgsEditorWidgetSetup('ValueMap', {'map': outcomes_list}))
+    return True
+
+
+def row_key(value):
+    """
+    Returns the manifest key of an address id, or None for NULL or empty
+    ids, which cannot be followed from one plan to the next.
+    """
+    if value is None or (hasattr(value, 'isNull') and value.isNull()):
+        return None
+    key = str(value).strip()
+    return key if key and key != 'NULL' else None
+
+
+def row_signature(key, assignment, geometry_wkt):
+    """
+    Returns a stable hash of an address id, its assignment values and its
+    geometry.
+    """
+    return hashlib.sha1(repr((key, [str(v) for v in assignment], geometry_wkt)).encode('utf-8')).hexdigest()
+
+
+def signature_precision(crs):
+    """
+    Returns the WKT decimals that keep a centimetre in the CRS's units.
+    """
+    return 7 if crs.isGeographic() else 2
+
+
+def feature_signature(feature, unique_id_field, precision):
+    """
+    Returns the signature of a visit point: its address id, crew and
+    geometry to precision decimals. A row is only 'updated' when one of
+    these changed between two plans.
+    """
+    geometry = feature.geometry()
+    geometry_wkt = geometry.asWkt(precision) if geometry and not geometry.isEmpty() else ''
+    names = feature.fields().names()
+    assignment = [feature.attribute(name) if name in names else None for name in ASSIGNMENT_FIELDS]
+    return row_signature(row_key(feature.attribute(unique_id_field)), assignment, geometry_wkt)
+
+
+def package_changes(previous, current):
+    """
+    Compares two {key: signature} maps of a crew. Returns the added, the
+    updated and the removed keys, the first two in the order of current.
+    """
+    added = [key for key in current if key not in previous]
+    updated = [key for key in current if key in previous and previous[key] != current[key]]
+    removed = [key for key in previous if key not in current]
+    return added, updated, removed
+
+
+def removed_id(key, is_numeric_id):
+    """
+    Returns the id value of a removed row for its package: the number for
+    numeric id fields, or None when the stored key is not a number.
+    """
+    if not is_numeric_id:
+        return key
+    try:
+        return int(float(key))
+    except (TypeError, ValueError):
+        return None
+
+
+def _load_manifest(folder):
+    path = os.path.join(folder, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {'crews': {}}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _save_manifest(folder, manifest):
+    path = os.path.join(folder, MANIFEST_NAME)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+
+
+def _write_package(path, fields, crs, features, transform_context):
+    """
+    Writes features to a single-layer GeoPackage and stores the Outcome
+    form configuration as the layer's default style.
+    """
+    memory_layer = QgsVectorLayer(f"Point?crs={crs.authid()}", PACKAGE_LAYER_NAME, "memory")
+    memory_layer.dataProvider().addAttributes(fields.toList())
+    memory_layer.updateFields()
+    memory_layer.dataProvider().addFeatures(features)
+
+    options = QgsVectorFileWriter.SaveVectorOptions()
+    options.driverName = 'GPKG'
+    options.layerName = PACKAGE_LAYER_NAME
+    error = QgsVectorFileWriter.writeAsVectorFormatV2(memory_layer, path, transform_context, options)
+    if error[0] != QgsVectorFileWriter.NoError:
+        raise IOError(f"Could not write '{path}': {error[1]}")
+
+    package_layer = QgsVectorLayer(f"{path}|layername={PACKAGE_LAYER_NAME}", PACKAGE_LAYER_NAME, "ogr")
+    if package_layer.isValid() and configure_outcome_field(package_layer):
+        package_layer.saveStyleToDatabase(PACKAGE_LAYER_NAME, 'Door knock field form', True, '')
+
+
+def write_crew_packages(folder, crew_features, fields, crs, unique_id_field, transform_context, feedback):
+    """
+    Writes one GeoPackage per crew into folder.
+
+    crew_features maps crew_id to the crew's ordered visit point features.
+    When unique_id_field is given, a manifest of row signatures is kept in
+    the folder and every re-plan also writes crew_<id>_delta_<stamp>.gpkg
+    holding only the rows that changed since the previous package. Rows
+    without an id are only written to the full packages.
+    """
+    os.makedirs(folder, exist_ok=True)
+    manifest = _load_manifest(folder) if unique_id_field else {'crews': {}}
+    previous_crews = manifest.get('crews', {})
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+
+    package_fields = QgsFields(fields)
+    package_fields.append(QgsField(CHANGE_FIELD, QVariant.String, len=10))
+
+    def package_feature(feature, change_type):
+        new_feature = QgsFeature(package_fields)
+        new_feature.setGeometry(feature.geometry())
+        for field in fields:
+            new_feature.setAttribute(field.name(), feature.attribute(field.name()))
+        new_feature.setAttribute(CHANGE_FIELD, change_type)
+        return new_feature
+
+    is_numeric_id = unique_id_field and fields.field(unique_id_field).isNumeric()
+
+    def removed_feature(key):
+        new_feature = QgsFeature(package_fields)
+        new_feature.setAttribute(unique_id_field, removed_id(key, is_numeric_id))
+        new_feature.setAttribute(CHANGE_FIELD, 'removed')
+        return new_feature
+
+    precision = signature_precision(crs)
+    written = {}
+    delta_rows = 0
+    crew_ids = set(crew_features) | {int(crew_id) for crew_id in previous_crews}
+
+    for crew_id in sorted(crew_ids):
+        features = crew_features.get(crew_id, [])
+        base_path = os.path.join(folder, f"crew_{crew_id:02d}.gpkg")
+
+        if features:
+            _write_package(base_path, package_fields, crs,
+                           [package_feature(f, 'added') for f in features], transform_context)
+        elif os.path.exists(base_path):
+            os.remove(base_path)
+
+        if not unique_id_field:
+            continue
+
+        keyed = {}
+        for feature in features:
+            key = row_key(feature.attribute(unique_id_field))
+            if key is not None:
+                keyed[key] = feature
+        current = {key: feature_signature(f, unique_id_field, precision) for key, f in keyed.items()}
+        previous = previous_crews.get(str(crew_id))
+        if features:
+            written[str(crew_id)] = current
+        if previous is None:
+            continue
+
+        added, updated, removed = package_changes(previous, current)
+        delta = [package_feature(keyed[key], 'added') for key in added]
+        delta.extend(package_feature(keyed[key], 'updated') for key in updated)
+        delta.extend(removed_feature(key) for key in removed)
+
+        if not delta:
+            feedback.pushInfo(f" -> Crew #{crew_id}: no changes since the last package.")
+            continue
+
+        delta_path = os.path.join(folder, f"crew_{crew_id:02d}_delta_{stamp}.gpkg")
+        _write_package(delta_path, package_fields, crs, delta, transform_context)
+        delta_rows += len(delta)
+        feedback.pushInfo(f" -> Crew #{crew_id}: wrote {len(delta)} changed rows of {len(features)} to {os.path.basename(delta_path)}.")
+
+    if unique_id_field:
+        manifest['crews'] = written
+        _save_manifest(folder, manifest)
+
+    return delta_rows
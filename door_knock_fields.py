@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ * *
+ * This program is free software; you can redistribute it and/or modify  *
+ * it under the terms of the GNU General Public License as published by  *
+ * the Free Software Foundation; either version 2 of the License, or     *
+ * (at your option) any later version.                                   *
+ * *
+ ***************************************************************************/
+
+ Field names and value helpers shared by the Status Tracker, the
+ validation rules, the address store and the planning service. It imports
+ nothing from the plugin, so any module can use it.
+"""
+
+__author__ = 'Darren Green'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2025 by Darren Green'
+
+COMPLETION_FIELDS = ['Inquiry Date', 'Inquirer ID', 'Inquirer Org']
+
+
+def is_completed(outcome):
+    return bool(outcome) and str(outcome).strip().lower() == 'completed'
+
+
+def missing_completion_fields(status_record):
+    """
+    Returns the fields a 'Completed' status record must fill in but
+    leaves empty.
+    """
+    missing = []
+    for field in COMPLETION_FIELDS:
+        val = status_record.get(field)
+        if val is None or str(val).strip() == '':
+            missing.append(field)
+    return missing
+
+
+def address_key(value, is_numeric_id):
+    """
+    Returns the key an address ID is matched on: the whole number for
+    numeric ID fields (so '00123', '123' and 123.0 match), otherwise the
+    trimmed lower-case text. None when there is no usable ID.
+    """
+    if value is None or (hasattr(value, 'isNull') and value.isNull()):
+        return None
+    if is_numeric_id:
+        try:
+            return int(float(value))
+        except (ValueError, TypeError):
+            return None
+    return str(value).strip().lower()
+
+
+def json_value(value):
+    """
+    Returns the attribute value as something JSON can store: numbers,
+    strings and None are kept, NULL becomes None and anything else (dates,
+    times) its text.
+    """
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if hasattr(value, 'isNull') and value.isNull():
+        return None
+    if hasattr(value, 'toString'):
+        return value.toString('yyyy-MM-ddTHH:mm:ss') if hasattr(value, 'time') else value.toString()
+    return str(value)
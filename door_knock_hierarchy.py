@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ * *
+ * This program is free software; you can redistribute it and/or modify  *
+ * it under the terms of the GNU General Public License as published by  *
+ * the Free Software Foundation; either version 2 of the License, or     *
+ * (at your option) any later version.                                   *
+ * *
+ ***************************************************************************/
+
+ Contraction hierarchy for the road graph. Nodes are contracted one by one
+ (least important first), adding shortcut edges where needed, so that any
+ shortest path can later be found by two small upward searches. Building it
+ is a one-off cost; it is saved to disk next to a hash of the graph and
+ reused for every distance table on the same roads.
+"""
+
+__author__ = 'Darren Green'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2025 by Darren Green'
+
+import heapq
+import math
+import os
+
+import numpy as np
+
+from . import door_knock_cache as cache
+
+# Witness searches give up after settling this many nodes; a missed witness
+# only adds an unnecessary shortcut, never a wrong distance.
+WITNESS_SETTLE_LIMIT = 60
+
+
+def graph_hash(network):
+    """
+    Returns a content hash of the graph, used to match a saved hierarchy to
+    the graph it was built from.
+    """
+    return cache.array_key(network.node_xy, network.edge_from, network.edge_to, network.edge_length)
+
+
+class ContractionHierarchy:
+    """
+    Upward graph of a contraction hierarchy in CSR form: the arcs leaving
+    node i lead to higher ranked nodes and are
+    indices[indptr[i]:indptr[i + 1]] with lengths in weights.
+    """
+
+    def __init__(self, rank, indptr, indices, weights, source_hash=''):
+        self.rank = rank
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        self.source_hash = source_hash
+        self._lists = (indptr.tolist(), indices.tolist(), weights.tolist())
+
+    @classmethod
+    def build(cls, network, feedback=None):
+        """
+        Contracts every node of the network. Node importance is the edge
+        difference (shortcuts added minus edges removed) plus the number of
+        already contracted neighbours and the node's level in the hierarchy;
+        it is re-evaluated for the neighbours of each contracted node and
+        lazily when a node comes off the queue.
+        """
+        n = network.node_count
+        adjacency = [dict() for _ in range(n)]
+        for a, b, length in zip(network.edge_from.tolist(), network.edge_to.tolist(), network.edge_length.tolist()):
+            if a != b and length < adjacency[a].get(b, math.inf):
+                adjacency[a][b] = adjacency[b][a] = length
+
+        contracted_neighbours = [0] * n
+        level = [0] * n
+        rank = np.zeros(n, dtype=np.int64)
+        up_from, up_to, up_weight = [], [], []
+
+        def shortcuts(v):
+            neighbours = list(adjacency[v].items())
+            found = []
+            for position, (u, w_uv) in enumerate(neighbours):
+                targets = {w: w_uv + w_vw for w, w_vw in neighbours[position + 1:]}
+                if not targets:
+                    continue
+                witness = _witness_costs(adjacency, u, v, targets, max(targets.values()))
+                for w, via_v in targets.items():
+                    if witness.get(w, math.inf) > via_v:
+                        found.append((u, w, via_v))
+            return found
+
+        def priority(v):
+            return len(shortcuts(v)) - len(adjacency[v]) + contracted_neighbours[v] + level[v]
+
+        contracted = [False] * n
+        current_priority = [priority(v) for v in range(n)]
+        heap = [(p, v) for v, p in enumerate(current_priority)]
+        heapq.heapify(heap)
+        order = 0
+        while heap:
+            if feedback and order % 5000 == 0:
+                if feedback.isCanceled():
+                    return None
+                feedback.setProgress(100.0 * order / max(n, 1))
+            queued, v = heapq.heappop(heap)
+            if contracted[v] or queued != current_priority[v]:
+                continue
+            current = priority(v)
+            if heap and current > heap[0][0]:
+                current_priority[v] = current
+                heapq.heappush(heap, (current, v))
+                continue
+
+            for u, w, length in shortcuts(v):
+                if length < adjacency[u].get(w, math.inf):
+                    adjacency[u][w] = adjacency[w][u] = length
+            for u, length in adjacency[v].items():
+                up_from.append(v)
+                up_to.append(u)
+                up_weight.append(length)
+                del adjacency[u][v]
+                contracted_neighbours[u] += 1
+                level[u] = max(level[u], level[v] + 1)
+            neighbours = list(adjacency[v])
+            adjacency[v] = {}
+            contracted[v] = True
+            rank[v] = order
+            order += 1
+            for u in neighbours:
+                current_priority[u] = priority(u)
+                heapq.heappush(heap, (current_priority[u], u))
+
+        up_from = np.array(up_from, dtype=np.int64)
+        arc_order = np.argsort(up_from, kind='stable')
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(up_from, minlength=n), out=indptr[1:])
+        return cls(rank, indptr, np.array(up_to, dtype=np.int64)[arc_order],
+                   np.array(up_weight, dtype=float)[arc_order], graph_hash(network))
+
+    def _upward(self, source):
+        indptr, indices, weights = self._lists
+        dist = {source: 0.0}
+        settled = {}
+        heap = [(0.0, source)]
+        while heap:
+            d, u = heapq.heappop(heap)
+            if u in settled:
+                continue
+            settled[u] = d
+            for k in range(indptr[u], indptr[u + 1]):
+                v = indices[k]
+                nd = d + weights[k]
+                if nd < dist.get(v, math.inf):
+                    dist[v] = nd
+                    heapq.heappush(heap, (nd, v))
+        return settled
+
+    def many_to_many(self, sources, targets):
+        """
+        Returns the table of network distances from every source node to
+        every target node using bucket-based queries: one upward search per
+        distinct target fills the buckets, one per distinct source scans
+        them.
+        """
+        unique_targets, target_position = np.unique(targets, return_inverse=True)
+        unique_sources, source_position = np.unique(sources, return_inverse=True)
+
+        # The buckets are kept as flat arrays sorted by node, so each source
+        # meets its buckets with one vectorised lookup.
+        bucket_node, bucket_target, bucket_cost = [], [], []
+        for j, target in enumerate(unique_targets.tolist()):
+            space = self._upward(target)
+            bucket_node.append(np.fromiter(space.keys(), dtype=np.int64, count=len(space)))
+            bucket_cost.append(np.fromiter(space.values(), dtype=float, count=len(space)))
+            bucket_target.append(np.full(len(space), j, dtype=np.int64))
+        bucket_node = np.concatenate(bucket_node) if bucket_node else np.zeros(0, dtype=np.int64)
+        sort = np.argsort(bucket_node, kind='stable')
+        bucket_node = bucket_node[sort]
+        bucket_target = np.concatenate(bucket_target)[sort] if len(sort) else np.zeros(0, dtype=np.int64)
+        bucket_cost = np.concatenate(bucket_cost)[sort] if len(sort) else np.zeros(0)
+
+        table = np.full((len(unique_sources), len(unique_targets)), math.inf)
+        for i, source in enumerate(unique_sources.tolist()):
+            space = self._upward(source)
+            nodes = np.fromiter(space.keys(), dtype=np.int64, count=len(space))
+            costs = np.fromiter(space.values(), dtype=float, count=len(space))
+            lower = np.searchsorted(bucket_node, nodes, 'left')
+            counts = np.searchsorted(bucket_node, nodes, 'right') - lower
+            total = int(counts.sum())
+            if total == 0:
+                continue
+            entries = np.repeat(lower - np.cumsum(counts) + counts, counts) + np.arange(total)
+            np.minimum.at(table[i], bucket_target[entries], np.repeat(costs, counts) + bucket_cost[entries])
+        return table[np.ix_(source_position.reshape(-1), target_position.reshape(-1))]
+
+    def save(self, path):
+        np.savez(path, rank=self.rank, indptr=self.indptr, indices=self.indices,
+                 weights=self.weights, source_hash=np.array(self.source_hash))
+
+    @classmethod
+    def load(cls, path, network):
+        """
+        Loads a saved hierarchy, or returns None if there is none or it was
+        built from a different graph.
+        """
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            if str(data['source_hash']) != graph_hash(network):
+                return None
+            return cls(data['rank'], data['indptr'], data['indices'], data['weights'], str(data['source_hash']))
+
+
+def _witness_costs(adjacency, source, excluded, targets, max_cost):
+    """
+    Dijkstra from source that skips the node being contracted and stops at
+    max_cost, after the settle limit or once every target is settled.
+    """
+    dist = {source: 0.0}
+    settled = 0
+    remaining = set(targets)
+    heap = [(0.0, source)]
+    while heap and remaining and settled < WITNESS_SETTLE_LIMIT:
+        d, u = heapq.heappop(heap)
+        if d > dist.get(u, math.inf):
+            continue
+        if d > max_cost:
+            break
+        settled += 1
+        remaining.discard(u)
+        for v, length in adjacency[u].items():
+            if v == excluded:
+                continue
+            nd = d + length
+            if nd < dist.get(v, math.inf):
+                dist[v] = nd
+                heapq.heappush(heap, (nd, v))
+    return dist
+
+
+def load_or_build(network, folder, feedback=None):
+    """
+    Returns the hierarchy for the network, loading it from folder when one
+    was saved for the same graph and building (and saving) it otherwise.
+    """
+    path = os.path.join(folder, f"hierarchy_{graph_hash(network)}.npz")
+    hierarchy = ContractionHierarchy.load(path, network)
+    if hierarchy is None:
+        hierarchy = ContractionHierarchy.build(network, feedback)
+        if hierarchy is not None:
+            os.makedirs(folder, exist_ok=True)
+            hierarchy.save(path)
+    return hierarchy
@@ -0,0 +1,535 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ * *
+ * This program is free software; you can redistribute it and/or modify  *
+ * it under the terms of the GNU General Public License as published by  *
+ * the Free Software Foundation; either version 2 of the License, or     *
+ * (at your option) any later version.                                   *
+ * *
+ ***************************************************************************/
+
+ Road network graph used for routing. The graph is built once from the road
+ layer into flat NumPy arrays (compressed sparse row adjacency) so it can be
+ cached and searched many times without going back to the layer.
+"""
+
+__author__ = 'Darren Green'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2025 by Darren Green'
+
+import copy
+import heapq
+import math
+
+import numpy as np
+from qgis.core import QgsFeatureRequest, QgsUnitTypes
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+EARTH_RADIUS = 6371008.8
+# Addresses are snapped in blocks of this many to bound memory use.
+SNAP_CHUNK_SIZE = 4096
+SNAP_PAIR_LIMIT = 4000000
+
+
+class RoadNetwork:
+    """
+    Undirected road graph in compressed sparse row (CSR) form.
+
+    node_xy holds the vertex coordinates in the CRS the graph was built in.
+    The arcs leaving node i are indices[indptr[i]:indptr[i + 1]] with
+    lengths (in metres) in weights at the same positions. edge_feature is
+    the id of the road feature each edge was read from (-1 if unknown), so
+    per-road attributes such as speeds can be mapped onto the edges.
+    """
+
+    def __init__(self, node_xy, edge_from, edge_to, edge_length, edge_feature=None):
+        self.node_xy = node_xy
+        self.edge_from = edge_from
+        self.edge_to = edge_to
+        self.edge_length = edge_length
+        self.edge_feature = np.full(len(edge_from), -1, dtype=np.int64) if edge_feature is None else edge_feature
+
+        arc_from = np.concatenate([edge_from, edge_to])
+        arc_to = np.concatenate([edge_to, edge_from])
+        arc_weight = np.concatenate([edge_length, edge_length])
+        order = np.argsort(arc_from, kind='stable')
+
+        self.indices = arc_to[order]
+        self.weights = arc_weight[order]
+        self.arc_edge = np.concatenate([np.arange(len(edge_from))] * 2)[order]
+        self.indptr = np.zeros(len(node_xy) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(arc_from, minlength=len(node_xy)), out=self.indptr[1:])
+
+        self._adjacency = None
+        self._grid = None
+        self._tree = None
+        self._edge_grid = None
+        self._streets = None
+        self._components = None
+
+    @property
+    def node_count(self):
+        return len(self.node_xy)
+
+    @property
+    def edge_count(self):
+        return len(self.edge_from)
+
+    @classmethod
+    def from_polylines(cls, polylines, geographic=False, unit_factor=1.0, line_ids=None):
+        """
+        Builds the graph from a list of polylines, each a sequence of (x, y)
+        tuples. Vertices with identical coordinates become one node.
+        line_ids gives the feature id of each polyline for edge_feature.
+        """
+        if line_ids is None:
+            line_ids = [-1] * len(polylines)
+        line_ids = [line_id for line, line_id in zip(polylines, line_ids) if len(line) > 1]
+        polylines = [line for line in polylines if len(line) > 1]
+        if not polylines:
+            return cls(np.zeros((0, 2)), np.zeros(0, dtype=np.int64),
+                       np.zeros(0, dtype=np.int64), np.zeros(0))
+
+        coords = np.array([point for line in polylines for point in line], dtype=float)
+        lengths = np.array([len(line) for line in polylines])
+        decimals = 7 if geographic else 3
+        node_xy, vertex_node = np.unique(np.round(coords, decimals), axis=0, return_inverse=True)
+        vertex_node = vertex_node.reshape(-1)
+
+        # A segment joins each vertex to the next one, except across the
+        # boundary between two polylines.
+        segment_ok = np.ones(len(coords) - 1, dtype=bool)
+        segment_ok[np.cumsum(lengths)[:-1] - 1] = False
+        edge_from = vertex_node[:-1][segment_ok]
+        edge_to = vertex_node[1:][segment_ok]
+        edge_feature = np.repeat(np.array(line_ids, dtype=np.int64), lengths)[:-1][segment_ok]
+        keep = edge_from != edge_to
+        edge_from, edge_to, edge_feature = edge_from[keep], edge_to[keep], edge_feature[keep]
+
+        a, b = node_xy[edge_from], node_xy[edge_to]
+        if geographic:
+            edge_length = haversine(a[:, 0], a[:, 1], b[:, 0], b[:, 1])
+        else:
+            edge_length = np.hypot(b[:, 0] - a[:, 0], b[:, 1] - a[:, 1]) * unit_factor
+
+        return cls(node_xy, edge_from.astype(np.int64), edge_to.astype(np.int64), edge_length, edge_feature)
+
+    def with_edge_lengths(self, edge_length):
+        """
+        Returns a copy of the graph with new edge lengths. The structure
+        arrays (and the snapping grid) are shared with this graph; only the
+        weights are new.
+        """
+        network = copy.copy(self)
+        network.edge_length = edge_length
+        network.weights = edge_length[self.arc_edge]
+        network._components = None
+        if self._adjacency is not None:
+            network._adjacency = (self._adjacency[0], self._adjacency[1], network.weights.tolist())
+        return network
+
+    def _lists(self):
+        if self._adjacency is None:
+            self._adjacency = (self.indptr.tolist(), self.indices.tolist(), self.weights.tolist())
+        return self._adjacency
+
+    def shortest_costs(self, sources, return_origin=False):
+        """
+        Runs Dijkstra from one or more source nodes and returns the network
+        distance from the nearest source to every node (inf if unreachable).
+        With return_origin, also returns for every node the position in
+        sources of the source it was reached from (-1 if unreachable), so one
+        multi-source search assigns every node to its closest source.
+        """
+        indptr, indices, weights = self._lists()
+        dist = [math.inf] * self.node_count
+        origin = [-1] * self.node_count
+        heap = []
+        for position, source in enumerate(sources):
+            if dist[source] > 0.0:
+                dist[source] = 0.0
+                origin[source] = position
+                heap.append((0.0, source))
+        heapq.heapify(heap)
+
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            for k in range(indptr[u], indptr[u + 1]):
+                v = indices[k]
+                nd = d + weights[k]
+                if nd < dist[v]:
+                    dist[v] = nd
+                    origin[v] = origin[u]
+                    heapq.heappush(heap, (nd, v))
+        if return_origin:
+            return np.array(dist), np.array(origin, dtype=np.int64)
+        return np.array(dist)
+
+    def one_to_many(self, source, targets, max_cost=math.inf):
+        """
+        Runs Dijkstra from source until every target node is settled or the
+        search passes max_cost, so only the part of the network around the
+        targets is explored. Returns the cost to each target (inf if it was
+        not reached).
+        """
+        indptr, indices, weights = self._lists()
+        remaining = set(int(t) for t in targets)
+        dist = {source: 0.0}
+        settled = {}
+        heap = [(0.0, source)]
+        while heap and remaining:
+            d, u = heapq.heappop(heap)
+            if u in settled:
+                continue
+            if d > max_cost:
+                break
+            settled[u] = d
+            remaining.discard(u)
+            for k in range(indptr[u], indptr[u + 1]):
+                v = indices[k]
+                nd = d + weights[k]
+                if nd < dist.get(v, math.inf):
+                    dist[v] = nd
+                    heapq.heappush(heap, (nd, v))
+        return np.array([settled.get(int(t), math.inf) for t in targets])
+
+    def cost_matrix(self, nodes, max_cost=math.inf):
+        """
+        Returns the network distances between every pair of the given nodes
+        using one bounded one-to-many search per distinct node. Pairs
+        further apart than max_cost are inf.
+        """
+        unique, position = np.unique(nodes, return_inverse=True)
+        table = np.vstack([self.one_to_many(int(u), unique, max_cost) for u in unique]) if len(unique) else np.zeros((0, 0))
+        position = position.reshape(-1)
+        return table[np.ix_(position, position)]
+
+    def subgraph(self, node_mask):
+        """
+        Returns the graph induced by the nodes selected in node_mask,
+        together with the ids of those nodes in this graph.
+        """
+        nodes = np.flatnonzero(node_mask)
+        local = np.full(self.node_count, -1, dtype=np.int64)
+        local[nodes] = np.arange(len(nodes))
+        keep = node_mask[self.edge_from] & node_mask[self.edge_to]
+        sub = RoadNetwork(self.node_xy[nodes], local[self.edge_from[keep]],
+                          local[self.edge_to[keep]], self.edge_length[keep], self.edge_feature[keep])
+        return sub, nodes
+
+    def components(self):
+        """
+        Returns the connected component of every node, numbered from 0,
+        found with union-find over the edges that can be travelled (finite
+        weight). Computed once per graph.
+        """
+        if self._components is not None:
+            return self._components
+        parent = list(range(self.node_count))
+
+        def find(node):
+            while parent[node] != node:
+                parent[node] = parent[parent[node]]
+                node = parent[node]
+            return node
+
+        usable = np.isfinite(self.edge_length)
+        for a, b in zip(self.edge_from[usable].tolist(), self.edge_to[usable].tolist()):
+            root_a, root_b = find(a), find(b)
+            if root_a != root_b:
+                parent[max(root_a, root_b)] = min(root_a, root_b)
+        _, labels = np.unique([find(node) for node in range(self.node_count)], return_inverse=True)
+        self._components = labels.reshape(-1).astype(np.int64)
+        return self._components
+
+    def street_segments(self):
+        """
+        Groups the edges into street segments: chains of edges joined at
+        nodes where only two edges meet, running between junctions or dead
+        ends. Returns, for every edge, its segment id, the distance along
+        the segment to the start of the edge and whether the segment runs
+        through the edge from edge_to to edge_from. Computed once per graph.
+        """
+        if self._streets is not None:
+            return self._streets
+        indptr, indices, _ = self._lists()
+        arc_edge = self.arc_edge.tolist()
+        edge_from = self.edge_from.tolist()
+        lengths = self.edge_length.tolist()
+        degree = np.diff(self.indptr).tolist()
+        street = [-1] * self.edge_count
+        start = [0.0] * self.edge_count
+        reverse = [False] * self.edge_count
+
+        def walk(node, arc, street_id):
+            offset = 0.0
+            while street[arc_edge[arc]] < 0:
+                edge = arc_edge[arc]
+                street[edge], start[edge], reverse[edge] = street_id, offset, edge_from[edge] != node
+                offset += lengths[edge]
+                node = indices[arc]
+                if degree[node] != 2:
+                    break
+                arc = indptr[node] if arc_edge[indptr[node]] != edge else indptr[node] + 1
+
+        street_id = 0
+        for node in np.flatnonzero(np.diff(self.indptr) != 2).tolist():
+            for arc in range(indptr[node], indptr[node + 1]):
+                if street[arc_edge[arc]] < 0:
+                    walk(node, arc, street_id)
+                    street_id += 1
+        # Loops without any junction (e.g. a ring road on its own).
+        for edge in range(self.edge_count):
+            if street[edge] < 0:
+                node = edge_from[edge]
+                arc = next(a for a in range(indptr[node], indptr[node + 1]) if arc_edge[a] == edge)
+                walk(node, arc, street_id)
+                street_id += 1
+
+        self._streets = (np.array(street, dtype=np.int64), np.array(start), np.array(reverse, dtype=bool))
+        return self._streets
+
+    def _build_grid(self):
+        xy = self.node_xy
+        xmin, ymin = xy.min(axis=0)
+        xmax, ymax = xy.max(axis=0)
+        cell = max(math.sqrt(max((xmax - xmin) * (ymax - ymin), 1e-12) / max(len(xy), 1)) * 2, 1e-9)
+        nx = int((xmax - xmin) / cell) + 1
+        ny = int((ymax - ymin) / cell) + 1
+        cells = ((xy[:, 0] - xmin) // cell).astype(np.int64) * ny + ((xy[:, 1] - ymin) // cell).astype(np.int64)
+        order = np.argsort(cells, kind='stable')
+        starts = np.searchsorted(cells[order], np.arange(nx * ny + 1))
+        self._grid = (xmin, ymin, cell, nx, ny, order, starts)
+
+    def nearest_nodes(self, xy):
+        """
+        Snaps each (x, y) to its nearest graph node. Returns the node ids and
+        the snap distances in layer units. Uses a KD-tree when SciPy is
+        available and a grid search otherwise.
+        """
+        if cKDTree is not None and self.node_count:
+            if self._tree is None:
+                self._tree = cKDTree(self.node_xy)
+            distances, nodes = self._tree.query(np.asarray(xy, dtype=float).reshape(-1, 2))
+            return nodes.astype(np.int64), distances
+        if self._grid is None:
+            self._build_grid()
+        xmin, ymin, cell, nx, ny, order, starts = self._grid
+        node_xy = self.node_xy
+
+        nodes = np.zeros(len(xy), dtype=np.int64)
+        distances = np.zeros(len(xy))
+        for q, (x, y) in enumerate(xy):
+            cx = min(max(int((x - xmin) // cell), 0), nx - 1)
+            cy = min(max(int((y - ymin) // cell), 0), ny - 1)
+            best, best_d = -1, math.inf
+            ring = 0
+            while ring <= max(nx, ny):
+                candidates = []
+                for ix in range(cx - ring, cx + ring + 1):
+                    if ix < 0 or ix >= nx:
+                        continue
+                    for iy in range(cy - ring, cy + ring + 1):
+                        if iy < 0 or iy >= ny or max(abs(ix - cx), abs(iy - cy)) != ring:
+                            continue
+                        c = ix * ny + iy
+                        candidates.append(order[starts[c]:starts[c + 1]])
+                if candidates:
+                    candidates = np.concatenate(candidates)
+                    if len(candidates):
+                        d = np.hypot(node_xy[candidates, 0] - x, node_xy[candidates, 1] - y)
+                        k = int(np.argmin(d))
+                        if d[k] < best_d:
+                            best, best_d = int(candidates[k]), float(d[k])
+                # Every unvisited cell is at least `ring * cell` away.
+                if best >= 0 and best_d <= ring * cell:
+                    break
+                ring += 1
+            nodes[q] = best
+            distances[q] = best_d
+        return nodes, distances
+
+
+    def _build_edge_grid(self):
+        a = self.node_xy[self.edge_from]
+        b = self.node_xy[self.edge_to]
+        lengths = np.hypot(b[:, 0] - a[:, 0], b[:, 1] - a[:, 1])
+        origin = self.node_xy.min(axis=0)
+        span = self.node_xy.max(axis=0) - origin
+        # About one edge per cell for evenly spread edges.
+        cell = max(math.sqrt(max(span[0] * span[1], 1e-12) / self.edge_count), float(lengths.max()) / 1000, 1e-9)
+
+        # Every edge is registered in the cells of points sampled along it
+        # at most half a cell apart, so no cell the edge passes near is
+        # more than two cells from a registered one.
+        samples = np.ceil(lengths / (cell / 2)).astype(np.int64) + 1
+        sample_edge = np.repeat(np.arange(self.edge_count), samples)
+        step = np.arange(samples.sum()) - np.repeat(np.cumsum(samples) - samples, samples)
+        t = step / np.repeat(np.maximum(samples - 1, 1), samples)
+        points = a[sample_edge] + t[:, None] * (b - a)[sample_edge]
+        cells = np.floor((points - origin) / cell).astype(np.int64)
+        stride = int(span[1] // cell) + 20
+        keys = (cells[:, 0] + 8) * stride + (cells[:, 1] + 8)
+        order = np.lexsort((sample_edge, keys))
+        keys, sample_edge = keys[order], sample_edge[order]
+        keep = np.ones(len(keys), dtype=bool)
+        keep[1:] = (keys[1:] != keys[:-1]) | (sample_edge[1:] != sample_edge[:-1])
+        nx = int(span[0] // cell) + 1
+        self._edge_grid = (origin, cell, stride, nx, stride - 20, keys[keep], sample_edge[keep])
+
+    def _project(self, xy, edges):
+        a = self.node_xy[self.edge_from[edges]]
+        ab = self.node_xy[self.edge_to[edges]] - a
+        denominator = (ab ** 2).sum(axis=1)
+        t = np.clip(((xy - a) * ab).sum(axis=1) / np.where(denominator > 0, denominator, 1.0), 0.0, 1.0)
+        gap = xy - (a + t[:, None] * ab)
+        return t, np.hypot(gap[:, 0], gap[:, 1])
+
+    def _nearest_in_cells(self, xy, cell_offsets):
+        """
+        Finds, for every point, the nearest of the edges registered in the
+        given cells around the point's own cell. Returns the edge, the
+        projection fraction and the distance (inf without candidates).
+        """
+        origin, cell, stride, nx, ny, keys, key_edges = self._edge_grid
+        edges = np.full(len(xy), -1, dtype=np.int64)
+        fractions = np.zeros(len(xy))
+        distances = np.full(len(xy), math.inf)
+        for start in range(0, len(xy), SNAP_CHUNK_SIZE):
+            block = xy[start:start + SNAP_CHUNK_SIZE]
+            cells = np.floor((block - origin) / cell).astype(np.int64)
+            cells[:, 0] = np.clip(cells[:, 0], -3, nx + 2)
+            cells[:, 1] = np.clip(cells[:, 1], -3, ny + 2)
+            pair_query, pair_edge = [], []
+            for dx, dy in cell_offsets:
+                query_keys = (cells[:, 0] + dx + 8) * stride + (cells[:, 1] + dy + 8)
+                lower = np.searchsorted(keys, query_keys, 'left')
+                counts = np.searchsorted(keys, query_keys, 'right') - lower
+                total = int(counts.sum())
+                if total:
+                    pair_query.append(np.repeat(np.arange(len(block)), counts))
+                    pair_edge.append(key_edges[np.repeat(lower - np.cumsum(counts) + counts, counts) + np.arange(total)])
+            if not pair_query:
+                continue
+            pair_query = np.concatenate(pair_query)
+            pair_edge = np.concatenate(pair_edge)
+            t, d = self._project(block[pair_query], pair_edge)
+            best = np.full(len(block), math.inf)
+            np.minimum.at(best, pair_query, d)
+            first = np.flatnonzero(d == best[pair_query])
+            rows = start + pair_query[first]
+            edges[rows], fractions[rows], distances[rows] = pair_edge[first], t[first], d[first]
+        return edges, fractions, distances
+
+    def snap(self, xy):
+        """
+        Snaps each (x, y) onto its nearest edge by projection. Returns the
+        nearer end node of that edge, the snap distance in layer units, the
+        edge id and the offset in metres from the edge's first node. All
+        points are snapped together with vectorised grid lookups; the few
+        further than a grid cell from any edge are compared with every
+        edge.
+        """
+        xy = np.asarray(xy, dtype=float).reshape(-1, 2)
+        if self.edge_count == 0:
+            nodes, distances = self.nearest_nodes(xy)
+            return nodes, distances, np.full(len(xy), -1, dtype=np.int64), np.zeros(len(xy))
+        if self._edge_grid is None:
+            self._build_edge_grid()
+        cell = self._edge_grid[1]
+
+        # Edge samples are at most half a cell apart, so a match within half
+        # a cell is final after searching the 3 x 3 block of cells, and one
+        # within a cell after adding the ring of cells around it.
+        edges, fractions, distances = self._nearest_in_cells(
+            xy, [(dx, dy) for dx in range(-1, 2) for dy in range(-1, 2)])
+        further = np.flatnonzero(distances > cell / 2)
+        if len(further):
+            ring = [(dx, dy) for dx in range(-2, 3) for dy in range(-2, 3) if max(abs(dx), abs(dy)) == 2]
+            ring_edges, ring_fractions, ring_distances = self._nearest_in_cells(xy[further], ring)
+            better = ring_distances < distances[further]
+            rows = further[better]
+            edges[rows], fractions[rows], distances[rows] = ring_edges[better], ring_fractions[better], ring_distances[better]
+
+        # Beyond one cell a closer edge could sit outside the searched
+        # cells, so those few points are checked against every edge.
+        far = np.flatnonzero(distances > cell)
+        rows_per_block = max(1, SNAP_PAIR_LIMIT // self.edge_count)
+        all_edges = np.arange(self.edge_count)
+        for start in range(0, len(far), rows_per_block):
+            rows = far[start:start + rows_per_block]
+            t, d = self._project(np.repeat(xy[rows], self.edge_count, axis=0), np.tile(all_edges, len(rows)))
+            t, d = t.reshape(len(rows), -1), d.reshape(len(rows), -1)
+            best = np.argmin(d, axis=1)
+            picked = np.arange(len(rows))
+            edges[rows], fractions[rows], distances[rows] = best, t[picked, best], d[picked, best]
+
+        nodes = np.where(fractions <= 0.5, self.edge_from[edges], self.edge_to[edges])
+        return nodes, distances, edges, fractions * self.edge_length[edges]
+
+    def costs_along(self, node_costs, edges, fractions):
+        """
+        Returns the cost of reaching points part way along edges (fraction
+        0 at the edge's first node, 1 at its last) from either end.
+        """
+        length = self.edge_length[edges]
+        with np.errstate(invalid='ignore'):
+            from_start = node_costs[self.edge_from[edges]] + np.where(fractions > 0, fractions * length, 0.0)
+            from_end = node_costs[self.edge_to[edges]] + np.where(fractions < 1, (1 - fractions) * length, 0.0)
+        return np.minimum(from_start, from_end)
+
+
+def haversine(lon1, lat1, lon2, lat2):
+    """
+    Great-circle distance in metres between arrays of lon/lat degrees.
+    """
+    lon1, lat1, lon2, lat2 = map(np.radians, (lon1, lat1, lon2, lat2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(a))
+
+
+def metric_coordinates(xy, crs):
+    """
+    Returns xy scaled to approximate local metres, so distance thresholds
+    given in metres can be applied in any CRS.
+    """
+    if crs.isGeographic():
+        lat0 = math.radians(float(np.mean(xy[:, 1]))) if len(xy) else 0.0
+        scale = math.radians(1.0) * EARTH_RADIUS
+        return np.column_stack([xy[:, 0] * scale * math.cos(lat0), xy[:, 1] * scale])
+    return xy * QgsUnitTypes.fromUnitToUnitFactor(crs.mapUnits(), QgsUnitTypes.DistanceMeters)
+
+
+def network_from_layer(road_layer, feedback=None, crs=None, transform_context=None):
+    """
+    Reads every line of the road layer and builds a RoadNetwork with edge
+    lengths in metres. With crs the lines are reprojected into that CRS as
+    they are read; otherwise the graph is in the layer's CRS. Returns None
+    when feedback is cancelled, so a partial graph is never used or cached.
+    """
+    polylines, line_ids = [], []
+    request = QgsFeatureRequest().setNoAttributes()
+    if crs is not None and crs != road_layer.crs():
+        request.setDestinationCrs(crs, transform_context)
+    else:
+        crs = road_layer.crs()
+    for feature in road_layer.getFeatures(request):
+        if feedback and feedback.isCanceled():
+            return None
+        geom = feature.geometry()
+        if not geom or geom.isEmpty():
+            continue
+        parts = geom.asMultiPolyline() if geom.isMultipart() else [geom.asPolyline()]
+        for part in parts:
+            polylines.append([(p.x(), p.y()) for p in part])
+            line_ids.append(feature.id())
+
+    unit_factor = QgsUnitTypes.fromUnitToUnitFactor(crs.mapUnits(), QgsUnitTypes.DistanceMeters)
+    return RoadNetwork.from_polylines(polylines, geographic=crs.isGeographic(), unit_factor=unit_factor, line_ids=line_ids)
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ * *
+ * This program is free software; you can redistribute it and/or modify  *
+ * it under the terms of the GNU General Public License as published by  *
+ * the Free Software Foundation; either version 2 of the License, or     *
+ * (at your option) any later version.                                   *
+ * *
+ ***************************************************************************/
+"""
+
+__author__ = 'Darren Green'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2025 by Darren Green'
+
+from qgis.core import (
+    QgsFeatureSink,
+    QgsProcessing,
+    QgsProcessingParameterFeatureSink,
+    QgsProcessingParameterFeatureSource,
+    QgsProcessingParameterField,
+    QgsProcessingParameterFile,
+    QgsProcessingParameterFileDestination,
+    QgsProcessingParameterMultipleLayers,
+    QgsVectorLayer,
+    QgsWkbTypes
+)
+from .door_knock_fields import is_completed
+from .door_knock_planner_algorithm import DoorKnockPlannerAlgorithm
+from .door_knock_tracker_algorithm import DoorKnockTrackerAlgorithm
+
+
+class DoorKnockPipelineAlgorithm(DoorKnockPlannerAlgorithm):
+    """
+    Runs the status tracker merge and re-plans the outstanding addresses in
+    one go. The outstanding addresses are handed to the planner as an
+    in-memory layer, and the planner's road graph, snapping and clustering
+    caches are shared with any earlier planner runs.
+    """
+    INPUT_CSVS = DoorKnockTrackerAlgorithm.INPUT_CSVS
+    INPUT_ORIGINAL_POINTS = DoorKnockTrackerAlgorithm.INPUT_ORIGINAL_POINTS
+    INPUT_NEW_POINTS = DoorKnockTrackerAlgorithm.INPUT_NEW_POINTS
+    OUTPUT_NEXT_PRIORITY = DoorKnockTrackerAlgorithm.OUTPUT_NEXT_PRIORITY
+    OUTPUT_EXCEPTIONS = DoorKnockTrackerAlgorithm.OUTPUT_EXCEPTIONS
+    INPUT_LABEL_FIELD = DoorKnockTrackerAlgorithm.INPUT_LABEL_FIELD
+    INPUT_DUPLICATE_DISTANCE = DoorKnockTrackerAlgorithm.INPUT_DUPLICATE_DISTANCE
+    INPUT_DUPLICATE_SIMILARITY = DoorKnockTrackerAlgorithm.INPUT_DUPLICATE_SIMILARITY
+    INPUT_DUPLICATE_ACTION = DoorKnockTrackerAlgorithm.INPUT_DUPLICATE_ACTION
+    INPUT_RULES = DoorKnockTrackerAlgorithm.INPUT_RULES
+    OUTPUT_MERGE_DECISIONS = DoorKnockTrackerAlgorithm.OUTPUT_MERGE_DECISIONS
+    DUPLICATES_MERGE = DoorKnockTrackerAlgorithm.DUPLICATES_MERGE
+    DUPLICATES_FLAG = DoorKnockTrackerAlgorithm.DUPLICATES_FLAG
+    DEFAULT_DUPLICATE_DISTANCE = DoorKnockTrackerAlgorithm.DEFAULT_DUPLICATE_DISTANCE
+    DEFAULT_DUPLICATE_SIMILARITY = DoorKnockTrackerAlgorithm.DEFAULT_DUPLICATE_SIMILARITY
+    addDuplicateParameters = DoorKnockTrackerAlgorithm.addDuplicateParameters
+    duplicateSettings = DoorKnockTrackerAlgorithm.duplicateSettings
+
+    def createInstance(self):
+        return DoorKnockPipelineAlgorithm()
+
+    def name(self):
+        return 'doorknockpipeline'
+
+    def displayName(self):
+        return self.tr('Door Knock Track and Re-Plan')
+
+    def shortHelpString(self):
+        return self.tr("Merges completed field data into the master address list and plans new routes for the addresses that are still outstanding, without writing intermediate layers.")
+
+    def initAlgorithm(self, config=None):
+        super().initAlgorithm(config)
+        # The addresses to plan come from the tracker merge instead.
+        self.removeParameter(self.INPUT_ADDRESSES)
+        self.removeParameter(self.INPUT_ADDRESS_STORE)
+        self.removeParameter(self.INPUT_UNIQUE_ID)
+        self.removeParameter(self.INPUT_PRIORITY)
+
+        self.addParameter(QgsProcessingParameterMultipleLayers(
+            self.INPUT_CSVS, self.tr('Completed Crew CSV Files'), QgsProcessing.TypeVector
+        ))
+        self.addParameter(QgsProcessingParameterFeatureSource(
+            self.INPUT_ORIGINAL_POINTS, self.tr('Original Visit Points Layer'), [QgsProcessing.TypeVectorPoint]
+        ))
+        self.addParameter(QgsProcessingParameterFeatureSource(
+            self.INPUT_NEW_POINTS, self.tr('New Address Layer'), [QgsProcessing.TypeVectorPoint], optional=True
+        ))
+        self.addParameter(QgsProcessingParameterField(
+            self.INPUT_UNIQUE_ID, self.tr('Unique Address ID Field'), parentLayerParameterName=self.INPUT_ORIGINAL_POINTS
+        ))
+        self.addParameter(QgsProcessingParameterField(
+            self.INPUT_PRIORITY, self.tr('Priority Field (higher is visited earlier, empty or 0 = normal)'),
+            parentLayerParameterName=self.INPUT_ORIGINAL_POINTS, type=QgsProcessingParameterField.Numeric, optional=True
+        ))
+        self.addDuplicateParameters()
+        self.addParameter(QgsProcessingParameterFile(
+            self.INPUT_RULES, self.tr('Validation Rules (JSON, default: completed visits need date, ID and org)'),
+            extension='json', optional=True
+        ))
+        self.addParameter(QgsProcessingParameterFeatureSink(
+            self.OUTPUT_NEXT_PRIORITY, self.tr('Updated Visit Points'), optional=True, createByDefault=False
+        ))
+        self.addParameter(QgsProcessingParameterFileDestination(
+            self.OUTPUT_EXCEPTIONS, self.tr('Validation Exception Report'), 'CSV files (*.csv)', optional=True
+        ))
+        self.addParameter(QgsProcessingParameterFileDestination(
+            self.OUTPUT_MERGE_DECISIONS, self.tr('New Address Merge Decisions'), 'CSV files (*.csv)', optional=True
+        ))
+
+    def processAlgorithm(self, parameters, context, feedback):
+        feedback.pushInfo("Stage 1: Merging crew returns into the master address list...")
+        csv_layers = self.parameterAsLayerList(parameters, self.INPUT_CSVS, context)
+        original_points_layer = self.parameterAsVectorLayer(parameters, self.INPUT_ORIGINAL_POINTS, context)
+        new_points_layer = self.parameterAsVectorLayer(parameters, self.INPUT_NEW_POINTS, context)
+        unique_id_field = self.parameterAsString(parameters, self.INPUT_UNIQUE_ID, context)
+        exception_report_path = self.parameterAsFileOutput(parameters, self.OUTPUT_EXCEPTIONS, context)
+        merge_report_path = self.parameterAsFileOutput(parameters, self.OUTPUT_MERGE_DECISIONS, context)
+
+        tracker = DoorKnockTrackerAlgorithm()
+        output_fields, updated_features, exception_rows, merge_decisions = tracker.mergeStatus(
+            csv_layers, original_points_layer, new_points_layer, unique_id_field, feedback,
+            rules_path=self.parameterAsFile(parameters, self.INPUT_RULES, context),
+            **self.duplicateSettings(parameters, context)
+        )
+        tracker.writeExceptionReport(exception_report_path, unique_id_field, exception_rows, feedback)
+        tracker.writeMergeDecisions(merge_report_path, unique_id_field, merge_decisions, feedback)
+
+        results = {}
+        (master_sink, master_dest_id) = self.parameterAsSink(
+            parameters, self.OUTPUT_NEXT_PRIORITY, context, output_fields,
+            original_points_layer.wkbType(), original_points_layer.crs()
+        )
+        if master_sink:
+            master_sink.addFeatures(updated_features, QgsFeatureSink.FastInsert)
+            results[self.OUTPUT_NEXT_PRIORITY] = master_dest_id
+
+        outstanding = [f for f in updated_features if not is_completed(f.attribute('Outcome'))]
+        feedback.pushInfo(f"Stage 2: Re-planning {len(outstanding)} outstanding of {len(updated_features)} addresses...")
+
+        outstanding_layer = QgsVectorLayer(
+            f"{QgsWkbTypes.displayString(original_points_layer.wkbType())}?crs={original_points_layer.crs().authid()}",
+            'Outstanding Addresses', 'memory'
+        )
+        outstanding_layer.dataProvider().addAttributes(output_fields.toList())
+        outstanding_layer.updateFields()
+        outstanding_layer.dataProvider().addFeatures(outstanding)
+
+        results.update(self.planRoutes(parameters, context, feedback, outstanding_layer))
+        return results
@@ -14,34 +14,46 @@ __author__ = 'Darren Green'
 __date__ = '2025-10-06' # MODIFIED - Updated date
 __copyright__ = '(C) 2025 by Darren Green'
 
-import csv
-import processing
+import math
+import os
+
 from qgis.PyQt.QtCore import QCoreApplication, QVariant
 from qgis.core import (
-    QgsCoordinateReferenceSystem,
+    QgsApplication,
     QgsCoordinateTransform,
-    QgsDefaultValue,
     QgsFeature,
+    QgsFeatureRequest,
     QgsField,
     QgsFields,
     QgsGeometry,
+    QgsPoint,
+    QgsPointXY,
     QgsProcessing,
     QgsProcessingAlgorithm,
     QgsProcessingException,
+    QgsProcessingParameterBand,
+    QgsProcessingParameterBoolean,
+    QgsProcessingParameterDefinition,
     QgsProcessingParameterEnum,
     QgsProcessingParameterFeatureSink,
     QgsProcessingParameterFeatureSource,
     QgsProcessingParameterField,
+    QgsProcessingParameterFile,
+    QgsProcessingParameterFolderDestination,
     QgsProcessingParameterNumber,
     QgsProcessingParameterPoint,
+    QgsProcessingParameterRasterLayer,
+    QgsProcessingParameterString,
     QgsProcessingParameterVectorLayer,
+    QgsProcessingOutputNumber,
     QgsProcessingUtils,
-    QgsProject,
-    QgsVectorLayer,
+    QgsRectangle,
+    QgsSpatialIndex,
     QgsWkbTypes,
-    QgsFeatureSink,
-    QgsEditorWidgetSetup # NEW: Import for widget configuration
+    QgsFeatureSink
 )
+from . import door_knock_cache as cache
+from .door_knock_field_packages import configure_outcome_field, write_crew_packages
 
 
 class DoorKnockPlannerAlgorithm(QgsProcessingAlgorithm):
@@ -50,11 +62,50 @@ class DoorKnockPlannerAlgorithm(QgsProcessingAlgorithm):
     """
     INPUT_POLYGON = 'INPUT_POLYGON'
     INPUT_ADDRESSES = 'INPUT_ADDRESSES'
+    INPUT_ADDRESS_STORE = 'INPUT_ADDRESS_STORE'
     INPUT_ROADS = 'INPUT_ROADS'
+    INPUT_ROUTING_MODE = 'INPUT_ROUTING_MODE'
+    INPUT_ROUTING_STRATEGY = 'INPUT_ROUTING_STRATEGY'
+    INPUT_TRAVEL_MODE = 'INPUT_TRAVEL_MODE'
+    INPUT_SPEED_FIELD = 'INPUT_SPEED_FIELD'
+    INPUT_SPEED_LOOKUP = 'INPUT_SPEED_LOOKUP'
+    INPUT_DRIVE_SPEED = 'INPUT_DRIVE_SPEED'
     INPUT_START_POINT = 'INPUT_START_POINT'
     INPUT_NUM_CREWS = 'INPUT_NUM_CREWS'
+    INPUT_UNIQUE_ID = 'INPUT_UNIQUE_ID'
+    INPUT_PRIORITY = 'INPUT_PRIORITY'
+    INPUT_HAZARD_RASTER = 'INPUT_HAZARD_RASTER'
+    INPUT_HAZARD_BAND = 'INPUT_HAZARD_BAND'
+    INPUT_PARTITION_SIZE = 'INPUT_PARTITION_SIZE'
+    INPUT_DEPOTS = 'INPUT_DEPOTS'
+    INPUT_DEPOT_CREWS = 'INPUT_DEPOT_CREWS'
+    INPUT_STOP_TOLERANCE = 'INPUT_STOP_TOLERANCE'
+    INPUT_SNAP_TOLERANCE = 'INPUT_SNAP_TOLERANCE'
+    INPUT_CLOSURES = 'INPUT_CLOSURES'
+    INPUT_CLOSURE_FACTOR = 'INPUT_CLOSURE_FACTOR'
+    INPUT_USE_HIERARCHY = 'INPUT_USE_HIERARCHY'
+    INPUT_STREET_BLOCKS = 'INPUT_STREET_BLOCKS'
+    INPUT_SERVICE_MINUTES = 'INPUT_SERVICE_MINUTES'
+    INPUT_SHIFT_HOURS = 'INPUT_SHIFT_HOURS'
+    INPUT_TRAVEL_SPEED = 'INPUT_TRAVEL_SPEED'
     OUTPUT_VISIT_POINTS = 'OUTPUT_VISIT_POINTS' 
     OUTPUT_CSV = 'OUTPUT_CSV'
+    OUTPUT_CREW_PACKAGES = 'OUTPUT_CREW_PACKAGES'
+    OUTPUT_UNREACHABLE = 'OUTPUT_UNREACHABLE'
+    OUTPUT_TOTAL_COST = 'OUTPUT_TOTAL_COST'
+    OUTPUT_MAX_CREW_COST = 'OUTPUT_MAX_CREW_COST'
+    OUTPUT_MAX_CREW_MINUTES = 'OUTPUT_MAX_CREW_MINUTES'
+
+    ROUTING_NETWORK = 0
+    ROUTING_STRAIGHT_LINE = 1
+    STRATEGY_SHORTEST = 0
+    STRATEGY_FASTEST = 1
+    TRAVEL_WALK = 0
+    TRAVEL_DRIVE = 1
+    DEFAULT_SPEED_LOOKUP = (
+        'motorway=100, trunk=80, primary=70, secondary=60, tertiary=50, unclassified=40, residential=40, '
+        'living_street=10, service=20, track=15, footway=0, path=0, pedestrian=0, steps=0, cycleway=0'
+    )
 
     def tr(self, string):
         return QCoreApplication.translate('Processing', string)
@@ -84,19 +135,129 @@ class DoorKnockPlannerAlgorithm(QgsProcessingAlgorithm):
         ))
         self.addParameter(QgsProcessingParameterFeatureSource(
             self.INPUT_ADDRESSES, self.tr('Address Points'),
-            [QgsProcessing.TypeVectorPoint]
+            [QgsProcessing.TypeVectorPoint], optional=True
+        ))
+        self.addParameter(QgsProcessingParameterFile(
+            self.INPUT_ADDRESS_STORE, self.tr('Preprocessed Address Store (instead of Address Points)'),
+            behavior=QgsProcessingParameterFile.Folder, optional=True
         ))
         self.addParameter(QgsProcessingParameterVectorLayer(
-            self.INPUT_ROADS, self.tr('Road Network'),
-            [QgsProcessing.TypeVectorLine]
+            self.INPUT_ROADS, self.tr('Road Network (not needed for straight-line routing)'),
+            [QgsProcessing.TypeVectorLine], optional=True
+        ))
+        self.addParameter(QgsProcessingParameterEnum(
+            self.INPUT_ROUTING_MODE, self.tr('Routing Mode'),
+            options=[self.tr('Road network'), self.tr('Straight line (no road data, fastest)')],
+            defaultValue=self.ROUTING_NETWORK
+        ))
+        self.addParameter(QgsProcessingParameterEnum(
+            self.INPUT_ROUTING_STRATEGY, self.tr('Routing Strategy'),
+            options=[self.tr('Shortest distance (cost in metres)'), self.tr('Fastest time (cost in minutes)')],
+            defaultValue=self.STRATEGY_SHORTEST
         ))
+        self.addParameter(QgsProcessingParameterEnum(
+            self.INPUT_TRAVEL_MODE, self.tr('Travel Mode (fastest time)'),
+            options=[self.tr('Walk'), self.tr('Drive')], defaultValue=self.TRAVEL_WALK
+        ))
+        self.addParameter(QgsProcessingParameterField(
+            self.INPUT_SPEED_FIELD, self.tr('Road Class or Speed Field (driving)'),
+            parentLayerParameterName=self.INPUT_ROADS, optional=True
+        ))
+        speed_lookup_param = QgsProcessingParameterString(
+            self.INPUT_SPEED_LOOKUP, self.tr('Driving Speed per Road Class (class=km/h, 0 = not drivable)'),
+            defaultValue=self.DEFAULT_SPEED_LOOKUP, optional=True
+        )
+        speed_lookup_param.setFlags(speed_lookup_param.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(speed_lookup_param)
+        drive_speed_param = QgsProcessingParameterNumber(
+            self.INPUT_DRIVE_SPEED, self.tr('Driving Speed for Other Roads (km/h)'),
+            QgsProcessingParameterNumber.Double, defaultValue=40.0, minValue=1.0
+        )
+        drive_speed_param.setFlags(drive_speed_param.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(drive_speed_param)
         self.addParameter(QgsProcessingParameterPoint(
-            self.INPUT_START_POINT, self.tr('Start Location')
+            self.INPUT_START_POINT, self.tr('Start Location'), optional=True
+        ))
+        self.addParameter(QgsProcessingParameterFeatureSource(
+            self.INPUT_DEPOTS, self.tr('Depots / Staging Areas (overrides Start Location)'),
+            [QgsProcessing.TypeVectorPoint], optional=True
+        ))
+        self.addParameter(QgsProcessingParameterField(
+            self.INPUT_DEPOT_CREWS, self.tr('Crews per Depot Field'),
+            parentLayerParameterName=self.INPUT_DEPOTS, type=QgsProcessingParameterField.Numeric, optional=True
+        ))
+        self.addParameter(QgsProcessingParameterFeatureSource(
+            self.INPUT_CLOSURES, self.tr('Road Closures (lines or polygons)'),
+            [QgsProcessing.TypeVectorLine, QgsProcessing.TypeVectorPolygon], optional=True
+        ))
+        self.addParameter(QgsProcessingParameterField(
+            self.INPUT_CLOSURE_FACTOR, self.tr('Closure Delay Factor Field (empty = road closed)'),
+            parentLayerParameterName=self.INPUT_CLOSURES, type=QgsProcessingParameterField.Numeric, optional=True
         ))
         self.addParameter(QgsProcessingParameterNumber(
             self.INPUT_NUM_CREWS, self.tr('Number of Available Crews'),
             QgsProcessingParameterNumber.Integer, defaultValue=1, minValue=1
         ))
+        self.addParameter(QgsProcessingParameterNumber(
+            self.INPUT_SERVICE_MINUTES, self.tr('Average Minutes per Address'),
+            QgsProcessingParameterNumber.Double, defaultValue=3.0, minValue=0.0
+        ))
+        self.addParameter(QgsProcessingParameterNumber(
+            self.INPUT_SHIFT_HOURS, self.tr('Shift Length (hours, 0 = no limit)'),
+            QgsProcessingParameterNumber.Double, defaultValue=8.0, minValue=0.0
+        ))
+        self.addParameter(QgsProcessingParameterField(
+            self.INPUT_UNIQUE_ID, self.tr('Unique Address ID Field (for crew package updates)'),
+            parentLayerParameterName=self.INPUT_ADDRESSES, optional=True
+        ))
+        self.addParameter(QgsProcessingParameterField(
+            self.INPUT_PRIORITY, self.tr('Priority Field (higher is visited earlier, empty or 0 = normal)'),
+            parentLayerParameterName=self.INPUT_ADDRESSES, type=QgsProcessingParameterField.Numeric, optional=True
+        ))
+        self.addParameter(QgsProcessingParameterRasterLayer(
+            self.INPUT_HAZARD_RASTER, self.tr('Hazard Raster (e.g. flood depth or fire intensity; higher is visited earlier)'),
+            optional=True
+        ))
+        self.addParameter(QgsProcessingParameterBand(
+            self.INPUT_HAZARD_BAND, self.tr('Hazard Band'), defaultValue=1,
+            parentLayerParameterName=self.INPUT_HAZARD_RASTER, optional=True
+        ))
+        partition_size_param = QgsProcessingParameterNumber(
+            self.INPUT_PARTITION_SIZE, self.tr('Maximum Addresses per Crew Partition (0 = divide the area in one go)'),
+            QgsProcessingParameterNumber.Integer, defaultValue=0, minValue=0
+        )
+        partition_size_param.setFlags(partition_size_param.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(partition_size_param)
+        stop_tolerance_param = QgsProcessingParameterNumber(
+            self.INPUT_STOP_TOLERANCE, self.tr('Combine Addresses Closer Than (metres, 0 = off)'),
+            QgsProcessingParameterNumber.Double, defaultValue=1.0, minValue=0.0
+        )
+        stop_tolerance_param.setFlags(stop_tolerance_param.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(stop_tolerance_param)
+        snap_tolerance_param = QgsProcessingParameterNumber(
+            self.INPUT_SNAP_TOLERANCE, self.tr('Flag Addresses Further From a Road Than (metres)'),
+            QgsProcessingParameterNumber.Double, defaultValue=100.0, minValue=0.0
+        )
+        snap_tolerance_param.setFlags(snap_tolerance_param.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(snap_tolerance_param)
+        hierarchy_param = QgsProcessingParameterBoolean(
+            self.INPUT_USE_HIERARCHY, self.tr('Precompute Road Hierarchy (slow once, faster routing afterwards)'),
+            defaultValue=False
+        )
+        hierarchy_param.setFlags(hierarchy_param.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(hierarchy_param)
+        street_blocks_param = QgsProcessingParameterBoolean(
+            self.INPUT_STREET_BLOCKS, self.tr('Plan by Street Block (one side of a street at a time)'),
+            defaultValue=True
+        )
+        street_blocks_param.setFlags(street_blocks_param.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(street_blocks_param)
+        travel_speed_param = QgsProcessingParameterNumber(
+            self.INPUT_TRAVEL_SPEED, self.tr('Crew Travel Speed (km/h)'),
+            QgsProcessingParameterNumber.Double, defaultValue=5.0, minValue=0.1
+        )
+        travel_speed_param.setFlags(travel_speed_param.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(travel_speed_param)
         
         self.addParameter(QgsProcessingParameterFeatureSink(
             self.OUTPUT_VISIT_POINTS, self.tr('Visit Points (Ordered)')
@@ -104,54 +265,644 @@ class DoorKnockPlannerAlgorithm(QgsProcessingAlgorithm):
         self.addParameter(QgsProcessingParameterFeatureSink(
             self.OUTPUT_CSV, self.tr('Door Knock List (Table)')
         ))
+        self.addParameter(QgsProcessingParameterFolderDestination(
+            self.OUTPUT_CREW_PACKAGES, self.tr('Crew Field Packages Folder'),
+            optional=True, createByDefault=False
+        ))
+        self.addParameter(QgsProcessingParameterFeatureSink(
+            self.OUTPUT_UNREACHABLE, self.tr('Unreachable Addresses (not connected by road to a start)'),
+            optional=True
+        ))
+        self.addOutput(QgsProcessingOutputNumber(
+            self.OUTPUT_TOTAL_COST, self.tr('Total Crew Cost (sum of each crew\'s last visit cost)')
+        ))
+        self.addOutput(QgsProcessingOutputNumber(
+            self.OUTPUT_MAX_CREW_COST, self.tr('Longest Crew Cost')
+        ))
+        self.addOutput(QgsProcessingOutputNumber(
+            self.OUTPUT_MAX_CREW_MINUTES, self.tr('Longest Crew Day (minutes, travel plus time at doors)')
+        ))
 
     def processAlgorithm(self, parameters, context, feedback):
         """
         Main algorithm execution method.
         """
+        store_path = self.parameterAsFile(parameters, self.INPUT_ADDRESS_STORE, context)
+        if store_path:
+            address_layer = self.openAddressStore(store_path)
+        else:
+            address_layer = self.parameterAsVectorLayer(parameters, self.INPUT_ADDRESSES, context)
+        return self.planRoutes(parameters, context, feedback, address_layer)
+
+    def checkParameterValues(self, parameters, context):
+        """
+        The field parameters list the fields of the Address Points layer; with
+        an address store their names are checked against the store instead.
+        """
+        ok, message = super().checkParameterValues(parameters, context)
+        store_path = self.parameterAsFile(parameters, self.INPUT_ADDRESS_STORE, context) \
+            if self.parameterDefinition(self.INPUT_ADDRESS_STORE) else ''
+        if not ok or not store_path:
+            return ok, message
+        try:
+            store = self.openAddressStore(store_path)
+            for name, numeric in ((self.INPUT_UNIQUE_ID, False), (self.INPUT_PRIORITY, True)):
+                field = self.parameterAsString(parameters, name, context)
+                if field:
+                    store.require_field(field, numeric)
+        except (QgsProcessingException, ValueError) as e:
+            return False, str(e)
+        return True, ''
+
+    def openAddressStore(self, path):
+        """
+        Opens a store written by the address store algorithm. The open store
+        (only its memory maps and header) is kept in the session cache until
+        the store is rewritten.
+        """
+        from .door_knock_address_store import META_FILE, AddressStore, is_store
+
+        if not is_store(path):
+            raise QgsProcessingException(f"'{path}' is not a preprocessed address store.")
+        try:
+            return cache.cached(
+                'address_store', (os.path.abspath(path), os.path.getmtime(os.path.join(path, META_FILE))),
+                lambda: AddressStore(path)
+            )
+        except ValueError as e:
+            raise QgsProcessingException(str(e))
+
+    def hierarchyFolder(self):
+        """
+        Folder in the QGIS profile where road hierarchies are saved, so they
+        are reused across sessions and shifts.
+        """
+        return os.path.join(QgsApplication.qgisSettingsDirPath(), 'door_knock_planner', 'hierarchies')
+
+    def readDepots(self, parameters, context, work_crs):
+        """
+        Returns the depot coordinates (in the working CRS), their feature ids
+        and their crew counts. Without a depot layer the start location is
+        used as a single depot with id None that takes every crew; without a
+        crew count field the crew counts are None and are shared out later.
+        """
+        import numpy as np
+        from .door_knock_crs import transform_xy
+
+        depot_layer = self.parameterAsVectorLayer(parameters, self.INPUT_DEPOTS, context)
+        if not depot_layer:
+            if parameters.get(self.INPUT_START_POINT) in (None, ''):
+                raise QgsProcessingException("Either a Start Location or a Depots layer is required.")
+            start_point = self.parameterAsPoint(parameters, self.INPUT_START_POINT, context, work_crs)
+            num_crews = self.parameterAsInt(parameters, self.INPUT_NUM_CREWS, context)
+            return np.array([[start_point.x(), start_point.y()]]), [None], [num_crews]
+
+        crews_field = self.parameterAsString(parameters, self.INPUT_DEPOT_CREWS, context)
+
+        depot_xy, depot_ids, depot_crews = [], [], []
+        for feature in depot_layer.getFeatures():
+            if not feature.hasGeometry():
+                continue
+            crews = None
+            if crews_field:
+                crews = int(feature[crews_field] or 0)
+                if crews <= 0:
+                    continue
+            point = feature.geometry().centroid().asPoint()
+            depot_xy.append((point.x(), point.y()))
+            depot_ids.append(feature.id())
+            depot_crews.append(crews)
+
+        if not depot_xy:
+            raise QgsProcessingException("The depots layer has no depots with crews assigned.")
+        depot_xy = transform_xy(depot_xy, depot_layer.crs(), work_crs, context.transformContext())
+        return depot_xy, depot_ids, depot_crews if crews_field else None
+
+    def divideAddresses(self, stop_xy, stop_weights, groups, partition_size):
+        """
+        Divides the stops among the crews. Each group is a
+        (members, crews, start_xy) tuple, one per depot. Within a group the
+        stops are split into partitions (tiles, when partition_size is set
+        and exceeded), the group's crews are shared between them by
+        workload and K-Means runs in each. Only the crew areas are formed
+        per partition; every route is still planned on the whole network. Workloads count addresses, i.e. the
+        stop_weights. Returns the crew index (0-based) of every stop, the
+        tiles as index arrays and the group of every crew.
+        Crews are numbered group by group and tile by tile, nearest tile to
+        the group's start first, so crew ids are consistent across the area.
+        """
+        import numpy as np
+        from .door_knock_clustering import kmeans
+        from .door_knock_tiling import allocate_crews, split_tiles
+
+        labels = np.zeros(len(stop_xy), dtype=np.int64)
+        all_tiles = []
+        crew_groups = []
+        for group, (members, num_crews, start_xy) in enumerate(groups):
+            if partition_size and stop_weights[members].sum() > partition_size:
+                tiles = [members[t] for t in split_tiles(stop_xy[members], partition_size, num_crews, stop_weights[members])]
+            else:
+                tiles = [members]
+            tiles.sort(key=lambda tile: float(np.hypot(*(stop_xy[tile].mean(axis=0) - start_xy))))
+            tile_crews = allocate_crews([stop_weights[tile].sum() for tile in tiles], num_crews)
+
+            for tile, crews in zip(tiles, tile_crews):
+                labels[tile] = kmeans(stop_xy[tile], crews) + len(crew_groups)
+                crew_groups.extend([group] * crews)
+            all_tiles.extend(tiles)
+        return labels, all_tiles, crew_groups
+
+    def extractAddresses(self, address_layer, polygon_layer, context, work_crs):
+        """
+        Returns an AddressTable of the addresses that intersect the area of
+        interest, located in the working CRS. The spatial index of the
+        address layer (with its geometries) is cached, so repeated runs over
+        the same addresses (e.g. batch scenarios) only test the candidates
+        inside the area's bounding box and do not read the layer again;
+        attributes are read later, only for the output features.
+        """
+        from .door_knock_address_store import AddressStore
+        from .door_knock_addresses import AddressTable, layer_attribute_source
+
+        if isinstance(address_layer, AddressStore):
+            return self.extractStoreAddresses(address_layer, polygon_layer, context, work_crs)
+        index = cache.cached(
+            'address_index', cache.layer_key(address_layer),
+            lambda: QgsSpatialIndex(address_layer.getFeatures(QgsFeatureRequest().setNoAttributes()),
+                                    flags=QgsSpatialIndex.FlagStoreFeatureGeometries)
+        )
+
+        transform = None
+        if polygon_layer.crs() != address_layer.crs():
+            transform = QgsCoordinateTransform(polygon_layer.crs(), address_layer.crs(), context.transformContext())
+        parts = []
+        for feature in polygon_layer.getFeatures(QgsFeatureRequest().setNoAttributes()):
+            geom = QgsGeometry(feature.geometry())
+            if geom.isEmpty():
+                continue
+            if transform:
+                geom.transform(transform)
+            parts.append(geom)
+        if not parts:
+            return AddressTable([], [])
+        area = QgsGeometry.unaryUnion(parts)
+        engine = QgsGeometry.createGeometryEngine(area.constGet())
+        engine.prepareGeometry()
+
+        candidates = index.intersects(area.boundingBox())
+        inside = sorted(fid for fid in candidates if engine.intersects(index.geometry(fid).constGet()))
+        return AddressTable.from_points(
+            inside, [index.geometry(fid).centroid().asPoint() for fid in inside], address_layer.crs(), work_crs,
+            context.transformContext(), layer_attribute_source(address_layer)
+        )
+
+    def extractStoreAddresses(self, store, polygon_layer, context, work_crs):
+        """
+        extractAddresses for a preprocessed address store. Only the grid
+        cells under the area's bounding box are read from the memory-mapped
+        columns; cells wholly inside the area are taken without testing
+        their addresses, and only those in cells on the area's boundary are
+        tested one by one. The rows of the store stand in for feature ids.
+        """
+        import numpy as np
+        from .door_knock_addresses import AddressTable
+        from .door_knock_crs import transform_xy
+
+        parts = []
+        for feature in polygon_layer.getFeatures(QgsFeatureRequest().setNoAttributes()):
+            geom = QgsGeometry(feature.geometry())
+            if not geom.isEmpty():
+                parts.append(geom)
+        if not parts:
+            return AddressTable([], [])
+        area = QgsGeometry.unaryUnion(parts)
+        if polygon_layer.crs() != store.crs():
+            area.transform(QgsCoordinateTransform(polygon_layer.crs(), store.crs(), context.transformContext()))
+        engine = QgsGeometry.createGeometryEngine(area.constGet())
+        engine.prepareGeometry()
+
+        box = area.boundingBox()
+        cells = store.cell_range((box.xMinimum(), box.yMinimum(), box.xMaximum(), box.yMaximum()))
+        if cells is None:
+            return AddressTable([], [])
+        x0, x1, y0, y1 = cells
+        grid = (np.arange(y0, y1 + 1)[:, None] * store.shape[0] + np.arange(x0, x1 + 1)[None, :]).ravel()
+        grid = grid[store.cell_start[grid + 1] > store.cell_start[grid]]
+
+        inner, edge = [], []
+        for cell in grid.tolist():
+            cell_geom = QgsGeometry.fromRect(QgsRectangle(*store.cell_rect(cell)))
+            if engine.contains(cell_geom.constGet()):
+                inner.append(cell)
+            elif engine.intersects(cell_geom.constGet()):
+                edge.append(cell)
+        edge_rows = store.rows_in_cells(edge)
+        edge_rows = edge_rows[[
+            engine.intersects(QgsPoint(x, y)) for x, y in zip(store.x[edge_rows].tolist(), store.y[edge_rows].tolist())
+        ]] if len(edge_rows) else edge_rows
+        rows = np.sort(np.concatenate([store.rows_in_cells(inner), edge_rows]))
+
+        source_xy = np.column_stack([store.x[rows], store.y[rows]])
+        xy = transform_xy(source_xy, store.crs(), work_crs, context.transformContext())
+        return AddressTable(rows, xy, source_xy, store.attributes)
+
+    def writeUnreachable(self, parameters, context, address_layer, addresses, rows, components, snap_metres):
+        """
+        Writes the address rows that no depot can reach by road to the
+        Unreachable Addresses output, with the road network component each
+        was snapped to. Returns the output's id, or None when not wanted.
+        """
+        fields = QgsFields()
+        fields.append(QgsField('component_id', QVariant.Int))
+        fields.append(QgsField('snap_distance', QVariant.Double))
+        for field in address_layer.fields():
+            fields.append(field)
+        (sink, dest_id) = self.parameterAsSink(
+            parameters, self.OUTPUT_UNREACHABLE, context, fields, QgsWkbTypes.Point, address_layer.crs()
+        )
+        if sink is None:
+            return None
+
+        address_field_names = address_layer.fields().names()
+        features = []
+        for index, component, snap, attributes in zip(
+                rows.tolist(), components.tolist(), snap_metres.tolist(), addresses.attributes(rows)):
+            feature = QgsFeature(fields)
+            feature.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(*addresses.source_xy[index])))
+            for field_name, value in zip(address_field_names, attributes):
+                feature.setAttribute(field_name, value)
+            feature.setAttribute('component_id', component)
+            feature.setAttribute('snap_distance', round(snap, 1))
+            features.append(feature)
+        sink.addFeatures(features, QgsFeatureSink.FastInsert)
+        return dest_id
+
+    def planRoutes(self, parameters, context, feedback, address_layer):
+        """
+        Plans the crew routes for the given address layer (or open address
+        store). The remaining inputs and the output sinks are read from
+        parameters, so the pipeline algorithm can hand over an in-memory
+        address layer.
+        """
+        # NumPy and the planning engine are imported on the first run rather
+        # than when the provider registers the algorithm, so QGIS starts fast.
+        import numpy as np
+        from .door_knock_balancing import rebalance
+        from .door_knock_blocks import block_representatives, street_blocks, walk_blocks
+        from .door_knock_closures import apply_closures, closures_key, read_closures
+        from .door_knock_clustering import group_colocated
+        from .door_knock_crs import transform_xy, working_crs
+        from .door_knock_hierarchy import load_or_build
+        from .door_knock_network import network_from_layer
+        from .door_knock_raster import sample_raster
+        from .door_knock_sequencing import DETOUR_FACTOR, crew_tour, priority_tiers, straight_line_tour
+        from .door_knock_speeds import (
+            average_metres_per_minute, edge_speeds, parse_speed_lookup, road_values, travel_minutes
+        )
+        from .door_knock_tiling import allocate_crews
+
         try:
-            # --- Steps 1-3 remain the same ---
             feedback.pushInfo("Step 1: Initializing and extracting addresses...")
 
             polygon_layer = self.parameterAsVectorLayer(parameters, self.INPUT_POLYGON, context)
-            address_layer = self.parameterAsVectorLayer(parameters, self.INPUT_ADDRESSES, context)
             road_layer = self.parameterAsVectorLayer(parameters, self.INPUT_ROADS, context)
-            start_point = self.parameterAsPoint(parameters, self.INPUT_START_POINT, context)
-            num_crews = self.parameterAsInt(parameters, self.INPUT_NUM_CREWS, context)
+            unique_id_field = self.parameterAsString(parameters, self.INPUT_UNIQUE_ID, context)
+            priority_field = self.parameterAsString(parameters, self.INPUT_PRIORITY, context)
+            hazard_layer = self.parameterAsRasterLayer(parameters, self.INPUT_HAZARD_RASTER, context)
+            hazard_band = self.parameterAsInt(parameters, self.INPUT_HAZARD_BAND, context) or 1
+            packages_folder = self.parameterAsString(parameters, self.OUTPUT_CREW_PACKAGES, context)
+            partition_size = self.parameterAsInt(parameters, self.INPUT_PARTITION_SIZE, context)
+            stop_tolerance = self.parameterAsDouble(parameters, self.INPUT_STOP_TOLERANCE, context)
+            snap_tolerance = self.parameterAsDouble(parameters, self.INPUT_SNAP_TOLERANCE, context)
+            service_minutes = self.parameterAsDouble(parameters, self.INPUT_SERVICE_MINUTES, context)
+            shift_minutes = self.parameterAsDouble(parameters, self.INPUT_SHIFT_HOURS, context) * 60.0
+            metres_per_minute = self.parameterAsDouble(parameters, self.INPUT_TRAVEL_SPEED, context) * 1000.0 / 60.0
+            straight_line = self.parameterAsEnum(parameters, self.INPUT_ROUTING_MODE, context) == self.ROUTING_STRAIGHT_LINE
+            use_blocks = self.parameterAsBool(parameters, self.INPUT_STREET_BLOCKS, context) and not straight_line
+            fastest = self.parameterAsEnum(parameters, self.INPUT_ROUTING_STRATEGY, context) == self.STRATEGY_FASTEST \
+                and not straight_line
+            drive = self.parameterAsEnum(parameters, self.INPUT_TRAVEL_MODE, context) == self.TRAVEL_DRIVE
+            speed_field = self.parameterAsString(parameters, self.INPUT_SPEED_FIELD, context)
+            speed_lookup_text = self.parameterAsString(parameters, self.INPUT_SPEED_LOOKUP, context)
+            drive_speed = self.parameterAsDouble(parameters, self.INPUT_DRIVE_SPEED, context)
+            try:
+                speed_lookup = parse_speed_lookup(speed_lookup_text)
+            except ValueError as e:
+                raise QgsProcessingException(str(e))
 
-            project_crs = QgsProject.instance().crs()
-
-            if not polygon_layer or not address_layer or not road_layer:
+            if address_layer is None:
+                raise QgsProcessingException("Either Address Points or a Preprocessed Address Store is required.")
+            if not polygon_layer:
                 raise QgsProcessingException("One or more input layers are invalid.")
+            if not road_layer and not straight_line:
+                raise QgsProcessingException("A Road Network layer is required unless the Routing Mode is straight line.")
+            if straight_line:
+                road_layer = None
 
-            extract_result = processing.run("native:extractbylocation", {
-                'INPUT': address_layer, 'PREDICATE': [0], 'INTERSECT': polygon_layer, 'OUTPUT': 'memory:'
-            }, context=context, feedback=feedback, is_child_algorithm=True)
+            # Everything is planned in one metric working CRS: the inputs are
+            # reprojected once into flat arrays here and only the output
+            # features keep their original geometry.
+            work_crs = working_crs(road_layer, polygon_layer, context.transformContext())
+            feedback.pushInfo(f" -> Planning in {work_crs.authid()} ({work_crs.description()}).")
+            depot_xy, depot_ids, depot_crews = self.readDepots(parameters, context, work_crs)
+            use_depots = depot_ids[0] is not None
 
-            extracted_layer = QgsProcessingUtils.mapLayerFromString(extract_result['OUTPUT'], context)
-            
-            if not extracted_layer or extracted_layer.featureCount() == 0:
+            addresses = self.extractAddresses(address_layer, polygon_layer, context, work_crs)
+            if not len(addresses):
                 raise QgsProcessingException("No addresses found in the area of interest.")
+            address_xy = addresses.xy
 
-            feedback.pushInfo(f"Step 2: Dividing {extracted_layer.featureCount()} addresses among {num_crews} crews...")
-            
-            clustered_result = processing.run("native:kmeansclustering", {
-                'INPUT': extracted_layer, 'CLUSTERS': num_crews, 'OUTPUT': 'memory:'
-            }, context=context, feedback=feedback, is_child_algorithm=True)
-            
-            clustered_addresses = QgsProcessingUtils.mapLayerFromString(clustered_result['OUTPUT'], context)
+            # The hazard raster is read once, as one block under the
+            # addresses, and sampled at every address in one lookup.
+            if hazard_layer:
+                addresses.hazard = sample_raster(hazard_layer, hazard_band, transform_xy(
+                    addresses.source_xy, address_layer.crs(), hazard_layer.crs(), context.transformContext()
+                ))
+                sampled = int(np.isfinite(addresses.hazard).sum())
+                feedback.pushInfo(f" -> Sampled the hazard raster '{hazard_layer.name()}' at {sampled} addresses.")
+                if not sampled:
+                    feedback.pushWarning("The hazard raster has no values under the addresses in the area of interest.")
+
+            # Addresses at (nearly) the same spot, such as units in one block,
+            # become a single stop; only stops are clustered and routed.
+            addresses.stop = group_colocated(address_xy, stop_tolerance)
+            stop_weights = np.bincount(addresses.stop)
+            stop_xy = np.column_stack([
+                np.bincount(addresses.stop, addresses.x) / stop_weights,
+                np.bincount(addresses.stop, addresses.y) / stop_weights
+            ])
+            stop_order = np.argsort(addresses.stop, kind='stable')
+            stop_bounds = np.concatenate([[0], np.cumsum(stop_weights)])
+            stops_key = cache.array_key(stop_xy)
+            if len(stop_xy) < len(address_xy):
+                feedback.pushInfo(f" -> Combined {len(address_xy)} addresses into {len(stop_xy)} stops.")
+
+            feedback.pushInfo("Step 2: Measuring network distances from the start...")
+
+            route_metres_per_minute = metres_per_minute
+            if straight_line:
+                feedback.pushInfo(" -> Straight-line routing: no road network is used and addresses go to the closest depot.")
+                graph_key = 'straight_line'
+                stop_depot = np.full(len(stop_xy), -1, dtype=np.int64)
+                stop_snap_metres = None
+                far_from_road = np.zeros(len(stop_xy), dtype=bool)
+                stop_unreachable = np.zeros(len(stop_xy), dtype=bool)
+            else:
+                road_key = (cache.layer_key(road_layer), work_crs.authid())
+                network = cache.get('network', road_key)
+                if network is None:
+                    feedback.pushInfo(" -> Building road network graph...")
+                    network = network_from_layer(road_layer, feedback, work_crs, context.transformContext())
+                    if network is None:
+                        raise QgsProcessingException("Cancelled while building the road network graph.")
+                    cache.put('network', road_key, network)
+                else:
+                    feedback.pushInfo(" -> Reusing cached road network graph.")
+                if network.node_count == 0:
+                    raise QgsProcessingException("The road network layer contains no usable lines.")
+
+                # Travel times and closures only swap the weight array, so the
+                # graph structure and the snapping below still come from the
+                # cached network. Walking and driving each have their own
+                # array of minutes per edge, kept with the graph.
+                graph_key = road_key
+                weighted_network = network
+                if fastest:
+                    if drive:
+                        graph_key = (road_key, 'drive', speed_field, tuple(sorted(speed_lookup.items())), drive_speed)
+                        weighted_network = cache.cached('travel_time', graph_key, lambda: network.with_edge_lengths(
+                            travel_minutes(network.edge_length, edge_speeds(
+                                network, road_values(road_layer, speed_field) if speed_field else {}, speed_lookup, drive_speed
+                            ))
+                        ))
+                    else:
+                        graph_key = (road_key, 'walk', metres_per_minute)
+                        weighted_network = cache.cached('travel_time', graph_key, lambda: network.with_edge_lengths(
+                            network.edge_length / metres_per_minute
+                        ))
+                    route_metres_per_minute = average_metres_per_minute(network.edge_length, weighted_network.edge_length)
+                    if route_metres_per_minute is None:
+                        raise QgsProcessingException("No road in the network can be used in this travel mode.")
+                    feedback.pushInfo(
+                        f" -> Routing by {'driving' if drive else 'walking'} time (about {route_metres_per_minute * 0.06:.0f} km/h on average)."
+                    )
+
+                closures_layer = self.parameterAsVectorLayer(parameters, self.INPUT_CLOSURES, context)
+                if closures_layer:
+                    closure_factor_field = self.parameterAsString(parameters, self.INPUT_CLOSURE_FACTOR, context)
+                    closures = read_closures(closures_layer, closure_factor_field, work_crs, context.transformContext())
+                    graph_key = (graph_key, closures_key(closures))
+                    routing_network, closed_count = cache.cached(
+                        'closures', graph_key, lambda: apply_closures(weighted_network, road_key, closures, work_crs)
+                    )
+                    feedback.pushInfo(f" -> Applied road closures to {closed_count} road segments.")
+                else:
+                    routing_network = weighted_network
+
+                hierarchy = None
+                if self.parameterAsBool(parameters, self.INPUT_USE_HIERARCHY, context):
+                    if closures_layer:
+                        feedback.pushWarning("The road hierarchy does not include road closures and is not used for this run.")
+                    elif fastest:
+                        feedback.pushWarning("The road hierarchy is built on road lengths and is not used for fastest-time routing.")
+                    else:
+                        hierarchy = cache.get('hierarchy', road_key)
+                        if hierarchy is None:
+                            feedback.pushInfo(" -> Loading or building the road hierarchy (only slow the first time)...")
+                            hierarchy = load_or_build(network, self.hierarchyFolder(), feedback)
+                            if hierarchy is not None:
+                                cache.put('hierarchy', road_key, hierarchy)
+
+                # Stops and depots are projected onto their nearest road edge in
+                # one vectorised pass; the arrays are reused by later runs.
+                depot_nodes = cache.cached(
+                    'edge_snap', (road_key, cache.array_key(depot_xy)), lambda: network.snap(depot_xy)
+                )[0]
+                stop_nodes, _, stop_edges, stop_offsets = cache.cached(
+                    'edge_snap', (road_key, stops_key), lambda: network.snap(stop_xy)
+                )
+                edge_lengths = network.edge_length[stop_edges]
+                stop_fractions = np.divide(stop_offsets, edge_lengths, out=np.zeros(len(stop_offsets)), where=edge_lengths > 0)
+                edge_start = network.node_xy[network.edge_from[stop_edges]]
+                snapped_xy = edge_start + stop_fractions[:, None] * (network.node_xy[network.edge_to[stop_edges]] - edge_start)
+                stop_snap_metres = np.hypot(*(snapped_xy - stop_xy).T)
+                far_from_road = stop_snap_metres > snap_tolerance
+                if far_from_road.any():
+                    feedback.pushWarning(
+                        f"{int(stop_weights[far_from_road].sum())} addresses are more than {snap_tolerance:g} m from the nearest road; see 'route_note'."
+                    )
+                # One multi-source search gives every node its distance to, and
+                # the identity of, the nearest depot.
+                node_costs, node_depot = cache.cached(
+                    'costs', (graph_key, depot_nodes.tobytes()),
+                    lambda: routing_network.shortest_costs(depot_nodes, return_origin=True)
+                )
+
+                stop_depot = node_depot[stop_nodes]
+                addresses.node = stop_nodes[addresses.stop]
+
+                # Stops on parts of the road network that no depot connects
+                # to are found from the graph's connected components (worked
+                # out once per graph) and left out of all routing.
+                component = routing_network.components()
+                stop_component = component[stop_nodes]
+                stop_unreachable = ~np.isin(stop_component, component[depot_nodes])
+
+            # Costs are metres, or minutes when routing by fastest time;
+            # these convert them to minutes and metres into cost units
+            # (for straight-line estimates and walking along a block).
+            cost_per_minute = 1.0 if fastest else metres_per_minute
+            cost_per_metre = 1.0 / route_metres_per_minute if fastest else 1.0
+            walk_cost_per_metre = 1.0 / metres_per_minute if fastest else 1.0
+
+            unreachable_dest_id = None
+            if stop_unreachable.any():
+                if stop_unreachable.all():
+                    raise QgsProcessingException(
+                        "None of the addresses are connected by road to the start location or a depot."
+                    )
+                unreachable_rows = np.flatnonzero(stop_unreachable[addresses.stop])
+                unreachable_components = np.unique(stop_component[stop_unreachable])
+                listed = ', '.join(str(c) for c in unreachable_components[:10].tolist())
+                feedback.pushWarning(
+                    f"{len(unreachable_rows)} addresses are on roads not connected to the start location or any depot "
+                    f"(road network components {listed}{', ...' if len(unreachable_components) > 10 else ''}). "
+                    f"They are not routed; see the Unreachable Addresses output."
+                )
+                unreachable_dest_id = self.writeUnreachable(
+                    parameters, context, address_layer, addresses, unreachable_rows,
+                    stop_component[addresses.stop[unreachable_rows]], stop_snap_metres[addresses.stop[unreachable_rows]]
+                )
+
+            unassigned = stop_depot < 0
+            if unassigned.any():
+                # Unreachable stops go to the closest depot in a straight line.
+                gaps = stop_xy[unassigned, None, :] - depot_xy[None, :, :]
+                stop_depot[unassigned] = np.argmin(np.hypot(gaps[..., 0], gaps[..., 1]), axis=1)
+
+            # Stops on one side of a street segment form a block, walked in
+            # order along the street. Blocks are clustered and sequenced in
+            # place of stops, each one located at its middle stop; without
+            # blocks every stop is a block of its own.
+            if use_blocks and network.edge_count:
+                stop_block, stop_position = cache.cached(
+                    'blocks', (road_key, stops_key), lambda: street_blocks(network, stop_xy, stop_edges, stop_offsets)
+                )
+            else:
+                stop_block, stop_position = np.arange(len(stop_xy)), np.zeros(len(stop_xy))
+            if stop_unreachable.any():
+                # Keep the unreachable stops in blocks of their own.
+                _, stop_block = np.unique(np.column_stack([stop_block, stop_unreachable]), axis=0, return_inverse=True)
+                stop_block = stop_block.reshape(-1)
+            block_order, block_bounds, block_stop = block_representatives(stop_block, stop_position)
+            block_xy = stop_xy[block_stop]
+            block_weights = np.bincount(stop_block, stop_weights).astype(np.int64)
+            block_depot = stop_depot[block_stop]
+            block_unreachable = stop_unreachable[block_stop]
+            if len(block_stop) < len(stop_xy):
+                feedback.pushInfo(f" -> Grouped {len(stop_xy)} stops into {len(block_stop)} street blocks.")
+
+            # A block is as urgent as its most urgent address, and an
+            # address as urgent as the higher of its priority field and
+            # hazard raster tiers.
+            block_priority = None
+            address_tiers = None
+            if priority_field:
+                priority_index = address_layer.fields().indexOf(priority_field)
+                if priority_index < 0:
+                    raise QgsProcessingException(f"The priority field '{priority_field}' is not in the address layer.")
+                address_tiers = priority_tiers(addresses.column(priority_index))
+            if hazard_layer:
+                hazard_tiers = priority_tiers(addresses.hazard)
+                address_tiers = hazard_tiers if address_tiers is None else np.maximum(address_tiers, hazard_tiers)
+            if address_tiers is not None:
+                block_priority = np.zeros(len(block_stop))
+                np.maximum.at(block_priority, stop_block[addresses.stop], address_tiers)
+                feedback.pushInfo(f" -> {int((address_tiers > 0).sum())} addresses have a priority.")
+
+            depot_members = [np.flatnonzero((block_depot == d) & ~block_unreachable) for d in range(len(depot_xy))]
+            if depot_crews is None:
+                staffed = [d for d in range(len(depot_xy)) if len(depot_members[d])]
+                num_crews = self.parameterAsInt(parameters, self.INPUT_NUM_CREWS, context)
+                if len(staffed) > num_crews:
+                    raise QgsProcessingException(f"{len(staffed)} depots have addresses to visit but only {num_crews} crews are available.")
+                depot_crews = [0] * len(depot_xy)
+                workloads = [block_weights[depot_members[d]].sum() for d in staffed]
+                for d, crews in zip(staffed, allocate_crews(workloads, num_crews)):
+                    depot_crews[d] = crews
+            for d in range(len(depot_xy)):
+                if use_depots and depot_crews[d] and not len(depot_members[d]):
+                    feedback.pushWarning(f"Depot {depot_ids[d]} is not the closest depot to any address; its crews are not used.")
+            groups = [
+                (depot_members[d], depot_crews[d], depot_xy[d])
+                for d in range(len(depot_xy)) if len(depot_members[d]) and depot_crews[d]
+            ]
+            group_depots = [depot_ids[d] for d in range(len(depot_xy)) if len(depot_members[d]) and depot_crews[d]]
+            num_crews = sum(group[1] for group in groups)
+
+            feedback.pushInfo(f"Step 3: Dividing {int(block_weights[~block_unreachable].sum())} addresses among {num_crews} crews...")
+            if use_depots:
+                feedback.pushInfo(f" -> Assigned addresses to {len(groups)} of {len(depot_xy)} depots by network distance.")
+
+            clusters_key = (
+                graph_key, cache.array_key(block_xy), cache.array_key(depot_xy, np.array(depot_crews), block_weights), partition_size
+            )
+            cluster_ids, tiles, crew_groups = cache.cached(
+                'clusters', clusters_key, lambda: self.divideAddresses(block_xy, block_weights, groups, partition_size)
+            )
+            cluster_ids = np.where(block_unreachable, -1, cluster_ids)
+            tiled = len(tiles) > len(groups)
+            if tiled:
+                feedback.pushInfo(
+                    f" -> Formed crew areas in {len(tiles)} partitions of up to {max(block_weights[t].sum() for t in tiles)} addresses."
+                )
+
+            # K-Means balances area, not working time: move border stops
+            # from the busiest crew to its neighbours while that shortens
+            # the longest day (travel plus time at the doors).
+            if num_crews > 1:
+                crew_start_xy = np.array([groups[group][2] for group in crew_groups])
+                cluster_ids, crew_estimates = cache.cached(
+                    'balance', (clusters_key, service_minutes, route_metres_per_minute),
+                    lambda: rebalance(block_xy, block_weights * service_minutes, cluster_ids, crew_start_xy, crew_groups,
+                                      route_metres_per_minute, 1.0 if straight_line else DETOUR_FACTOR)
+                )
+                feedback.pushInfo(f" -> Balanced crew workloads; the longest estimated day is {crew_estimates.max() / 60:.1f} h.")
 
-            if not clustered_addresses:
-                raise QgsProcessingException("Failed to create clustered addresses layer from K-Means output.")
+            # Crew 1 gets the most urgent work: crews are numbered by their
+            # most urgent block, then by their total urgent workload.
+            if block_priority is not None and num_crews > 1:
+                assigned = cluster_ids >= 0
+                top = np.zeros(num_crews)
+                np.maximum.at(top, cluster_ids[assigned], block_priority[assigned])
+                total = np.bincount(
+                    cluster_ids[assigned], block_priority[assigned] * block_weights[assigned], minlength=num_crews
+                )
+                ranking = np.lexsort((-total, -top))
+                renumber = np.empty(num_crews, dtype=np.int64)
+                renumber[ranking] = np.arange(num_crews)
+                cluster_ids = np.where(assigned, renumber[cluster_ids], -1)
+                crew_groups = [crew_groups[crew] for crew in ranking]
 
-            feedback.pushInfo("Step 3: Preparing final output layers...")
+            addresses.cluster = cluster_ids[stop_block[addresses.stop]]
+
+            feedback.pushInfo("Step 4: Preparing final output layers...")
 
             point_fields = QgsFields()
             point_fields.append(QgsField('crew_id', QVariant.Int))
+            if use_depots:
+                point_fields.append(QgsField('depot_id', QVariant.Int))
             point_fields.append(QgsField('visit_order', QVariant.Int))
+            point_fields.append(QgsField('stop_id', QVariant.Int))
+            point_fields.append(QgsField('sub_order', QVariant.Int))
             for field in address_layer.fields():
                 point_fields.append(field)
+            if hazard_layer:
+                point_fields.append(QgsField('hazard_value', QVariant.Double))
             point_fields.append(QgsField('cost', QVariant.Double))
+            point_fields.append(QgsField('eta_minutes', QVariant.Double))
+            point_fields.append(QgsField('snap_distance', QVariant.Double))
+            point_fields.append(QgsField('route_note', QVariant.String, len=100))
             point_fields.append(QgsField('Inquiry Date', QVariant.DateTime))
             point_fields.append(QgsField('Inquirer ID', QVariant.String, len=50))
             point_fields.append(QgsField('Inquirer Org', QVariant.String, len=100))
@@ -160,9 +911,17 @@ class DoorKnockPlannerAlgorithm(QgsProcessingAlgorithm):
 
             table_fields = QgsFields()
             table_fields.append(QgsField('crew_id', QVariant.Int))
+            if use_depots:
+                table_fields.append(QgsField('depot_id', QVariant.Int))
             table_fields.append(QgsField('visit_order', QVariant.Int))
+            table_fields.append(QgsField('stop_id', QVariant.Int))
+            table_fields.append(QgsField('sub_order', QVariant.Int))
             for field in address_layer.fields():
                 table_fields.append(field)
+            if hazard_layer:
+                table_fields.append(QgsField('hazard_value', QVariant.Double))
+            table_fields.append(QgsField('route_note', QVariant.String, len=100))
+            table_fields.append(QgsField('eta_minutes', QVariant.Double))
             table_fields.append(QgsField('Inquiry Date', QVariant.DateTime))
             table_fields.append(QgsField('Inquirer ID', QVariant.String, len=50))
             table_fields.append(QgsField('Inquirer Org', QVariant.String, len=100))
@@ -177,94 +936,121 @@ class DoorKnockPlannerAlgorithm(QgsProcessingAlgorithm):
                 parameters, self.OUTPUT_CSV, context, table_fields, QgsWkbTypes.NoGeometry, address_layer.crs()
             )
 
-            # --- Step 4: Calculate Ordered Route for Each Crew ---
-            feedback.pushInfo("Step 4: Calculating routes for each crew...")
-            
+            # --- Step 5: Calculate Ordered Route for Each Crew ---
+            feedback.pushInfo("Step 5: Sequencing the route for each crew...")
+
+            if straight_line:
+                feedback.pushInfo(" -> Ordering stops along a space-filling curve and straightening with 2-opt...")
+            else:
+                block_costs = routing_network.costs_along(node_costs, stop_edges[block_stop], stop_fractions[block_stop])
+
+            address_field_names = address_layer.fields().names()
+            crew_point_features = {}
+            crew_costs = []
+            crew_minutes = []
+            stop_id = 0
             for i in range(num_crews):
                 if feedback.isCanceled():
                     break
                 feedback.pushInfo(f"Processing Crew #{i+1}...")
 
-                crew_addresses_result = processing.run("native:extractbyattribute", {
-                    'INPUT': clustered_addresses, 'FIELD': 'CLUSTER_ID', 'OPERATOR': 0, 'VALUE': i, 'OUTPUT': 'memory:'
-                }, context=context, feedback=feedback, is_child_algorithm=True)
-                
-                crew_addresses = QgsProcessingUtils.mapLayerFromString(crew_addresses_result['OUTPUT'], context)
+                crew_blocks = np.flatnonzero(cluster_ids == i)
                 
-                if not crew_addresses or crew_addresses.featureCount() == 0:
+                if len(crew_blocks) == 0:
                     feedback.pushWarning(f"Crew #{i+1} has no addresses assigned. Skipping.")
                     continue
 
-                start_point_layer = QgsVectorLayer(f"Point?crs={project_crs.authid()}", f"start_point_temp_{i}", "memory")
-                provider = start_point_layer.dataProvider()
-                feat = QgsFeature()
-                feat.setGeometry(QgsGeometry.fromPointXY(start_point))
-                provider.addFeatures([feat])
-                
-                snapped_point_result = processing.run("qgis:snapgeometries", {
-                    'INPUT': start_point_layer, 'REFERENCE_LAYER': road_layer,
-                    'TOLERANCE': 1000, 'BEHAVIOR': 0, 'OUTPUT': 'memory:'
-                }, context=context, feedback=feedback, is_child_algorithm=True)
-                
-                snapped_layer = QgsProcessingUtils.mapLayerFromString(snapped_point_result['OUTPUT'], context)
-                snapped_feature = next(snapped_layer.getFeatures(), None)
-                
-                if not snapped_feature:
-                    raise QgsProcessingException(f"Could not snap start point for Crew #{i+1}.")
-                
-                snapped_geom = snapped_feature.geometry()
-                road_crs = road_layer.crs()
-                if project_crs.authid() != road_crs.authid():
-                    transform = QgsCoordinateTransform(project_crs, road_crs, QgsProject.instance())
-                    snapped_geom.transform(transform)
-                
-                snapped_start_point_str = f'{snapped_geom.asPoint().x()},{snapped_geom.asPoint().y()} [{road_crs.authid()}]'
-
-                route_result = processing.run("qgis:shortestpathpointtolayer", {
-                    'INPUT': road_layer, 'STRATEGY': 0,
-                    'START_POINT': snapped_start_point_str,
-                    'END_POINTS': crew_addresses,
-                    'OUTPUT': 'memory:'
-                }, context=context, feedback=feedback, is_child_algorithm=True)
-                
-                temp_route_layer = QgsProcessingUtils.mapLayerFromString(route_result['OUTPUT'], context)
+                # The tour starts at the depot; unreachable blocks (infinite
+                # cost) come last. Costs accumulate along the tour and along
+                # the street within each block.
+                if straight_line:
+                    tour, arrival = straight_line_tour(
+                        groups[crew_groups[i]][2], block_xy[crew_blocks],
+                        None if block_priority is None else block_priority[crew_blocks]
+                    )
+                else:
+                    tour, arrival = crew_tour(
+                        routing_network, stop_nodes[block_stop[crew_blocks]], block_costs[crew_blocks],
+                        block_xy[crew_blocks] * cost_per_metre, hierarchy,
+                        None if block_priority is None else block_priority[crew_blocks]
+                    )
+                crew_stops, arrival = walk_blocks(
+                    crew_blocks[tour], arrival, block_order, block_bounds, stop_xy, stop_position, groups[crew_groups[i]][2],
+                    walk_cost_per_metre
+                )
+                stop_arrival = dict(zip(crew_stops.tolist(), arrival.tolist()))
+                reachable = arrival[np.isfinite(arrival)]
+                crew_costs.append(float(reachable[-1]) if len(reachable) else 0.0)
+                reachable_addresses = int(stop_weights[crew_stops][np.isfinite(arrival)].sum())
+                crew_minutes.append(crew_costs[-1] / cost_per_minute + service_minutes * reachable_addresses)
+                feedback.pushInfo(f" -> Estimated finish after {crew_minutes[-1] / 60:.1f} h.")
+                if shift_minutes and crew_minutes[-1] > shift_minutes:
+                    feedback.pushWarning(
+                        f"Crew #{i+1} needs an estimated {crew_minutes[-1] / 60:.1f} h, longer than the {shift_minutes / 60:g} h shift."
+                    )
 
-                if not temp_route_layer:
-                    feedback.pushWarning(f"Route calculation failed for Crew #{i+1}.")
-                    continue
+                # Expand every stop back into its addresses.
+                visits = [
+                    (stop, sub_order, index)
+                    for stop in crew_stops
+                    for sub_order, index in enumerate(stop_order[stop_bounds[stop]:stop_bounds[stop + 1]])
+                ]
 
-                route_features_unsorted = list(temp_route_layer.getFeatures())
-                
-                try:
-                    route_features_sorted = sorted(route_features_unsorted, key=lambda f: f['cost'])
-                except KeyError:
-                    feedback.pushWarning(f"Could not sort routes by cost for Crew #{i+1}. The 'cost' field was not found.")
-                    continue
+                visit_rows = np.array([index for _, _, index in visits], dtype=np.int64)
+                addresses.order[visit_rows] = np.arange(1, len(visits) + 1)
+                addresses.cost[visit_rows] = [stop_arrival[stop] for stop, _, _ in visits]
 
+                # Output features are only built here, with the address
+                # attributes read for this crew in one request.
                 point_features_to_add = []
                 table_features_to_add = []
-                for visit_order, feature in enumerate(route_features_sorted):
+                for visit_order, ((stop, sub_order, index), attributes) in enumerate(
+                        zip(visits, addresses.attributes(visit_rows))):
+                    cost = stop_arrival[stop]
+                    # Arrival: travel time to the door plus the time at every earlier door.
+                    eta = cost / cost_per_minute + service_minutes * visit_order if math.isfinite(cost) else None
+                    if sub_order == 0:
+                        stop_id += 1
+
                     point_feature = QgsFeature(point_fields)
+                    point_feature.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(*addresses.source_xy[index])))
+                    table_feature = QgsFeature(table_fields)
                     
-                    line_geom = feature.geometry()
-                    if line_geom and not line_geom.isEmpty():
-                        points = line_geom.asPolyline()
-                        if points:
-                            end_point_geom = QgsGeometry.fromPointXY(points[-1])
-                            point_feature.setGeometry(end_point_geom)
+                    for field_name, value in zip(address_field_names, attributes):
+                        point_feature.setAttribute(field_name, value)
+                        table_feature.setAttribute(field_name, value)
+                    if hazard_layer:
+                        hazard = float(addresses.hazard[index]) if math.isfinite(addresses.hazard[index]) else None
+                        point_feature.setAttribute('hazard_value', hazard)
+                        table_feature.setAttribute('hazard_value', hazard)
 
                     point_feature.setAttribute('crew_id', i + 1)
                     point_feature.setAttribute('visit_order', visit_order + 1)
-                    point_feature.setAttribute('cost', feature['cost'])
-                    
-                    table_feature = QgsFeature(table_fields)
+                    point_feature.setAttribute('stop_id', stop_id)
+                    point_feature.setAttribute('sub_order', sub_order + 1)
+                    point_feature.setAttribute('cost', cost if math.isfinite(cost) else None)
+                    point_feature.setAttribute('eta_minutes', round(eta, 1) if eta is not None else None)
+                    point_feature.setAttribute(
+                        'snap_distance', round(float(stop_snap_metres[stop]), 1) if stop_snap_metres is not None else None
+                    )
+                    if not math.isfinite(cost):
+                        route_note = 'No route from the start location'
+                    elif far_from_road[stop]:
+                        route_note = f"{stop_snap_metres[stop]:.0f} m from the nearest road"
+                    elif shift_minutes and eta > shift_minutes:
+                        route_note = 'Expected after the end of the shift'
+                    else:
+                        route_note = None
+                    point_feature.setAttribute('route_note', route_note)
+                    table_feature.setAttribute('route_note', route_note)
+                    table_feature.setAttribute('eta_minutes', round(eta, 1) if eta is not None else None)
                     table_feature.setAttribute('crew_id', i + 1)
                     table_feature.setAttribute('visit_order', visit_order + 1)
-                    
-                    for field in address_layer.fields():
-                        field_name = field.name()
-                        point_feature.setAttribute(field_name, feature.attribute(field_name))
-                        table_feature.setAttribute(field_name, feature.attribute(field_name))
+                    table_feature.setAttribute('stop_id', stop_id)
+                    table_feature.setAttribute('sub_order', sub_order + 1)
+                    if use_depots:
+                        point_feature.setAttribute('depot_id', group_depots[crew_groups[i]])
+                        table_feature.setAttribute('depot_id', group_depots[crew_groups[i]])
                         
                     point_feature.setAttribute('Outcome', 'Outstanding')
                     table_feature.setAttribute('Outcome', 'Outstanding')
@@ -272,50 +1058,54 @@ class DoorKnockPlannerAlgorithm(QgsProcessingAlgorithm):
                     point_features_to_add.append(point_feature)
                     table_features_to_add.append(table_feature)
 
-                if point_features_to_add:
-                    points_sink.addFeatures(point_features_to_add)
-                    table_sink.addFeatures(table_features_to_add)
-                else:
-                    feedback.pushWarning(f"No routes could be calculated for Crew #{i+1}.")
+                unreachable = int(stop_weights[crew_stops][~np.isfinite(arrival)].sum())
+                if unreachable:
+                    feedback.pushWarning(f"No route could be found to {unreachable} addresses for Crew #{i+1}.")
+
+                points_sink.addFeatures(point_features_to_add)
+                table_sink.addFeatures(table_features_to_add)
+                crew_point_features[i + 1] = point_features_to_add
             
-            # --- Step 5: Configure Visit Points Layer for QField ---
-            feedback.pushInfo("Step 5: Configuring 'Visit Points' layer for field use...")
+            # --- Step 6: Configure Visit Points Layer for QField ---
+            feedback.pushInfo("Step 6: Configuring 'Visit Points' layer for field use...")
             
             final_points_layer = QgsProcessingUtils.mapLayerFromString(points_dest_id, context)
             
             if final_points_layer:
-                outcome_idx = final_points_layer.fields().indexOf('Outcome')
-                
-                if outcome_idx != -1:
-                    # MODIFIED: Use the correct setDefaultValueDefinition method with a QgsDefaultValue object
-                    default_value_definition = QgsDefaultValue("'Outstanding'")
-                    final_points_layer.setDefaultValueDefinition(outcome_idx, default_value_definition)
-                    
-                    # MODIFIED: Correctly format the list for the ValueMap
-                    outcomes_list = [
-                        {'No Person/s home': 'No Person/s home'},
-                        {'Residents Contacted': 'Residents Contacted'},
-                        {'Unable to Locate/Attend Address': 'Unable to Locate/Attend Address'},
-                        {'Outstanding': 'Outstanding'}
-                    ]
-                    
-                    widget_setup = QgsEditorWidgetSetup(
-                        'ValueMap',
-                        {'map': outcomes_list}
-                    )
-                    
-                    final_points_layer.setEditorWidgetSetup(outcome_idx, widget_setup)
+                if configure_outcome_field(final_points_layer):
                     feedback.pushInfo("Successfully configured 'Outcome' field with default value and value map.")
                 else:
                     feedback.pushWarning("Could not find 'Outcome' field to apply configurations.")
             else:
                 feedback.pushWarning("Could not retrieve final Visit Points layer to configure for QField.")
 
+            results = {
+                self.OUTPUT_VISIT_POINTS: points_dest_id, self.OUTPUT_CSV: table_dest_id,
+                self.OUTPUT_TOTAL_COST: sum(crew_costs), self.OUTPUT_MAX_CREW_COST: max(crew_costs, default=0.0),
+                self.OUTPUT_MAX_CREW_MINUTES: max(crew_minutes, default=0.0)
+            }
+            if unreachable_dest_id:
+                results[self.OUTPUT_UNREACHABLE] = unreachable_dest_id
+
+            # --- Step 7: Write Per-Crew Field Packages ---
+            if packages_folder:
+                feedback.pushInfo("Step 7: Writing per-crew field packages...")
+                if not unique_id_field:
+                    feedback.pushWarning("No unique address ID field selected; full packages are written and no delta packages can be produced.")
+                delta_rows = write_crew_packages(
+                    packages_folder, crew_point_features, point_fields, address_layer.crs(),
+                    unique_id_field, context.transformContext(), feedback
+                )
+                feedback.pushInfo(f"Wrote packages for {len(crew_point_features)} crews ({delta_rows} changed rows in delta packages).")
+                results[self.OUTPUT_CREW_PACKAGES] = packages_folder
 
-            return {self.OUTPUT_VISIT_POINTS: points_dest_id, self.OUTPUT_CSV: table_dest_id}
+            return results
 
+        except QgsProcessingException:
+            raise
         except Exception as e:
-            feedback.reportError(f"An unexpected error occurred: {e}", fatalError=True)
+            # Raised rather than returning no results, so Processing, the
+            # pipeline and the batch and simulation runners see the failure.
             import traceback
             feedback.pushDebugInfo(traceback.format_exc())
-            return {}
+            raise QgsProcessingException(f"An unexpected error occurred: {e}")
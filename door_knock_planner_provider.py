@@ -31,9 +31,6 @@ __copyright__ = '(C) 2025 by Darren Green'
 __revision__ = '$Format:%H$'
 
 from qgis.core import QgsProcessingProvider
-from .door_knock_planner_algorithm import DoorKnockPlannerAlgorithm
-# NEW: Import the new tracker algorithm class
-from .door_knock_tracker_algorithm import DoorKnockTrackerAlgorithm
 
 
 class doorknockplannerProvider(QgsProcessingProvider):
@@ -55,9 +52,19 @@ class doorknockplannerProvider(QgsProcessingProvider):
         """
         Loads all algorithms belonging to this provider.
         """
+        # The algorithm modules are imported here rather than with the
+        # provider; they only define parameters, and the planning engine
+        # itself is imported on the first run.
+        from .door_knock_address_store_algorithm import DoorKnockAddressStoreAlgorithm
+        from .door_knock_planner_algorithm import DoorKnockPlannerAlgorithm
+        from .door_knock_pipeline_algorithm import DoorKnockPipelineAlgorithm
+        from .door_knock_tracker_algorithm import DoorKnockTrackerAlgorithm
+
         self.addAlgorithm(DoorKnockPlannerAlgorithm())
         # NEW: Register the new tracker algorithm
         self.addAlgorithm(DoorKnockTrackerAlgorithm())
+        self.addAlgorithm(DoorKnockPipelineAlgorithm())
+        self.addAlgorithm(DoorKnockAddressStoreAlgorithm())
         # add additional algorithms here
         # self.addAlgorithm(MyOtherAlgorithm())
 
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ * *
+ * This program is free software; you can redistribute it and/or modify  *
+ * it under the terms of the GNU General Public License as published by  *
+ * the Free Software Foundation; either version 2 of the License, or     *
+ * (at your option) any later version.                                   *
+ * *
+ ***************************************************************************/
+
+ Hazard raster sampling. The block of a flood depth or fire intensity raster
+ under the addresses is read into a NumPy array and every address is
+ sampled with one vectorised index lookup, instead of writing a sampled copy
+ of the address layer before planning. Blocks larger than MAX_BLOCK_PIXELS
+ are read as smaller windows around the addresses they hold.
+"""
+
+__author__ = 'Darren Green'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2025 by Darren Green'
+
+import numpy as np
+from qgis.core import QgsRectangle
+
+# NumPy types of the QGIS raster data types (Qgis.DataType values).
+BLOCK_DTYPES = {1: np.uint8, 2: np.uint16, 3: np.int16, 4: np.uint32, 5: np.int32, 6: np.float32, 7: np.float64}
+# Largest block read at once: 16 million pixels, 128 MB as float64.
+MAX_BLOCK_PIXELS = 1 << 24
+
+
+def pixel_window(extent, pixel_size, shape, rect):
+    """
+    Returns the pixel columns and rows (col0, row0, col1, row1, end
+    exclusive) of a raster covering rect = (xmin, ymin, xmax, ymax), or None
+    when rect misses the raster. extent is the raster's (xmin, ymin, xmax,
+    ymax), pixel_size its (width, height) and shape its (columns, rows).
+    """
+    col0 = int(np.floor((rect[0] - extent[0]) / pixel_size[0]))
+    col1 = int(np.floor((rect[2] - extent[0]) / pixel_size[0])) + 1
+    row0 = int(np.floor((extent[3] - rect[3]) / pixel_size[1]))
+    row1 = int(np.floor((extent[3] - rect[1]) / pixel_size[1])) + 1
+    col0, row0 = max(col0, 0), max(row0, 0)
+    col1, row1 = min(col1, shape[0]), min(row1, shape[1])
+    if col0 >= col1 or row0 >= row1:
+        return None
+    return col0, row0, col1, row1
+
+
+def split_window(extent, pixel_size, shape, window, xy, max_pixels=MAX_BLOCK_PIXELS):
+    """
+    Yields (window, points) pairs covering the points of xy inside window,
+    each window at most max_pixels. A window within the budget is yielded
+    whole; a larger one is cut into tiles and only the tiles holding
+    points are yielded, each shrunk to the pixels under its points.
+    """
+    col0, row0, col1, row1 = window
+    xy = np.asarray(xy, dtype=float).reshape(-1, 2)
+    if (col1 - col0) * (row1 - row0) <= max_pixels:
+        yield window, np.arange(len(xy))
+        return
+    col = np.floor((xy[:, 0] - extent[0]) / pixel_size[0])
+    row = np.floor((extent[3] - xy[:, 1]) / pixel_size[1])
+    points = np.flatnonzero((col >= col0) & (col < col1) & (row >= row0) & (row < row1))
+    width = min(col1 - col0, max_pixels)
+    height = max(max_pixels // width, 1)
+    tiles_across = -(-(col1 - col0) // width)
+    tile = ((row[points] - row0) // height).astype(np.int64) * tiles_across + ((col[points] - col0) // width).astype(np.int64)
+    order = np.argsort(tile, kind='stable')
+    _, starts = np.unique(tile[order], return_index=True)
+    for group in np.split(points[order], starts[1:]):
+        part = pixel_window(extent, pixel_size, shape, (*xy[group].min(axis=0), *xy[group].max(axis=0)))
+        if part is not None:
+            yield part, group
+
+
+def sample_grid(values, origin, pixel_size, xy):
+    """
+    Returns the value of the pixel under every point of xy, looked up in
+    one pass. values is a (rows, columns) array whose top left corner is at
+    origin = (xmin, ymax); points outside it sample NaN, as do NaN pixels.
+    """
+    values = np.asarray(values, dtype=float)
+    xy = np.asarray(xy, dtype=float).reshape(-1, 2)
+    col = np.floor((xy[:, 0] - origin[0]) / pixel_size[0])
+    row = np.floor((origin[1] - xy[:, 1]) / pixel_size[1])
+    inside = (col >= 0) & (col < values.shape[1]) & (row >= 0) & (row < values.shape[0])
+    sampled = np.full(len(xy), np.nan)
+    sampled[inside] = values[row[inside].astype(np.int64), col[inside].astype(np.int64)]
+    return sampled
+
+
+def block_array(block):
+    """
+    Returns a QgsRasterBlock as a float array, with no-data pixels as NaN.
+    """
+    if hasattr(block, 'as_numpy'):
+        values = np.asarray(block.as_numpy(use_masking=False), dtype=float)
+    else:
+        values = np.frombuffer(bytes(block.data()), dtype=BLOCK_DTYPES[int(block.dataType())])
+        values = values.reshape(block.height(), block.width()).astype(float)
+    if block.hasNoDataValue():
+        values[values == block.noDataValue()] = np.nan
+    return values
+
+
+def sample_raster(raster_layer, band, xy):
+    """
+    Returns the value of the band under every point of xy (in the raster's
+    CRS), NaN outside the raster or on no-data. Only the pixels under the
+    points' bounding box are read, in one block, or, when that is more than
+    MAX_BLOCK_PIXELS, in one block per tile holding points.
+    """
+    xy = np.asarray(xy, dtype=float).reshape(-1, 2)
+    if not len(xy):
+        return np.zeros(0)
+    extent = raster_layer.extent()
+    bounds = (extent.xMinimum(), extent.yMinimum(), extent.xMaximum(), extent.yMaximum())
+    pixel_size = (raster_layer.rasterUnitsPerPixelX(), raster_layer.rasterUnitsPerPixelY())
+    window = pixel_window(
+        bounds, pixel_size, (raster_layer.width(), raster_layer.height()), (*xy.min(axis=0), *xy.max(axis=0))
+    )
+    sampled = np.full(len(xy), np.nan)
+    if window is None:
+        return sampled
+    provider = raster_layer.dataProvider()
+    shape = (raster_layer.width(), raster_layer.height())
+    for (col0, row0, col1, row1), points in split_window(bounds, pixel_size, shape, window, xy):
+        origin = (bounds[0] + col0 * pixel_size[0], bounds[3] - row0 * pixel_size[1])
+        block = provider.block(
+            band, QgsRectangle(origin[0], bounds[3] - row1 * pixel_size[1], bounds[0] + col1 * pixel_size[0], origin[1]),
+            col1 - col0, row1 - row0
+        )
+        sampled[points] = sample_grid(block_array(block), origin, pixel_size, xy[points])
+    return sampled
@@ -0,0 +1,365 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ * *
+ * This program is free software; you can redistribute it and/or modify  *
+ * it under the terms of the GNU General Public License as published by  *
+ * the Free Software Foundation; either version 2 of the License, or     *
+ * (at your option) any later version.                                   *
+ * *
+ ***************************************************************************/
+
+ Orders each crew's stops into a tour. A network distance matrix between the
+ crew's stops is built with bounded searches, a nearest-neighbour tour is
+ started from the depot and then improved with 2-opt. Without road data the
+ stops are ordered along a Hilbert curve instead and improved with a
+ windowed straight-line 2-opt.
+"""
+
+__author__ = 'Darren Green'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2025 by Darren Green'
+
+import math
+
+import numpy as np
+
+# Searches between a crew's stops stop at this fraction of the diagonal of
+# the crew's bounding box. Longer legs are estimated from the straight-line
+# distance times DETOUR_FACTOR while sequencing, and measured exactly only
+# if the final tour uses them.
+SEARCH_RADIUS_FACTOR = 0.25
+DETOUR_FACTOR = 1.3
+MAX_TWO_OPT_PASSES = 50
+# Straight-line tours: resolution of the Hilbert curve, the longest segment
+# the windowed 2-opt will reverse and its number of passes (later passes
+# gain little on curve-ordered paths).
+HILBERT_BITS = 16
+STRAIGHT_LINE_WINDOW = 25
+STRAIGHT_LINE_PASSES = 5
+# Priority doors: moving a door of the most urgent tier one place earlier
+# in the tour is worth this fraction of an average leg. Or-opt (moving runs
+# of up to OR_OPT_SEGMENT stops) only runs when there are priorities.
+PRIORITY_PENALTY = 0.5
+OR_OPT_SEGMENT = 3
+MAX_OR_OPT_PASSES = 3
+
+
+def nearest_neighbour(matrix):
+    """
+    Returns an open path over all matrix rows starting at row 0, always
+    moving to the closest unvisited row.
+    """
+    n = len(matrix)
+    path = [0]
+    unvisited = np.ones(n, dtype=bool)
+    unvisited[0] = False
+    for _ in range(n - 1):
+        row = np.where(unvisited, matrix[path[-1]], np.inf)
+        nxt = int(np.argmin(row))
+        path.append(nxt)
+        unvisited[nxt] = False
+    return np.array(path, dtype=np.int64)
+
+
+def priority_tiers(values):
+    """
+    Turns priority values (higher = more urgent) into tier weights from 0
+    to 1: the distinct positive values are spread evenly up to 1 for the
+    most urgent, and empty (NaN), zero or negative values are 0.
+    """
+    values = np.asarray(values, dtype=float)
+    urgent = np.isfinite(values) & (values > 0)
+    levels = np.unique(values[urgent])
+    tiers = np.zeros(len(values))
+    tiers[urgent] = (np.searchsorted(levels, values[urgent]) + 1) / max(len(levels), 1)
+    return tiers
+
+
+def _rank_penalty(weights, starts, ends):
+    """
+    Returns, for each segment path[starts:ends + 1], how much reversing it
+    changes the sum of weight times position along the path.
+    """
+    positions = np.arange(len(weights))
+    c1 = np.concatenate([[0.0], np.cumsum(weights)])
+    c2 = np.concatenate([[0.0], np.cumsum(weights * positions)])
+    return (starts + ends) * (c1[ends + 1] - c1[starts]) - 2 * (c2[ends + 1] - c2[starts])
+
+
+def two_opt(matrix, path, max_passes=MAX_TWO_OPT_PASSES, priority=None, penalty=0.0):
+    """
+    Improves an open path with a fixed first row by reversing segments
+    while that shortens it. The matrix must be symmetric. With priority
+    (a tier weight per matrix row), the path length is traded against
+    penalty times the sum of tier weight times position, so urgent rows
+    move forward where the detour is small.
+    """
+    path = path.copy()
+    n = len(path)
+    if n < 4:
+        return path
+    for _ in range(max_passes):
+        improved = False
+        for i in range(1, n - 1):
+            j = np.arange(i + 1, n)
+            a, b = path[i - 1], path[i]
+            c = path[j]
+            # The edge after j does not exist for the last position.
+            d = path[np.minimum(j + 1, n - 1)]
+            after = np.where(j + 1 < n, matrix[b, d] - matrix[c, d], 0.0)
+            gain = matrix[a, b] - matrix[a, c] - after
+            if priority is not None:
+                gain = gain - penalty * _rank_penalty(priority[path], i, j)
+            best = int(np.argmax(gain))
+            if gain[best] > 1e-9:
+                path[i:j[best] + 1] = path[i:j[best] + 1][::-1]
+                improved = True
+        if not improved:
+            break
+    return path
+
+
+def or_opt(matrix, path, priority, penalty, max_segment=OR_OPT_SEGMENT):
+    """
+    One pass of Or-opt on an open path with a fixed first row: runs of up
+    to max_segment rows are moved (and possibly reversed) to wherever that
+    saves the most path length plus priority penalty, as in two_opt.
+    Returns the new path and whether anything moved.
+    """
+    path = path.copy()
+    n = len(path)
+    moved = False
+    for length in range(1, max_segment + 1):
+        for s in range(1, n - length + 1):
+            segment = path[s:s + length]
+            rest = np.concatenate([path[:s], path[s + length:]])
+            first, last = segment[0], segment[-1]
+            previous = path[s - 1]
+            removed = matrix[previous, first]
+            if s + length < n:
+                following = path[s + length]
+                removed += matrix[last, following] - matrix[previous, following]
+
+            # Insert after rest[t]; the last position has no row after it.
+            t = np.arange(len(rest))
+            nxt = rest[np.minimum(t + 1, len(rest) - 1)]
+            has_next = t + 1 < len(rest)
+            joined = np.where(has_next, matrix[rest, nxt], 0.0)
+            forward = matrix[rest, first] + np.where(has_next, matrix[last, nxt], 0.0) - joined
+            backward = matrix[rest, last] + np.where(has_next, matrix[first, nxt], 0.0) - joined
+
+            # Rows passed over move by the segment length the other way.
+            weights = priority[segment]
+            rest_weights = np.concatenate([[0.0], np.cumsum(priority[rest])])
+            shift = t + 1 - s
+            passed = np.where(shift > 0, rest_weights[t + 1] - rest_weights[s], rest_weights[s] - rest_weights[t + 1])
+            change = weights.sum() * shift - np.sign(shift) * length * passed
+            flip = np.sum(weights * (length - 1 - 2 * np.arange(length)))
+            gain_forward = removed - forward - penalty * change
+            gain_backward = removed - backward - penalty * (change + flip)
+            gain_forward[s - 1] = gain_backward[s - 1] = -np.inf
+
+            best_forward, best_backward = int(np.argmax(gain_forward)), int(np.argmax(gain_backward))
+            if max(gain_forward[best_forward], gain_backward[best_backward]) > 1e-9:
+                if gain_forward[best_forward] >= gain_backward[best_backward]:
+                    after, insert = best_forward, segment
+                else:
+                    after, insert = best_backward, segment[::-1]
+                path = np.concatenate([rest[:after + 1], insert, rest[after + 1:]])
+                moved = True
+    return path, moved
+
+
+def _improve(matrix, path, priority):
+    """
+    2-opt, followed when there are priorities by rounds of Or-opt and
+    2-opt with the priority penalty scaled to the average leg.
+    """
+    if priority is None or not priority.any():
+        return two_opt(matrix, path)
+    legs = matrix[path[:-1], path[1:]]
+    penalty = PRIORITY_PENALTY * float(np.mean(legs[np.isfinite(legs)])) if len(legs) else 0.0
+    path = two_opt(matrix, path, priority=priority, penalty=penalty)
+    for _ in range(MAX_OR_OPT_PASSES):
+        path, moved = or_opt(matrix, path, priority, penalty)
+        if not moved:
+            break
+        path = two_opt(matrix, path, max_passes=1, priority=priority, penalty=penalty)
+    return path
+
+
+def crew_tour(network, nodes, start_costs, stop_xy_metres, hierarchy=None, priority=None):
+    """
+    Sequences a crew's stops. nodes are the stops' graph nodes,
+    start_costs their network distances from the crew's depot and
+    stop_xy_metres their positions in metres (used to bound the searches).
+    With a contraction hierarchy every leg is measured exactly with one
+    many-to-many query instead of bounded searches. priority holds the
+    stops' tier weights (see priority_tiers) to bring urgent stops forward.
+    Returns the visiting order (indices into nodes) and the cumulative
+    travel cost at each stop in that order. Stops that cannot be reached
+    from the depot come last with infinite cost.
+    """
+    start_costs = np.asarray(start_costs, dtype=float)
+    reachable = np.flatnonzero(np.isfinite(start_costs))
+    unreachable = np.flatnonzero(~np.isfinite(start_costs))
+    if len(reachable) == 0:
+        return unreachable, np.full(len(unreachable), math.inf)
+
+    xy = stop_xy_metres[reachable]
+    span = xy.max(axis=0) - xy.min(axis=0)
+    radius = max(float(np.hypot(*span)) * SEARCH_RADIUS_FACTOR, 1.0)
+    if hierarchy is not None:
+        legs = hierarchy.many_to_many(nodes[reachable], nodes[reachable])
+    else:
+        legs = network.cost_matrix(nodes[reachable], max_cost=radius)
+    gaps = xy[:, None, :] - xy[None, :, :]
+    estimate = np.maximum(np.hypot(gaps[..., 0], gaps[..., 1]) * DETOUR_FACTOR, radius)
+
+    size = len(reachable) + 1
+    matrix = np.zeros((size, size))
+    exact = np.ones((size, size), dtype=bool)
+    matrix[0, 1:] = matrix[1:, 0] = start_costs[reachable]
+    matrix[1:, 1:] = np.where(np.isfinite(legs), legs, estimate)
+    exact[1:, 1:] = np.isfinite(legs)
+    path = _improve(
+        matrix, nearest_neighbour(matrix), None if priority is None else np.concatenate([[0.0], priority[reachable]])
+    )
+
+    leg_costs = matrix[path[:-1], path[1:]]
+    for k in np.flatnonzero(~exact[path[:-1], path[1:]]):
+        a, b = nodes[reachable[path[k] - 1]], nodes[reachable[path[k + 1] - 1]]
+        leg_costs[k] = network.one_to_many(int(a), [int(b)])[0]
+    arrival = np.cumsum(leg_costs)
+
+    order = np.concatenate([reachable[path[1:] - 1], unreachable])
+    costs = np.concatenate([arrival, np.full(len(unreachable), math.inf)])
+    return order, costs
+
+
+def hilbert_order(xy, bits=HILBERT_BITS):
+    """
+    Returns the order of the points along a Hilbert curve over their
+    bounding square, so points that are close in the order are close on
+    the ground.
+    """
+    xy = np.asarray(xy, dtype=float).reshape(-1, 2)
+    if len(xy) < 2:
+        return np.arange(len(xy))
+    side = 1 << bits
+    lower = xy.min(axis=0)
+    span = max(float((xy.max(axis=0) - lower).max()), 1e-9)
+    cells = np.minimum(((xy - lower) / span * side).astype(np.int64), side - 1)
+    x, y = cells[:, 0], cells[:, 1]
+    d = np.zeros(len(xy), dtype=np.int64)
+    s = side >> 1
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        d += s * s * ((3 * rx.astype(np.int64)) ^ ry.astype(np.int64))
+        # Rotate the quadrant so the curve inside it runs the right way.
+        flip = ~ry & rx
+        x = np.where(flip, side - 1 - x, x)
+        y = np.where(flip, side - 1 - y, y)
+        x, y = np.where(ry, x, y), np.where(ry, y, x)
+        s >>= 1
+    return np.argsort(d, kind='stable')
+
+
+def windowed_two_opt(xy, path, window=STRAIGHT_LINE_WINDOW, max_passes=STRAIGHT_LINE_PASSES,
+                     priority=None, penalty=0.0):
+    """
+    Straight-line 2-opt for long open paths with a fixed first point. Only
+    segments of up to window points are reversed; for each segment length
+    the gains at every position are computed at once and the best
+    non-overlapping improving reversals are applied together. priority and
+    penalty work as in two_opt.
+    """
+    path = path.copy()
+    n = len(path)
+    if n < 4:
+        return path
+    for _ in range(max_passes):
+        improved = False
+        for k in range(1, min(window, n - 2) + 1):
+            # Reversing path[i:i + k + 1] replaces the edges (i - 1, i) and
+            # (i + k, i + k + 1); the last position has no edge after it.
+            path_xy = xy[path]
+            edge = np.append(np.hypot(*np.diff(path_xy, axis=0).T), 0.0)
+            i = np.arange(1, n - k)
+            j = i + k
+            has_next = j + 1 < n
+            after = np.hypot(*(path_xy[i - 1] - path_xy[j]).T)
+            after += np.where(has_next, np.hypot(*(path_xy[i] - path_xy[np.minimum(j + 1, n - 1)]).T), 0.0)
+            gain = edge[i - 1] + edge[j] - after
+            if priority is not None:
+                gain = gain - penalty * _rank_penalty(priority[path], i, j)
+            gain = np.where(gain > 1e-9, gain, -np.inf)
+            # Take reversals whose gain is the best within k + 1 positions,
+            # then drop any that still touch the previous one (equal gains).
+            starts = np.flatnonzero(np.isfinite(gain) & (gain >= _window_max(gain, k + 1)))
+            if not len(starts):
+                continue
+            starts = starts[np.concatenate([[True], np.diff(starts) > k + 1])] + 1
+            offsets = np.arange(k + 1)
+            path[starts[:, None] + offsets] = path[starts[:, None] + k - offsets]
+            improved = True
+        if not improved:
+            break
+    return path
+
+
+def _window_max(values, radius):
+    """
+    Returns the maximum of values over [i - radius, i + radius] for every
+    i, using doubling steps instead of a loop over the window.
+    """
+    n = len(values)
+    size = 2 * radius + 1
+    padded = np.concatenate([np.full(radius, -np.inf), values, np.full(radius, -np.inf)])
+    running = padded.copy()
+    width = 1
+    while width * 2 <= size:
+        running[:len(padded) - width] = np.maximum(running[:len(padded) - width], running[width:])
+        width *= 2
+    # running[x] is now the maximum over [x, x + width).
+    return np.maximum(running[:n], running[size - width:size - width + n])
+
+
+def straight_line_tour(start_xy, stop_xy, priority=None):
+    """
+    Sequences a crew's stops without a road network: the Hilbert curve
+    order is cut where joining it to the start costs least, then improved
+    with windowed 2-opt. Returns the visiting order and the cumulative
+    straight-line distance at each stop. With priority (tier weights) the
+    2-opt also brings urgent stops forward, within its window.
+    """
+    stop_xy = np.asarray(stop_xy, dtype=float).reshape(-1, 2)
+    if len(stop_xy) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0)
+    curve = hilbert_order(stop_xy)
+
+    # Treat the curve as a loop and open it at the cheapest link: starting
+    # at the stop after the link and going forwards, or at the stop before
+    # it and going backwards.
+    following = np.roll(curve, -1)
+    link = np.hypot(*(stop_xy[curve] - stop_xy[following]).T)
+    to_start = np.hypot(*(stop_xy - np.asarray(start_xy, dtype=float)).T)
+    forwards = to_start[following] - link
+    backwards = to_start[curve] - link
+    cut = int(np.argmin(np.minimum(forwards, backwards)))
+    if forwards[cut] <= backwards[cut]:
+        curve = np.roll(curve, -(cut + 1))
+    else:
+        curve = np.roll(curve, -(cut + 1))[::-1]
+
+    xy = np.vstack([np.asarray(start_xy, dtype=float).reshape(1, 2), stop_xy])
+    path = np.concatenate([[0], curve + 1])
+    if priority is not None and priority.any():
+        penalty = PRIORITY_PENALTY * float(np.mean(np.hypot(*np.diff(xy[path], axis=0).T)))
+        path = windowed_two_opt(xy, path, priority=np.concatenate([[0.0], priority]), penalty=penalty)
+    else:
+        path = windowed_two_opt(xy, path)
+    legs = np.hypot(*(xy[path[1:]] - xy[path[:-1]]).T)
+    return path[1:] - 1, np.cumsum(legs)
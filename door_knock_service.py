@@ -0,0 +1,510 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ * *
+ * This program is free software; you can redistribute it and/or modify  *
+ * it under the terms of the GNU General Public License as published by  *
+ * the Free Software Foundation; either version 2 of the License, or     *
+ * (at your option) any later version.                                   *
+ * *
+ ***************************************************************************/
+
+ Local planning service. Keeps the road graph, the snapped addresses and the
+ current plan in memory and answers re-planning requests over HTTP/JSON on
+ localhost, so dispatchers get updated crew tours without re-running the
+ planner.
+
+ Run from the QGIS plugins folder with the QGIS Python environment:
+
+     python -m door_knock_planner.door_knock_service --roads roads.gpkg \\
+         --visit-points visit_points.gpkg --id-field ADDRESS_ID --start 151.2,-33.8
+
+ Endpoints (all POST with a JSON body, except GET /status):
+
+     /route          {"crews": [1, 2]}                  tours of the given (or all) crews
+     /resequence     {"crew": 4, "exclude": [ids]}      drops addresses from a crew's tour
+     /reassign       {"addresses": [ids], "crew": 2}    moves addresses to another crew
+     /status-merge   {"updates": [{"id": ..., "Outcome": "Completed", ...}]}
+     GET /status                                        plan summary
+
+ Every change returns only the tours of the crews it affected.
+"""
+
+__author__ = 'Darren Green'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2025 by Darren Green'
+
+import argparse
+import json
+import math
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+from qgis.core import (
+    QgsFeatureRequest,
+    QgsProject,
+    QgsVectorLayer
+)
+from . import door_knock_cache as cache
+from .door_knock_blocks import block_representatives, street_blocks, walk_blocks
+from .door_knock_closures import apply_closures, closures_key, read_closures
+from .door_knock_crs import transform_xy, working_crs
+from .door_knock_fields import address_key, is_completed, missing_completion_fields
+from .door_knock_hierarchy import load_or_build
+from .door_knock_network import network_from_layer
+from .door_knock_sequencing import crew_tour
+
+DEFAULT_PORT = 8765
+
+
+class PlanningService:
+    """
+    The current plan held in memory. Addresses are identified by their
+    unique ID; crew 0 holds addresses that are not assigned to any crew.
+    As in the planner, tours visit street blocks (address_block, walked in
+    order of address_position along the street), each located at its
+    middle address. A crew's tour starts from the planner's visit order
+    (address_order) or, without one, is sequenced once from its depot;
+    after that changes only re-measure the legs they touch: a block that
+    empties is dropped and its neighbours joined, and a new block is put
+    where it adds least. Crews whose depot is None cannot be routed.
+    """
+
+    def __init__(self, network, depot_nodes, address_ids, address_nodes, address_metres, address_crew, crew_depot,
+                 closed=None, hierarchy=None, address_block=None, address_position=None, address_order=None,
+                 is_numeric_id=None):
+        self.network = network
+        self.depot_nodes = np.asarray(depot_nodes, dtype=np.int64)
+        self.address_ids = list(address_ids)
+        self.address_nodes = np.asarray(address_nodes, dtype=np.int64)
+        self.address_metres = np.asarray(address_metres, dtype=float)
+        self.address_crew = np.asarray(address_crew, dtype=np.int64).copy()
+        self.crew_depot = dict(crew_depot)
+        self.closed = np.zeros(len(self.address_ids), dtype=bool) if closed is None else np.asarray(closed, dtype=bool).copy()
+        self.hierarchy = hierarchy
+        count = len(self.address_ids)
+        self.address_block = np.arange(count) if address_block is None else np.asarray(address_block, dtype=np.int64)
+        self.address_position = np.zeros(count) if address_position is None else np.asarray(address_position, dtype=float)
+        self.address_order = None if address_order is None else np.asarray(address_order, dtype=float)
+        if count:
+            _, _, middle = block_representatives(self.address_block, self.address_position)
+            self.block_nodes = self.address_nodes[middle]
+            self.block_metres = self.address_metres[middle]
+        else:
+            self.block_nodes, self.block_metres = np.zeros(0, dtype=np.int64), np.zeros((0, 2))
+        if is_numeric_id is None:
+            is_numeric_id = bool(self.address_ids) and all(
+                isinstance(address_id, (int, float)) and not isinstance(address_id, bool) for address_id in self.address_ids
+            )
+        self.is_numeric_id = is_numeric_id
+        # Requested ids are matched as the Status Tracker matches them, so
+        # "123" finds the address 123 in a numeric ID field.
+        self._index = {address_key(address_id, is_numeric_id): i for i, address_id in enumerate(self.address_ids)}
+        # crew: (reachable blocks in visiting order, leg cost into each, unreachable blocks)
+        self._tours = {}
+        self._lock = threading.RLock()
+
+    def _positions(self, address_ids):
+        positions = []
+        for address_id in address_ids:
+            position = self._index.get(address_key(address_id, self.is_numeric_id))
+            if position is None:
+                raise ValueError(f"Unknown address {address_id!r}.")
+            positions.append(position)
+        return np.array(positions, dtype=np.int64)
+
+    def _check_crew(self, crew):
+        if crew not in self.crew_depot:
+            raise ValueError(f"Unknown crew {crew!r}.")
+        if self.crew_depot[crew] is None:
+            raise ValueError(f"Crew {crew!r} has addresses without a depot_id in the plan, so it cannot be routed.")
+
+    def _depot_node(self, crew):
+        return int(self.depot_nodes[self.crew_depot[crew]])
+
+    def _members(self, crew):
+        return np.flatnonzero((self.address_crew == crew) & ~self.closed)
+
+    def _leg(self, a, b):
+        return float(self.network.one_to_many(int(a), [int(b)])[0])
+
+    def _plan(self, crew):
+        """
+        Returns the crew's tour, building it on first use.
+        """
+        if crew in self._tours:
+            return self._tours[crew]
+        members = self._members(crew)
+        blocks = np.unique(self.address_block[members])
+        depot = self._depot_node(crew)
+        component = self.network.components()
+        reachable = component[self.block_nodes[blocks]] == component[depot]
+        unreachable = blocks[~reachable].tolist()
+        blocks = blocks[reachable]
+
+        if self.address_order is not None and len(members) and np.isfinite(self.address_order[members]).all():
+            first = np.full(self.address_block.max() + 1, np.inf)
+            np.minimum.at(first, self.address_block[members], self.address_order[members])
+            ordered = blocks[np.argsort(first[blocks], kind='stable')].tolist()
+            legs, previous = [], depot
+            for block in ordered:
+                legs.append(self._leg(previous, self.block_nodes[block]))
+                previous = self.block_nodes[block]
+        else:
+            nodes = self.block_nodes[blocks]
+            start_costs = self.network.one_to_many(depot, nodes)
+            order, costs = crew_tour(self.network, nodes, start_costs, self.block_metres[blocks], self.hierarchy)
+            ordered = blocks[order].tolist()
+            legs = np.diff(np.concatenate([[0.0], costs])).tolist()
+
+        self._tours[crew] = (ordered, legs, unreachable)
+        return self._tours[crew]
+
+    def _drop(self, crew, blocks):
+        """
+        Removes blocks from the crew's tour, joining their neighbours with
+        newly measured legs.
+        """
+        if crew not in self._tours or not blocks:
+            return
+        ordered, legs, unreachable = self._tours[crew]
+        kept, kept_legs = [], []
+        previous, joined = self._depot_node(crew), False
+        for block, leg in zip(ordered, legs):
+            if block in blocks:
+                joined = True
+                continue
+            kept.append(block)
+            kept_legs.append(self._leg(previous, self.block_nodes[block]) if joined else leg)
+            previous, joined = self.block_nodes[block], False
+        self._tours[crew] = (kept, kept_legs, [block for block in unreachable if block not in blocks])
+
+    def _add(self, crew, block):
+        """
+        Puts a block into the crew's tour where it adds the least travel,
+        measured with one search from the block.
+        """
+        if crew not in self._tours:
+            return
+        ordered, legs, unreachable = self._tours[crew]
+        if block in ordered or block in unreachable:
+            return
+        depot = self._depot_node(crew)
+        component = self.network.components()
+        if component[self.block_nodes[block]] != component[depot]:
+            unreachable.append(block)
+            return
+        nodes = [depot] + [int(self.block_nodes[b]) for b in ordered]
+        costs = self.network.one_to_many(int(self.block_nodes[block]), nodes)
+        # Inserting after nodes[k] replaces legs[k] with two legs via block.
+        added = np.append(costs[:-1] + costs[1:] - np.asarray(legs, dtype=float), costs[-1])
+        k = int(np.argmin(added))
+        tail = [float(costs[k + 1])] + legs[k + 1:] if k < len(ordered) else []
+        self._tours[crew] = (ordered[:k] + [block] + ordered[k:], legs[:k] + [float(costs[k])] + tail, unreachable)
+
+    def _emptied(self, crew):
+        """
+        Returns the blocks in the crew's tour that no longer hold any of
+        its open addresses.
+        """
+        if crew not in self._tours:
+            return set()
+        ordered, _, unreachable = self._tours[crew]
+        present = set(self.address_block[self._members(crew)].tolist())
+        return {block for block in ordered + unreachable if block not in present}
+
+    def tour(self, crew):
+        with self._lock:
+            self._check_crew(crew)
+            ordered, legs, unreachable = self._plan(crew)
+            blocks = ordered + unreachable
+            arrival = np.concatenate([np.cumsum(legs), np.full(len(unreachable), math.inf)])
+            members = self._members(crew)
+            local = {block: i for i, block in enumerate(blocks)}
+            member_block = np.array([local[b] for b in self.address_block[members].tolist()], dtype=np.int64)
+            order = members[np.lexsort((self.address_position[members], member_block))]
+            bounds = np.concatenate([[0], np.cumsum(np.bincount(member_block, minlength=len(blocks)))])
+            visits, costs = walk_blocks(
+                np.arange(len(blocks)), arrival, np.arange(len(order)), bounds, self.address_metres[order],
+                self.address_position[order], self.network.node_xy[self._depot_node(crew)]
+            )
+            visits = [
+                {'id': self.address_ids[order[k]], 'visit_order': position + 1,
+                 'cost': float(cost) if math.isfinite(cost) else None}
+                for position, (k, cost) in enumerate(zip(visits.tolist(), costs.tolist()))
+            ]
+            reachable = costs[np.isfinite(costs)]
+            return {'crew': crew, 'visits': visits, 'crew_cost': float(reachable.max()) if len(reachable) else 0.0}
+
+    def tours(self, crews=None):
+        with self._lock:
+            if crews is None:
+                crews = [crew for crew in sorted(self.crew_depot) if self.crew_depot[crew] is not None]
+            return [self.tour(crew) for crew in crews]
+
+    def unassigned(self):
+        with self._lock:
+            return [self.address_ids[i] for i in np.flatnonzero((self.address_crew == 0) & ~self.closed)]
+
+    def status(self):
+        with self._lock:
+            open_addresses = ~self.closed
+            return {
+                'crews': {str(crew): int(((self.address_crew == crew) & open_addresses).sum()) for crew in sorted(self.crew_depot)},
+                'unassigned': int(((self.address_crew == 0) & open_addresses).sum()),
+                'closed': int(self.closed.sum()),
+            }
+
+    def resequence(self, crew, exclude=()):
+        """
+        Removes the excluded addresses from the crew's tour (they become
+        unassigned) and returns the crew's updated tour.
+        """
+        with self._lock:
+            self._check_crew(crew)
+            positions = self._positions(exclude)
+            self._plan(crew)
+            self.address_crew[positions[self.address_crew[positions] == crew]] = 0
+            self._drop(crew, self._emptied(crew))
+            return {'tours': [self.tour(crew)], 'unassigned': self.unassigned()}
+
+    def reassign(self, address_ids, crew):
+        """
+        Moves addresses to another crew and returns the tours of every crew
+        that gained or lost addresses.
+        """
+        with self._lock:
+            self._check_crew(crew)
+            positions = self._positions(address_ids)
+            losing = {int(c) for c in self.address_crew[positions] if c != 0 and c != crew}
+            for other in losing:
+                self._check_crew(other)
+                self._plan(other)
+            self._plan(crew)
+            self.address_crew[positions] = crew
+            for other in losing:
+                self._drop(other, self._emptied(other))
+            for block in dict.fromkeys(self.address_block[positions[~self.closed[positions]]].tolist()):
+                self._add(crew, block)
+            return {'tours': self.tours(sorted(losing | {crew})), 'unassigned': self.unassigned()}
+
+    def merge_status(self, updates):
+        """
+        Applies field status records. A valid 'Completed' record closes the
+        address; one with missing fields is rejected with the reason, as in
+        the Status Tracker. Returns the tours of the crews that changed.
+        """
+        with self._lock:
+            affected = set()
+            rejected = []
+            for record in updates:
+                position = self._index.get(address_key(record.get('id'), self.is_numeric_id))
+                if position is None:
+                    rejected.append({'id': record.get('id'), 'reason': "Unknown address"})
+                    continue
+                if not is_completed(record.get('Outcome')):
+                    continue
+                missing = missing_completion_fields(record)
+                if missing:
+                    rejected.append({'id': record.get('id'), 'reason': f"Marked 'Completed' but missing data in: {', '.join(missing)}"})
+                    continue
+                if not self.closed[position]:
+                    self.closed[position] = True
+                    if self.address_crew[position]:
+                        affected.add(int(self.address_crew[position]))
+            for crew in affected:
+                self._drop(crew, self._emptied(crew))
+            return {'tours': self.tours(sorted(c for c in affected if self.crew_depot.get(c) is not None)),
+                    'rejected': rejected}
+
+
+def service_from_layers(road_layer, visit_layer, unique_id_field, start_xy=None, depot_layer=None,
+                        hierarchy_folder=None, closures_layer=None, closure_factor_field='', use_blocks=True):
+    """
+    Builds a PlanningService from the road network and a Visit Points layer
+    written by the planner, with the planner's road closures and street
+    blocks so its tours agree with the desktop plan. Depots come from
+    depot_layer (matched on the depot_id field) or, without one, start_xy
+    in the road layer CRS. Crews with addresses missing a depot_id are
+    kept but refused routing. With a hierarchy_folder the road hierarchy
+    saved there (or built now) is used for sequencing, unless closures are
+    applied.
+    """
+    transform_context = QgsProject.instance().transformContext()
+    work_crs = working_crs(road_layer, visit_layer, transform_context)
+    road_key = (cache.layer_key(road_layer), work_crs.authid())
+    network = cache.cached(
+        'network', road_key, lambda: network_from_layer(road_layer, None, work_crs, transform_context)
+    )
+    routing_network = network
+    if closures_layer is not None:
+        closures = read_closures(closures_layer, closure_factor_field, work_crs, transform_context)
+        routing_network, _ = cache.cached(
+            'closures', (road_key, closures_key(closures)),
+            lambda: apply_closures(network, road_key, closures, work_crs)
+        )
+    has_depots = visit_layer.fields().indexOf('depot_id') != -1 and depot_layer is not None
+    has_order = visit_layer.fields().indexOf('visit_order') != -1
+
+    def number(value):
+        return None if value is None or (hasattr(value, 'isNull') and value.isNull()) else value
+
+    address_ids, address_xy, address_crew, address_order, closed, crew_depot_ids = [], [], [], [], [], {}
+    for feature in visit_layer.getFeatures():
+        if not feature.hasGeometry():
+            continue
+        point = feature.geometry().centroid().asPoint()
+        crew = int(number(feature['crew_id']) or 0)
+        address_ids.append(feature[unique_id_field])
+        address_xy.append((point.x(), point.y()))
+        address_crew.append(crew)
+        order = number(feature['visit_order']) if has_order else None
+        address_order.append(math.nan if order is None else float(order))
+        closed.append(is_completed(feature['Outcome']) if visit_layer.fields().indexOf('Outcome') != -1 else False)
+        if crew:
+            depot_id = number(feature['depot_id']) if has_depots else None
+            if crew_depot_ids.get(crew, 0) is not None:
+                crew_depot_ids[crew] = None if has_depots and depot_id is None else depot_id
+
+    if has_depots:
+        depot_ids = sorted({int(d) for d in crew_depot_ids.values() if d is not None})
+        depot_xy = []
+        for feature in depot_layer.getFeatures(QgsFeatureRequest().setFilterFids(depot_ids)):
+            point = feature.geometry().centroid().asPoint()
+            depot_xy.append((feature.id(), point.x(), point.y()))
+        depot_xy.sort()
+        depot_position = {fid: i for i, (fid, _, _) in enumerate(depot_xy)}
+        missing = sorted(set(depot_ids) - set(depot_position))
+        if missing:
+            raise ValueError(f"The depots layer has no depot with id {', '.join(str(d) for d in missing)}.")
+        crew_depot = {
+            crew: None if depot_id is None else depot_position[int(depot_id)] for crew, depot_id in crew_depot_ids.items()
+        }
+        depot_xy = transform_xy([(x, y) for _, x, y in depot_xy], depot_layer.crs(), work_crs, transform_context)
+    else:
+        if start_xy is None:
+            raise ValueError("A start location or a depots layer is required.")
+        crew_depot = {crew: 0 for crew in crew_depot_ids}
+        depot_xy = transform_xy([start_xy], road_layer.crs(), work_crs, transform_context)
+
+    depot_nodes = network.snap(depot_xy)[0] if len(depot_xy) else np.zeros(0, dtype=np.int64)
+    address_xy = transform_xy(address_xy, visit_layer.crs(), work_crs, transform_context)
+    address_nodes, _, address_edges, address_offsets = network.snap(address_xy)
+    if use_blocks and network.edge_count and len(address_xy):
+        address_block, address_position = cache.cached(
+            'blocks', (road_key, cache.array_key(address_xy)),
+            lambda: street_blocks(network, address_xy, address_edges, address_offsets)
+        )
+    else:
+        address_block, address_position = None, None
+    hierarchy = load_or_build(network, hierarchy_folder) if hierarchy_folder and closures_layer is None else None
+    return PlanningService(routing_network, depot_nodes, address_ids, address_nodes, address_xy,
+                           address_crew, crew_depot, closed, hierarchy, address_block, address_position,
+                           address_order if has_order else None,
+                           visit_layer.fields().field(unique_id_field).isNumeric())
+
+
+class PlanningRequestHandler(BaseHTTPRequestHandler):
+    """
+    Translates HTTP/JSON requests into PlanningService calls.
+    """
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip('/') == '/status':
+            self._reply(200, self.server.planning_service.status())
+        else:
+            self._reply(404, {'error': f"Unknown endpoint {self.path}."})
+
+    def do_POST(self):
+        service = self.server.planning_service
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            body = json.loads(self.rfile.read(length) or b'{}')
+            endpoint = self.path.rstrip('/')
+            if endpoint == '/route':
+                payload = {'tours': service.tours(body.get('crews'))}
+            elif endpoint == '/resequence':
+                payload = service.resequence(body['crew'], body.get('exclude', []))
+            elif endpoint == '/reassign':
+                payload = service.reassign(body['addresses'], body['crew'])
+            elif endpoint == '/status-merge':
+                payload = service.merge_status(body.get('updates', []))
+            else:
+                self._reply(404, {'error': f"Unknown endpoint {self.path}."})
+                return
+        except (ValueError, KeyError, TypeError) as e:
+            self._reply(400, {'error': str(e)})
+            return
+        self._reply(200, payload)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
+
+
+def serve(service, host='127.0.0.1', port=DEFAULT_PORT):
+    """
+    Serves the planning service until interrupted.
+    """
+    server = ThreadingHTTPServer((host, port), PlanningRequestHandler)
+    server.planning_service = service
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main(argv=None):
+    from .door_knock_batch import start_qgis
+
+    parser = argparse.ArgumentParser(description="Serve door knock re-planning requests on localhost.")
+    parser.add_argument('--roads', required=True, help="road network layer")
+    parser.add_argument('--visit-points', required=True, help="Visit Points layer written by the planner")
+    parser.add_argument('--id-field', required=True, help="unique address ID field")
+    parser.add_argument('--start', help="start location as x,y in the road layer CRS")
+    parser.add_argument('--depots', help="depots layer used for the plan")
+    parser.add_argument('--hierarchy', help="folder holding (or receiving) the precomputed road hierarchy")
+    parser.add_argument('--closures', help="road closures layer used for the plan")
+    parser.add_argument('--closure-factor', default='', help="delay factor field of the closures layer")
+    parser.add_argument('--no-blocks', action='store_true', help="the plan was made without street blocks")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    args = parser.parse_args(argv)
+
+    app = start_qgis()
+    try:
+        layers = {}
+        for key, path in (('roads', args.roads), ('visit_points', args.visit_points), ('depots', args.depots),
+                          ('closures', args.closures)):
+            if path:
+                layers[key] = QgsVectorLayer(path, key, 'ogr')
+                if not layers[key].isValid():
+                    raise SystemExit(f"Could not load layer '{path}'.")
+        start_xy = tuple(float(v) for v in args.start.split(',')) if args.start else None
+        try:
+            service = service_from_layers(layers['roads'], layers['visit_points'], args.id_field,
+                                          start_xy, layers.get('depots'), args.hierarchy, layers.get('closures'),
+                                          args.closure_factor, not args.no_blocks)
+        except ValueError as e:
+            raise SystemExit(str(e))
+        for crew in sorted(c for c, depot in service.crew_depot.items() if depot is None):
+            print(f"Crew {crew} has addresses without a depot_id and will not be routed.")
+        print(f"Serving {len(service.address_ids)} addresses for {len(service.crew_depot)} crews "
+              f"on http://127.0.0.1:{args.port}")
+        serve(service, port=args.port)
+    finally:
+        app.exitQgis()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,382 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ * *
+ * This program is free software; you can redistribute it and/or modify  *
+ * it under the terms of the GNU General Public License as published by  *
+ * the Free Software Foundation; either version 2 of the License, or     *
+ * (at your option) any later version.                                   *
+ * *
+ ***************************************************************************/
+
+ Field operation simulator. Starting from a planner output, it plays an
+ operation shift by shift: every crew works the doors it reaches within
+ the shift and returns a crew CSV with random outcomes and missing data,
+ new addresses are reported, and the status tracker and the planner are
+ run on the returns. Run time and memory are recorded for every cycle, so
+ a long, many-crew operation can be load-tested before it happens.
+
+ Run from the QGIS plugins folder with the QGIS Python environment:
+
+     python -m door_knock_planner.door_knock_simulator simulation.json
+
+ The simulation file (JSON or YAML) names the starting plan, its unique
+ address ID field and the planner parameters for re-planning; the other
+ settings are optional and default to SIMULATION_DEFAULTS, e.g.:
+
+     {
+       "visit_points": "visit_points.gpkg", "unique_id": "ADDRESS_ID",
+       "planner": {"INPUT_ROADS": "roads.gpkg", "INPUT_POLYGON": "aoi.gpkg",
+                   "INPUT_START_POINT": "151.2,-33.8 [EPSG:4326]", "INPUT_NUM_CREWS": 200},
+       "shifts": 10,
+       "outcomes": {"Completed": 0.6, "No Person/s home": 0.3, "Unable to Locate/Attend Address": 0.1},
+       "missing_rates": {"Inquiry Date": 0.02, "Inquirer ID": 0.05},
+       "new_addresses_per_shift": 50
+     }
+"""
+
+__author__ = 'Darren Green'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2025 by Darren Green'
+
+import argparse
+import csv
+import datetime
+import os
+import random
+import sys
+import time
+
+from qgis.core import (
+    QgsApplication,
+    QgsFeature,
+    QgsFeatureRequest,
+    QgsGeometry,
+    QgsPointXY,
+    QgsProcessing,
+    QgsProcessingContext,
+    QgsProcessingFeedback,
+    QgsProject,
+    QgsVectorLayer,
+    QgsWkbTypes
+)
+from .door_knock_batch import LAYER_PARAMETERS, load_layers, read_document, start_qgis
+from .door_knock_planner_algorithm import DoorKnockPlannerAlgorithm
+from .door_knock_tracker_algorithm import DoorKnockTrackerAlgorithm
+
+PLANNER_ID = 'doorknockplanner:doorknockplanner'
+TRACKER_ID = 'doorknockplanner:doorknocktracker'
+SIMULATION_DEFAULTS = {
+    'shifts': 10,
+    'seed': 1,
+    'start_date': None,
+    # Crews work the doors planned to be reached within this many minutes.
+    'shift_minutes': 480,
+    'outcomes': {'Completed': 0.6, 'No Person/s home': 0.3, 'Unable to Locate/Attend Address': 0.1},
+    # Chance that a 'Completed' return leaves each field empty.
+    'missing_rates': {'Inquiry Date': 0.02, 'Inquirer ID': 0.02, 'Inquirer Org': 0.02},
+    # Chance that a crew's CSV does not come back at the end of a shift.
+    'lost_return_rate': 0.0,
+    'new_addresses_per_shift': 0,
+    # New addresses are placed this many metres around an existing one.
+    'new_address_spread': 50.0,
+}
+RETURN_FIELDS = ['crew_id', 'Outcome', 'Inquiry Date', 'Inquirer ID', 'Inquirer Org', 'Notes']
+CYCLE_FIELDS = [
+    'shift', 'planned', 'visited', 'completed', 'lost_returns', 'new_addresses', 'exceptions', 'outstanding',
+    'track_seconds', 'plan_seconds', 'memory_mb', 'peak_memory_mb', 'status'
+]
+
+
+def read_simulation(path):
+    """
+    Reads a simulation file and returns its settings with the defaults
+    applied. Relative layer paths are kept; they are read from the
+    simulation file's folder.
+    """
+    data = read_document(path)
+    config = dict(SIMULATION_DEFAULTS)
+    config.update(data)
+    for key in ('visit_points', 'unique_id', 'planner'):
+        if not config.get(key):
+            raise ValueError(f"The simulation file needs '{key}'.")
+    if not config['outcomes'] or min(config['outcomes'].values()) < 0 or sum(config['outcomes'].values()) <= 0:
+        raise ValueError("'outcomes' needs at least one outcome with a positive share and no negative shares.")
+    return config
+
+
+def simulate_returns(visits, config, rng, shift_start):
+    """
+    Returns the crew returns for one shift as {crew id: [record]} and the
+    crews whose returns were lost. visits are (unique id, crew id, minutes
+    to the door) for the current plan; each crew reports every door it
+    reaches within the shift with an outcome drawn from the outcome shares.
+    Completed records leave fields empty at the missing-data rates.
+    """
+    outcomes = list(config['outcomes'])
+    shares = [config['outcomes'][outcome] for outcome in outcomes]
+    crews = sorted({crew for _, crew, _ in visits if crew is not None})
+    lost = {crew for crew in crews if rng.random() < config['lost_return_rate']}
+
+    returns = {crew: [] for crew in crews if crew not in lost}
+    for unique_id, crew, eta in visits:
+        if crew not in returns or eta is None:
+            continue
+        if config['shift_minutes'] and eta > config['shift_minutes']:
+            continue
+        outcome = rng.choices(outcomes, shares)[0]
+        record = {
+            'id': unique_id, 'crew_id': crew, 'Outcome': outcome,
+            'Inquiry Date': (shift_start + datetime.timedelta(minutes=eta)).strftime('%Y-%m-%dT%H:%M:%S'),
+            'Inquirer ID': f"SIM{crew:03d}", 'Inquirer Org': 'Simulation', 'Notes': '',
+        }
+        if outcome.strip().lower() == 'completed':
+            for field, rate in config['missing_rates'].items():
+                if rng.random() < rate:
+                    record[field] = ''
+        returns[crew].append(record)
+    return returns, sorted(lost)
+
+
+def new_address_ids(existing_ids, count, shift, numeric):
+    """
+    Returns count unique ids for new addresses: the next numbers after the
+    largest existing id for numeric id fields, otherwise 'SIM-<shift>-<n>'.
+    """
+    if numeric:
+        start = max((int(float(i)) for i in existing_ids if i is not None), default=0) + 1
+        return list(range(start, start + count))
+    taken = {str(i) for i in existing_ids}
+    ids = []
+    number = 1
+    while len(ids) < count:
+        candidate = f"SIM-{shift:02d}-{number:05d}"
+        if candidate not in taken:
+            ids.append(candidate)
+        number += 1
+    return ids
+
+
+def write_returns(folder, returns, unique_id_field):
+    """
+    Writes one crew CSV per crew into folder and returns their paths. When
+    no crew returned anything an empty CSV is written, as the tracker needs
+    at least one.
+    """
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for crew, records in sorted(returns.items()) or [(0, [])]:
+        path = os.path.join(folder, f"crew_{crew:02d}.csv")
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow([unique_id_field] + RETURN_FIELDS)
+            writer.writerows([[record['id']] + [record[field] for field in RETURN_FIELDS] for record in records])
+        paths.append(path)
+    return paths
+
+
+def memory_mb():
+    """
+    Returns the current and peak resident memory of this process in MB;
+    either is None where the platform does not report it.
+    """
+    current = peak = None
+    try:
+        with open('/proc/self/statm') as f:
+            current = round(int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1e6, 1)
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        peak = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1e6 if sys.platform == 'darwin' else 1e3), 1)
+    except ImportError:
+        pass
+    return current, peak
+
+
+def plan_visits(plan_layer, unique_id_field):
+    """
+    Returns (unique id, crew id, minutes to the door) for every planned
+    address, read without geometries. Empty crews and times are None.
+    """
+    def number(value):
+        return value if isinstance(value, (int, float)) else None
+
+    request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry)
+    request.setSubsetOfAttributes([unique_id_field, 'crew_id', 'eta_minutes'], plan_layer.fields())
+    return [
+        (feature[unique_id_field], number(feature['crew_id']), number(feature['eta_minutes']))
+        for feature in plan_layer.getFeatures(request)
+    ]
+
+
+def new_addresses_layer(master_layer, unique_id_field, count, shift, spread, rng):
+    """
+    Returns a memory layer of count new addresses, each a copy of a random
+    address of the master list moved up to spread metres, with a new id
+    and no visit status. Returns None when count is 0.
+    """
+    if not count:
+        return None
+    features = list(master_layer.getFeatures())
+    if not features:
+        return None
+    fields = master_layer.fields()
+    numeric = fields.at(fields.indexOf(unique_id_field)).isNumeric()
+    ids = new_address_ids([feature[unique_id_field] for feature in features], count, shift, numeric)
+    if master_layer.crs().isGeographic():
+        spread /= 111320.0
+
+    layer = QgsVectorLayer(
+        f"{QgsWkbTypes.displayString(master_layer.wkbType())}?crs={master_layer.crs().authid()}", 'New Addresses', 'memory'
+    )
+    layer.dataProvider().addAttributes(fields.toList())
+    layer.updateFields()
+    new_features = []
+    for new_id in ids:
+        source = rng.choice(features)
+        point = source.geometry().centroid().asPoint()
+        feature = QgsFeature(fields)
+        feature.setAttributes(source.attributes())
+        feature.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(
+            point.x() + rng.uniform(-spread, spread), point.y() + rng.uniform(-spread, spread)
+        )))
+        feature[unique_id_field] = new_id
+        for field in ('Inquiry Date', 'Inquirer ID', 'Inquirer Org', 'Notes'):
+            if fields.indexOf(field) != -1:
+                feature[field] = None
+        if fields.indexOf('Outcome') != -1:
+            feature['Outcome'] = 'Outstanding'
+        new_features.append(feature)
+    layer.dataProvider().addFeatures(new_features)
+    return layer
+
+
+def run_simulation(config, base_folder, output_folder, feedback=None):
+    """
+    Plays the operation shift by shift and returns one row of CYCLE_FIELDS
+    per shift. Each shift writes the crew CSVs into its own folder, runs
+    the status tracker on them and re-plans the outstanding addresses with
+    the planner; the planner's road graph stays cached between shifts, as
+    it would in a QGIS session.
+    """
+    registry = QgsApplication.processingRegistry()
+    planner = registry.createAlgorithmById(PLANNER_ID)
+    tracker = registry.createAlgorithmById(TRACKER_ID)
+    feedback = feedback or QgsProcessingFeedback()
+    rng = random.Random(config['seed'])
+    unique_id_field = config['unique_id']
+    start_date = datetime.date.fromisoformat(config['start_date']) if config['start_date'] else datetime.date.today()
+
+    layers = {}
+    plan_layer = load_layers({'visit_points': config['visit_points']}, ['visit_points'], base_folder, layers)['visit_points']
+    planner_parameters = load_layers(dict(config['planner']), LAYER_PARAMETERS, base_folder, layers)
+    master_layer = plan_layer
+    rows = []
+    for shift in range(1, config['shifts'] + 1):
+        shift_folder = os.path.join(output_folder, f"shift_{shift:02d}")
+        shift_start = datetime.datetime.combine(start_date + datetime.timedelta(days=shift - 1), datetime.time(8))
+        visits = plan_visits(plan_layer, unique_id_field)
+        returns, lost = simulate_returns(visits, config, rng, shift_start)
+        csv_layers = [
+            QgsVectorLayer(path, os.path.basename(path), 'ogr')
+            for path in write_returns(shift_folder, returns, unique_id_field)
+        ]
+        new_layer = new_addresses_layer(
+            master_layer, unique_id_field, config['new_addresses_per_shift'], shift, config['new_address_spread'], rng
+        )
+        row = {
+            'shift': shift, 'planned': len(visits),
+            'visited': sum(len(records) for records in returns.values()),
+            'completed': sum(
+                record['Outcome'].strip().lower() == 'completed' for records in returns.values() for record in records
+            ),
+            'lost_returns': len(lost), 'new_addresses': new_layer.featureCount() if new_layer else 0,
+        }
+
+        context = QgsProcessingContext()
+        context.setProject(QgsProject.instance())
+        exceptions_path = os.path.join(shift_folder, 'exceptions.csv')
+        tracker_parameters = {
+            DoorKnockTrackerAlgorithm.INPUT_CSVS: csv_layers,
+            DoorKnockTrackerAlgorithm.INPUT_ORIGINAL_POINTS: master_layer,
+            DoorKnockTrackerAlgorithm.INPUT_UNIQUE_ID: unique_id_field,
+            DoorKnockTrackerAlgorithm.OUTPUT_NEXT_PRIORITY: QgsProcessing.TEMPORARY_OUTPUT,
+            DoorKnockTrackerAlgorithm.OUTPUT_EXCEPTIONS: exceptions_path,
+        }
+        if new_layer:
+            tracker_parameters[DoorKnockTrackerAlgorithm.INPUT_NEW_POINTS] = new_layer
+        started = time.perf_counter()
+        results, ok = tracker.run(tracker_parameters, context, feedback)
+        row['track_seconds'] = round(time.perf_counter() - started, 2)
+        if not ok:
+            rows.append(dict(row, status='tracker failed'))
+            break
+        master_layer = context.takeResultLayer(results[DoorKnockTrackerAlgorithm.OUTPUT_NEXT_PRIORITY])
+        if os.path.exists(exceptions_path):
+            with open(exceptions_path, encoding='utf-8') as f:
+                row['exceptions'] = max(sum(1 for _ in f) - 1, 0)
+        else:
+            row['exceptions'] = 0
+
+        outstanding = master_layer.materialize(QgsFeatureRequest().setFilterExpression(
+            "coalesce(lower(\"Outcome\"), '') <> 'completed'"
+        ))
+        row['outstanding'] = outstanding.featureCount()
+        if not row['outstanding']:
+            row['memory_mb'], row['peak_memory_mb'] = memory_mb()
+            rows.append(dict(row, status='done'))
+            break
+
+        parameters = dict(planner_parameters)
+        parameters[DoorKnockPlannerAlgorithm.INPUT_ADDRESSES] = outstanding
+        parameters[DoorKnockPlannerAlgorithm.INPUT_UNIQUE_ID] = unique_id_field
+        parameters[DoorKnockPlannerAlgorithm.OUTPUT_VISIT_POINTS] = QgsProcessing.TEMPORARY_OUTPUT
+        parameters[DoorKnockPlannerAlgorithm.OUTPUT_CSV] = QgsProcessing.TEMPORARY_OUTPUT
+        started = time.perf_counter()
+        results, ok = planner.run(parameters, context, feedback)
+        row['plan_seconds'] = round(time.perf_counter() - started, 2)
+        row['memory_mb'], row['peak_memory_mb'] = memory_mb()
+        if not ok or DoorKnockPlannerAlgorithm.OUTPUT_VISIT_POINTS not in results:
+            rows.append(dict(row, status='planner failed'))
+            break
+        plan_layer = context.takeResultLayer(results[DoorKnockPlannerAlgorithm.OUTPUT_VISIT_POINTS])
+        rows.append(dict(row, status='ok'))
+    return rows
+
+
+def write_cycles(path, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=CYCLE_FIELDS)
+        writer.writeheader()
+        writer.writerows([{field: '' if row.get(field) is None else row[field] for field in CYCLE_FIELDS} for row in rows])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate a door knock operation shift by shift without the QGIS GUI.")
+    parser.add_argument('simulation', help="JSON or YAML simulation file")
+    parser.add_argument('-o', '--output', help="folder for the crew returns and cycle log (default: <simulation>_run)")
+    args = parser.parse_args(argv)
+
+    config = read_simulation(args.simulation)
+    output = args.output or os.path.splitext(args.simulation)[0] + '_run'
+    os.makedirs(output, exist_ok=True)
+
+    app = start_qgis()
+    try:
+        rows = run_simulation(config, os.path.dirname(os.path.abspath(args.simulation)), output)
+    finally:
+        app.exitQgis()
+
+    log_path = os.path.join(output, 'simulation_cycles.csv')
+    write_cycles(log_path, rows)
+    for row in rows:
+        print(f"Shift {row['shift']}: {row['visited']} visited, {row.get('outstanding', '')} outstanding, "
+              f"track {row.get('track_seconds', '')} s, plan {row.get('plan_seconds', '')} s, "
+              f"{row.get('memory_mb') or 0:.0f} MB ({row['status']})")
+    print(f"Cycle log written to {log_path}")
+    return 0 if rows and rows[-1]['status'] in ('ok', 'done') else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ * *
+ * This program is free software; you can redistribute it and/or modify  *
+ * it under the terms of the GNU General Public License as published by  *
+ * the Free Software Foundation; either version 2 of the License, or     *
+ * (at your option) any later version.                                   *
+ * *
+ ***************************************************************************/
+
+ Travel-time weights for fastest routing. A road class or speed field on the
+ road layer is mapped through a class-to-speed lookup onto the edges of the
+ cached graph, giving an array of minutes per edge; walking and driving
+ each get their own array over the same graph structure.
+"""
+
+__author__ = 'Darren Green'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2025 by Darren Green'
+
+import re
+
+import numpy as np
+from qgis.core import QgsFeatureRequest
+
+
+def parse_speed_lookup(text):
+    """
+    Parses 'class=km/h' pairs separated by commas, semicolons or new lines
+    (e.g. 'motorway=100, residential=40') into a dict keyed by the lower
+    case class. A speed of 0 marks roads that cannot be used.
+    """
+    lookup = {}
+    for item in re.split(r'[,;\n]', text or ''):
+        if not item.strip():
+            continue
+        name, separator, speed = item.partition('=')
+        try:
+            if not separator or not name.strip():
+                raise ValueError
+            lookup[name.strip().lower()] = float(speed)
+        except ValueError:
+            raise ValueError(f"'{item.strip()}' in the speed lookup is not of the form class=km/h.")
+    return lookup
+
+
+def road_values(road_layer, field_name):
+    """
+    Returns {feature id: value of field_name} for every road, read without
+    geometries.
+    """
+    request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry)
+    request.setSubsetOfAttributes([field_name], road_layer.fields())
+    return {feature.id(): feature[field_name] for feature in road_layer.getFeatures(request)}
+
+
+def road_speed(value, lookup, default_kmh):
+    """
+    Returns the speed in km/h of a road whose class or speed field holds
+    value: its lookup speed, otherwise the value itself when it is a
+    positive number, otherwise default_kmh.
+    """
+    if value is None:
+        return default_kmh
+    key = str(value).strip().lower()
+    if key in lookup:
+        return lookup[key]
+    try:
+        speed = float(key)
+    except ValueError:
+        return default_kmh
+    return speed if speed > 0 else default_kmh
+
+
+def edge_speeds(network, values, lookup, default_kmh):
+    """
+    Returns the speed in km/h of every edge of the network, from values
+    ({road feature id: class or speed}) and the lookup. Edges of roads
+    without a value take default_kmh.
+    """
+    features, edge_position = np.unique(network.edge_feature, return_inverse=True)
+    speeds = np.array([road_speed(values.get(int(fid)), lookup, default_kmh) for fid in features], dtype=float)
+    return speeds[edge_position.reshape(-1)] if len(features) else np.zeros(0)
+
+
+def travel_minutes(edge_length, speeds_kmh):
+    """
+    Returns the minutes needed to travel each edge (lengths in metres) at
+    the given speeds; edges with no speed cannot be used (inf).
+    """
+    speeds_kmh = np.broadcast_to(np.asarray(speeds_kmh, dtype=float), np.shape(edge_length))
+    with np.errstate(divide='ignore'):
+        return np.where(speeds_kmh > 0, edge_length / (speeds_kmh * 1000.0 / 60.0), np.inf)
+
+
+def average_metres_per_minute(edge_length, minutes):
+    """
+    Returns the overall speed of the usable edges in metres per minute,
+    used to turn straight-line distances into time estimates.
+    """
+    usable = np.isfinite(minutes) & (minutes > 0)
+    if not usable.any():
+        return None
+    return float(edge_length[usable].sum() / minutes[usable].sum())
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ * *
+ * This program is free software; you can redistribute it and/or modify  *
+ * it under the terms of the GNU General Public License as published by  *
+ * the Free Software Foundation; either version 2 of the License, or     *
+ * (at your option) any later version.                                   *
+ * *
+ ***************************************************************************/
+
+ Workload-based crew partitioning for very large areas. Addresses are split
+ into tiles holding similar numbers of addresses and crews are shared
+ between tiles in proportion to their workload, so crew areas are clustered
+ tile by tile. This is not tile-and-stitch routing: the road graph is not
+ clipped per tile and routes still use the one search over the whole graph.
+"""
+
+__author__ = 'Darren Green'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2025 by Darren Green'
+
+import numpy as np
+
+
+def split_tiles(xy, max_per_tile, max_tiles, weights=None):
+    """
+    Recursively halves the heaviest tile at the weighted median of its
+    longer side until every tile weighs at most max_per_tile or max_tiles is
+    reached. Each point weighs 1 unless weights are given (e.g. the number
+    of addresses at a stop). Returns a list of index arrays into xy.
+    """
+    weights = np.ones(len(xy)) if weights is None else np.asarray(weights, dtype=float)
+    tiles = [np.arange(len(xy))]
+    while len(tiles) < max_tiles:
+        heaviest = max(range(len(tiles)), key=lambda t: weights[tiles[t]].sum())
+        members = tiles[heaviest]
+        if weights[members].sum() <= max_per_tile or len(members) < 2:
+            break
+        span = xy[members].max(axis=0) - xy[members].min(axis=0)
+        axis = int(np.argmax(span))
+        order = members[np.argsort(xy[members, axis], kind='stable')]
+        cumulative = np.cumsum(weights[order])
+        half = int(np.clip(np.searchsorted(cumulative, cumulative[-1] / 2), 1, len(order) - 1))
+        tiles[heaviest:heaviest + 1] = [order[:half], order[half:]]
+    return tiles
+
+
+def allocate_crews(workloads, num_crews):
+    """
+    Shares num_crews between tiles in proportion to their workload using the
+    largest remainder method. Every tile gets at least one crew, so there
+    must be no more tiles than crews.
+    """
+    workloads = np.asarray(workloads, dtype=float)
+    if len(workloads) > num_crews:
+        raise ValueError("There are more tiles than crews.")
+    quota = workloads / workloads.sum() * num_crews if workloads.sum() > 0 else np.full(len(workloads), num_crews / len(workloads))
+    crews = np.maximum(np.floor(quota).astype(int), 1)
+    while crews.sum() > num_crews:
+        candidates = np.flatnonzero(crews > 1)
+        crews[candidates[np.argmax((crews - quota)[candidates])]] -= 1
+    while crews.sum() < num_crews:
+        crews[np.argmax(quota - crews)] += 1
+    return crews.tolist()
@@ -20,9 +20,13 @@ from qgis.core import (
     QgsProcessing,
     QgsProcessingAlgorithm,
     QgsProcessingException,
+    QgsProcessingParameterDefinition,
+    QgsProcessingParameterEnum,
     QgsProcessingParameterMultipleLayers,
     QgsProcessingParameterFeatureSource,
     QgsProcessingParameterField,
+    QgsProcessingParameterFile,
+    QgsProcessingParameterNumber,
     QgsProcessingParameterFileDestination,
     QgsProcessingParameterFeatureSink,
     QgsFeatureSink,
@@ -33,13 +37,31 @@ from qgis.core import (
     QgsField
 )
 
+from .door_knock_fields import address_key, is_completed
+
+DUPLICATE_FIELD = 'duplicate_of'
+EXCEPTION_FIELDS = ['Rule Codes', 'Reason', 'Source', 'Row']
+MERGE_DECISION_FIELDS = ['Decision', 'Matched ID', 'Distance (m)', 'Label Similarity', 'New Label', 'Matched Label']
+
+
 class DoorKnockTrackerAlgorithm(QgsProcessingAlgorithm):
     INPUT_CSVS = 'INPUT_CSVS'
     INPUT_ORIGINAL_POINTS = 'INPUT_ORIGINAL_POINTS'
     INPUT_NEW_POINTS = 'INPUT_NEW_POINTS'
     INPUT_UNIQUE_ID = 'INPUT_UNIQUE_ID'
+    INPUT_LABEL_FIELD = 'INPUT_LABEL_FIELD'
+    INPUT_DUPLICATE_DISTANCE = 'INPUT_DUPLICATE_DISTANCE'
+    INPUT_DUPLICATE_SIMILARITY = 'INPUT_DUPLICATE_SIMILARITY'
+    INPUT_DUPLICATE_ACTION = 'INPUT_DUPLICATE_ACTION'
+    INPUT_RULES = 'INPUT_RULES'
     OUTPUT_NEXT_PRIORITY = 'OUTPUT_NEXT_PRIORITY'
     OUTPUT_EXCEPTIONS = 'OUTPUT_EXCEPTIONS'
+    OUTPUT_MERGE_DECISIONS = 'OUTPUT_MERGE_DECISIONS'
+
+    DUPLICATES_MERGE = 0
+    DUPLICATES_FLAG = 1
+    DEFAULT_DUPLICATE_DISTANCE = 30.0
+    DEFAULT_DUPLICATE_SIMILARITY = 0.8
 
     def tr(self, string):
         return QCoreApplication.translate('Processing', string)
@@ -83,6 +105,13 @@ class DoorKnockTrackerAlgorithm(QgsProcessingAlgorithm):
                 self.INPUT_UNIQUE_ID, self.tr('Unique Address ID Field'), parentLayerParameterName=self.INPUT_ORIGINAL_POINTS
             )
         )
+        self.addDuplicateParameters()
+        self.addParameter(
+            QgsProcessingParameterFile(
+                self.INPUT_RULES, self.tr('Validation Rules (JSON, default: completed visits need date, ID and org)'),
+                extension='json', optional=True
+            )
+        )
         self.addParameter(
             QgsProcessingParameterFeatureSink(
                 self.OUTPUT_NEXT_PRIORITY, self.tr('Updated Visit Points')
@@ -93,6 +122,55 @@ class DoorKnockTrackerAlgorithm(QgsProcessingAlgorithm):
                 self.OUTPUT_EXCEPTIONS, self.tr('Validation Exception Report'), 'CSV files (*.csv)', optional=True
             )
         )
+        self.addParameter(
+            QgsProcessingParameterFileDestination(
+                self.OUTPUT_MERGE_DECISIONS, self.tr('New Address Merge Decisions'), 'CSV files (*.csv)', optional=True
+            )
+        )
+
+    def addDuplicateParameters(self):
+        """
+        Adds the duplicate detection inputs for new addresses; shared with
+        the pipeline algorithm.
+        """
+        self.addParameter(
+            QgsProcessingParameterField(
+                self.INPUT_LABEL_FIELD, self.tr('Address Label Field (find new addresses already on the list)'),
+                parentLayerParameterName=self.INPUT_ORIGINAL_POINTS, optional=True
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterEnum(
+                self.INPUT_DUPLICATE_ACTION, self.tr('Duplicate New Addresses'),
+                options=[self.tr('Merge (leave them out)'), self.tr("Flag (add them with 'duplicate_of' set)")],
+                defaultValue=self.DUPLICATES_MERGE
+            )
+        )
+        distance_param = QgsProcessingParameterNumber(
+            self.INPUT_DUPLICATE_DISTANCE, self.tr('Duplicates Are Closer Than (metres)'),
+            QgsProcessingParameterNumber.Double, defaultValue=self.DEFAULT_DUPLICATE_DISTANCE, minValue=0.0
+        )
+        distance_param.setFlags(distance_param.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(distance_param)
+        similarity_param = QgsProcessingParameterNumber(
+            self.INPUT_DUPLICATE_SIMILARITY, self.tr('Minimum Address Label Similarity (0-1)'),
+            QgsProcessingParameterNumber.Double, defaultValue=self.DEFAULT_DUPLICATE_SIMILARITY, minValue=0.0, maxValue=1.0
+        )
+        similarity_param.setFlags(similarity_param.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(similarity_param)
+
+    def duplicateSettings(self, parameters, context):
+        """
+        Returns the duplicate detection inputs as keyword arguments for
+        mergeStatus.
+        """
+        return {
+            'label_field': self.parameterAsString(parameters, self.INPUT_LABEL_FIELD, context),
+            'duplicate_distance': self.parameterAsDouble(parameters, self.INPUT_DUPLICATE_DISTANCE, context),
+            'min_similarity': self.parameterAsDouble(parameters, self.INPUT_DUPLICATE_SIMILARITY, context),
+            'flag_duplicates': self.parameterAsEnum(parameters, self.INPUT_DUPLICATE_ACTION, context) == self.DUPLICATES_FLAG,
+            'transform_context': context.transformContext(),
+        }
 
     def processAlgorithm(self, parameters, context, feedback):
         feedback.pushInfo("Step 1: Reading input parameters...")
@@ -101,22 +179,62 @@ class DoorKnockTrackerAlgorithm(QgsProcessingAlgorithm):
         new_points_layer = self.parameterAsVectorLayer(parameters, self.INPUT_NEW_POINTS, context)
         unique_id_field = self.parameterAsString(parameters, self.INPUT_UNIQUE_ID, context)
         exception_report_path = self.parameterAsFileOutput(parameters, self.OUTPUT_EXCEPTIONS, context)
+        merge_report_path = self.parameterAsFileOutput(parameters, self.OUTPUT_MERGE_DECISIONS, context)
+
+        output_fields, updated_features, exception_rows, merge_decisions = self.mergeStatus(
+            csv_layers, original_points_layer, new_points_layer, unique_id_field, feedback,
+            rules_path=self.parameterAsFile(parameters, self.INPUT_RULES, context),
+            **self.duplicateSettings(parameters, context)
+        )
+
+        (sink, dest_id) = self.parameterAsSink(parameters, self.OUTPUT_NEXT_PRIORITY, context, output_fields, original_points_layer.wkbType(), original_points_layer.crs())
+
+        if updated_features:
+            sink.addFeatures(updated_features, QgsFeatureSink.FastInsert)
+
+        self.writeExceptionReport(exception_report_path, unique_id_field, exception_rows, feedback)
+        self.writeMergeDecisions(merge_report_path, unique_id_field, merge_decisions, feedback)
 
+        return {self.OUTPUT_NEXT_PRIORITY: dest_id}
+
+    def mergeStatus(self, csv_layers, original_points_layer, new_points_layer, unique_id_field, feedback,
+                    label_field='', duplicate_distance=DEFAULT_DUPLICATE_DISTANCE,
+                    min_similarity=DEFAULT_DUPLICATE_SIMILARITY, flag_duplicates=False,
+                    transform_context=None, rules_path=''):
+        """
+        Merges the crew returns into the master address list. Returns the
+        output fields, the updated features, the exception rows (an
+        iterator, for writeExceptionReport) and the merge decisions for new
+        addresses, held in memory so other algorithms can use them without
+        a sink. Returns are checked against the validation rules in
+        rules_path (the default rules without one); a 'Completed' return
+        breaking a rejecting rule leaves its address 'Outstanding'. With a
+        label_field, new addresses that duplicate a listed one under
+        another id are left out (or flagged in 'duplicate_of' when
+        flag_duplicates is set).
+        """
+        from .door_knock_validation import evaluate, exception_rows, read_rules, record_columns, rule_fields
+
+        try:
+            rules = read_rules(rules_path)
+        except (OSError, ValueError) as e:
+            raise QgsProcessingException(f"Could not read the validation rules: {e}")
         id_field_index = original_points_layer.fields().indexOf(unique_id_field)
         if id_field_index == -1:
             raise QgsProcessingException(f"Unique ID field '{unique_id_field}' not found in the original points layer.")
         is_numeric_id = original_points_layer.fields().at(id_field_index).isNumeric()
 
         def normalize_key(val):
-            if val is None: return None
-            if is_numeric_id:
-                try: return int(float(val))
-                except (ValueError, TypeError): return None
-            else: return str(val).strip().lower()
+            return address_key(val, is_numeric_id)
 
         feedback.pushInfo("Step 2: Processing crew CSVs to find best available status...")
-        best_status = {}
         tracking_fields = ['Inquiry Date', 'Inquirer ID', 'Inquirer Org', 'Notes', 'Outcome']
+        # Returns are read into columns so the rules check all of them at once.
+        # Only the fields the rules read are kept for every return; the
+        # tracking fields are read later for the chosen return of each address.
+        checked_fields = list(dict.fromkeys(['Outcome'] + rule_fields(rules)))
+        values = {field: [] for field in checked_fields}
+        keys, ids, sources, rows, csv_index = [], [], [], [], []
 
         for i, csv_layer in enumerate(csv_layers):
             feedback.pushInfo(f" -> Reading CSV {i+1}/{len(csv_layers)}: {csv_layer.name()}")
@@ -124,18 +242,53 @@ class DoorKnockTrackerAlgorithm(QgsProcessingAlgorithm):
             if unique_id_field not in csv_fields or 'Outcome' not in csv_fields:
                 feedback.pushWarning(f"Skipping CSV '{csv_layer.name()}' because it is missing '{unique_id_field}' or 'Outcome'.")
                 continue
+            present = [field for field in checked_fields if field in csv_fields]
+            absent = [field for field in checked_fields if field not in csv_fields]
 
-            for feature in csv_layer.getFeatures():
+            for row, feature in enumerate(csv_layer.getFeatures(), start=1):
                 unique_id = normalize_key(feature.attribute(unique_id_field))
-                if unique_id is None: continue
+                if unique_id is None:
+                    continue
+                keys.append(unique_id)
+                ids.append(feature.attribute(unique_id_field))
+                sources.append(csv_layer.name())
+                rows.append(row)
+                csv_index.append(i)
+                for field in present:
+                    values[field].append(feature.attribute(field))
+                for field in absent:
+                    values[field].append(None)
 
-                new_status = {}
-                for field in tracking_fields:
-                    new_status[field] = feature.attribute(field) if field in csv_fields else None
-                
-                stored_status = best_status.get(unique_id)
-                if not stored_status or (stored_status.get('Outcome', '').strip().lower() != 'completed'):
-                    best_status[unique_id] = new_status
+        columns = record_columns({field: values[field] for field in rule_fields(rules)}, ids, sources, rows, keys)
+        failures, rejected = evaluate(rules, columns)
+        rejected = rejected.tolist()
+        feedback.pushInfo(f" -> {sum(rejected)} of {len(keys)} returns were rejected by the validation rules.")
+
+        # A completion that passes the rules wins; otherwise the latest return.
+        best_status = {}
+        for record, unique_id in enumerate(keys):
+            stored = best_status.get(unique_id)
+            if stored is None or not (is_completed(values['Outcome'][stored]) and not rejected[stored]):
+                best_status[unique_id] = record
+
+        # A rejected completion leaves the address 'Outstanding'; any other
+        # chosen return has its tracking fields read in a second pass.
+        chosen = {
+            (csv_index[record], rows[record]): unique_id for unique_id, record in best_status.items()
+            if not (is_completed(values['Outcome'][record]) and rejected[record])
+        }
+        chosen_csvs = {source for source, _ in chosen}
+        best_values = {}
+        for i, csv_layer in enumerate(csv_layers):
+            if i not in chosen_csvs:
+                continue
+            csv_fields = csv_layer.fields().names()
+            for row, feature in enumerate(csv_layer.getFeatures(), start=1):
+                unique_id = chosen.get((i, row))
+                if unique_id is not None:
+                    best_values[unique_id] = [
+                        feature.attribute(field) if field in csv_fields else None for field in tracking_fields
+                    ]
 
         feedback.pushInfo(f"Found best available status for {len(best_status)} unique properties from CSVs.")
 
@@ -145,13 +298,50 @@ class DoorKnockTrackerAlgorithm(QgsProcessingAlgorithm):
             unique_id = normalize_key(feature.attribute(unique_id_field))
             if unique_id is not None: master_features[unique_id] = feature
         
+        merge_decisions = []
+        duplicate_of = {}
         if new_points_layer:
             feedback.pushInfo(" -> Adding new addresses from optional layer...")
+            new_features = {}
             for feature in new_points_layer.getFeatures():
                 unique_id = normalize_key(feature.attribute(unique_id_field))
-                if unique_id is not None and unique_id not in master_features:
-                    master_features[unique_id] = feature
-        
+                if unique_id is None:
+                    continue
+                if unique_id in master_features or unique_id in new_features:
+                    merge_decisions.append([feature.attribute(unique_id_field), 'same id', feature.attribute(unique_id_field)])
+                else:
+                    new_features[unique_id] = feature
+
+            if label_field and new_features:
+                if new_points_layer.fields().indexOf(label_field) == -1:
+                    feedback.pushWarning(f"The new address layer has no '{label_field}' field; duplicates are not checked.")
+                else:
+                    duplicates = self.findDuplicates(
+                        master_features, new_features, original_points_layer, new_points_layer, unique_id_field,
+                        label_field, duplicate_distance, min_similarity, transform_context
+                    )
+                    for unique_id, feature in new_features.items():
+                        if unique_id not in duplicates:
+                            continue
+                        matched_id, distance, similarity, matched_label = duplicates[unique_id]
+                        decision = 'flagged' if flag_duplicates else 'merged'
+                        merge_decisions.append([
+                            feature.attribute(unique_id_field), decision, matched_id, round(distance, 1),
+                            round(similarity, 2), feature.attribute(label_field), matched_label
+                        ])
+                        if flag_duplicates:
+                            duplicate_of[unique_id] = str(matched_id)
+                    if not flag_duplicates:
+                        new_features = {k: f for k, f in new_features.items() if k not in duplicates}
+                    feedback.pushInfo(
+                        f" -> {len(duplicates)} new addresses duplicate a listed address and were "
+                        f"{'flagged' if flag_duplicates else 'left out'}."
+                    )
+            for unique_id, feature in new_features.items():
+                if unique_id not in duplicate_of:
+                    merge_decisions.append([feature.attribute(unique_id_field), 'added'])
+                master_features[unique_id] = feature
+
         feedback.pushInfo(f"Created a master list of {len(master_features)} unique addresses.")
         
         output_fields = QgsFields()
@@ -160,12 +350,11 @@ class DoorKnockTrackerAlgorithm(QgsProcessingAlgorithm):
                 output_fields.append(QgsField(field.name(), QVariant.String))
             else:
                 output_fields.append(field)
+        if duplicate_of and output_fields.indexOf(DUPLICATE_FIELD) == -1:
+            output_fields.append(QgsField(DUPLICATE_FIELD, QVariant.String, len=100))
         
         feedback.pushInfo("Step 4: Updating features and generating exception report...")
         updated_features = []
-        exception_records = []
-        
-        (sink, dest_id) = self.parameterAsSink(parameters, self.OUTPUT_NEXT_PRIORITY, context, output_fields, original_points_layer.wkbType(), original_points_layer.crs())
 
         for unique_id, original_feature in master_features.items():
             updated_feature = QgsFeature(output_fields)
@@ -176,47 +365,90 @@ class DoorKnockTrackerAlgorithm(QgsProcessingAlgorithm):
                  if output_fields.indexOf(field.name()) != -1:
                     updated_feature.setAttribute(field.name(), original_feature.attribute(field.name()))
 
-            status_record = best_status.get(unique_id)
-
-            if status_record:
-                outcome_val = status_record.get('Outcome')
-                
-                if outcome_val and str(outcome_val).strip().lower() == 'completed':
-                    is_valid_completion = True
-                    missing_fields = []
-                    validation_fields = ['Inquiry Date', 'Inquirer ID', 'Inquirer Org']
-                    for field in validation_fields:
-                        val = status_record.get(field)
-                        if val is None or str(val).strip() == '':
-                            is_valid_completion = False
-                            missing_fields.append(field)
-                    
-                    if is_valid_completion:
-                        for field in tracking_fields:
-                            updated_feature.setAttribute(field, status_record.get(field))
-                    else:
-                        updated_feature.setAttribute('Outcome', 'Outstanding')
-                        exception_reason = f"Marked 'Completed' but missing data in: {', '.join(missing_fields)}"
-                        exception_records.append([original_feature.attribute(unique_id_field), exception_reason])
-                else:
-                    for field in tracking_fields:
-                        updated_feature.setAttribute(field, status_record.get(field))
+            if unique_id in duplicate_of:
+                updated_feature.setAttribute(DUPLICATE_FIELD, duplicate_of[unique_id])
+
+            if unique_id in best_values:
+                for field, value in zip(tracking_fields, best_values[unique_id]):
+                    updated_feature.setAttribute(field, value)
+            elif unique_id in best_status:
+                updated_feature.setAttribute('Outcome', 'Outstanding')
             
             updated_features.append(updated_feature)
         
         feedback.pushInfo(f"Processed {len(updated_features)} total addresses for the updated layer.")
 
-        if updated_features:
-            sink.addFeatures(updated_features, QgsFeatureSink.FastInsert)
+        return output_fields, updated_features, exception_rows(rules, failures, columns), merge_decisions
+
+    def findDuplicates(self, master_features, new_features, original_points_layer, new_points_layer, unique_id_field,
+                       label_field, tolerance, min_similarity, transform_context):
+        """
+        Returns {new unique id: (matched id, distance in metres, label
+        similarity, matched label)} for the new addresses that duplicate an
+        address on the master list or an earlier new address. Both layers
+        are measured in one metric working CRS.
+        """
+        from .door_knock_crs import transform_xy, working_crs
+        from .door_knock_duplicates import find_duplicates
 
-        if exception_report_path and exception_records:
-            feedback.pushInfo(f"Writing {len(exception_records)} records to exception report...")
+        def points(features):
+            return [
+                (point.x(), point.y()) for point in (feature.geometry().centroid().asPoint() for feature in features)
+            ]
+
+        if original_points_layer.fields().indexOf(label_field) == -1:
+            return {}
+        work_crs = working_crs(None, original_points_layer, transform_context)
+        originals = [f for f in master_features.values() if f.hasGeometry()]
+        news = [(k, f) for k, f in new_features.items() if f.hasGeometry()]
+        if not originals or not news:
+            return {}
+        original_xy = transform_xy(points(originals), original_points_layer.crs(), work_crs, transform_context)
+        new_xy = transform_xy(points(f for _, f in news), new_points_layer.crs(), work_crs, transform_context)
+        candidates = originals + [f for _, f in news]
+        match, distance, similarity = find_duplicates(
+            original_xy, [f.attribute(label_field) for f in originals],
+            new_xy, [f.attribute(label_field) for _, f in news], tolerance, min_similarity
+        )
+        return {
+            news[q][0]: (
+                candidates[m].attribute(unique_id_field), float(distance[q]), float(similarity[q]),
+                candidates[m].attribute(label_field)
+            )
+            for q, m in enumerate(match.tolist()) if m >= 0
+        }
+
+    def writeExceptionReport(self, exception_report_path, unique_id_field, exception_rows, feedback):
+        """
+        Streams the exception rows to the report, one row per return that
+        breaks a validation rule; no file is written when there are none.
+        """
+        if not exception_report_path:
+            return
+        exception_rows = iter(exception_rows)
+        first = next(exception_rows, None)
+        if first is None:
+            return
+        try:
+            with open(exception_report_path, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow([unique_id_field] + EXCEPTION_FIELDS)
+                writer.writerow(first)
+                count = 1
+                for row in exception_rows:
+                    writer.writerow(row)
+                    count += 1
+            feedback.pushInfo(f"Wrote {count} records to the exception report.")
+        except Exception as e:
+            feedback.pushWarning(f"Could not write exception report: {e}")
+
+    def writeMergeDecisions(self, merge_report_path, unique_id_field, merge_decisions, feedback):
+        if merge_report_path and merge_decisions:
+            feedback.pushInfo(f"Writing {len(merge_decisions)} new address merge decisions...")
             try:
-                with open(exception_report_path, 'w', newline='', encoding='utf-8') as f:
+                with open(merge_report_path, 'w', newline='', encoding='utf-8') as f:
                     writer = csv.writer(f)
-                    writer.writerow([unique_id_field, 'Reason'])
-                    writer.writerows(exception_records)
+                    writer.writerow([unique_id_field] + MERGE_DECISION_FIELDS)
+                    writer.writerows(merge_decisions)
             except Exception as e:
-                feedback.pushWarning(f"Could not write exception report: {e}")
-
-        return {self.OUTPUT_NEXT_PRIORITY: dest_id}
+                feedback.pushWarning(f"Could not write merge decisions: {e}")
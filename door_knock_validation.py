@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ * *
+ * This program is free software; you can redistribute it and/or modify  *
+ * it under the terms of the GNU General Public License as published by  *
+ * the Free Software Foundation; either version 2 of the License, or     *
+ * (at your option) any later version.                                   *
+ * *
+ ***************************************************************************/
+
+ Validation rules for crew returns. A JSON rule definition is compiled once
+ into checks on whole columns of returned records (required fields, dates
+ and date ranges, allowed values and repeated visits), so millions of
+ records are checked in a few array operations, and the records that break
+ any rule are streamed to the exception report with every rule code and
+ reason.
+
+ A definition lists rules; each has a code, a type and, optionally, a
+ "when" filter ({field: [values]}, case-insensitive) and "reject": true
+ when a 'Completed' record breaking it must not be accepted, e.g.:
+
+     {"rules": [
+       {"code": "MISSING_DATA", "type": "required", "fields": ["Inquiry Date", "Inquirer ID"],
+        "when": {"Outcome": ["Completed"]}, "reject": true},
+       {"code": "BAD_DATE", "type": "date", "field": "Inquiry Date", "min": "2026-01-01", "max": "today"},
+       {"code": "BAD_OUTCOME", "type": "allowed", "field": "Outcome", "values": ["Completed", "Outstanding"]},
+       {"code": "DUPLICATE_VISIT", "type": "duplicate", "fields": ["@id"], "when": {"Outcome": ["Completed"]}}
+     ]}
+
+ "@id" stands for the unique address ID field; duplicate rules match it on
+ the address key the Status Tracker uses ('00123' and '123' are one address
+ in a numeric ID field).
+"""
+
+__author__ = 'Darren Green'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2025 by Darren Green'
+
+import datetime
+import json
+
+import numpy as np
+
+from .door_knock_fields import COMPLETION_FIELDS, json_value
+
+ID_COLUMN = '@id'
+KEY_COLUMN = '@key'
+SOURCE_COLUMN = '@source'
+ROW_COLUMN = '@row'
+DATE_FORMATS = ['%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%d/%m/%Y']
+# The Status Tracker's check before rules could be configured.
+DEFAULT_RULES = {'rules': [
+    {'code': 'MISSING_DATA', 'type': 'required', 'fields': COMPLETION_FIELDS, 'when': {'Outcome': ['Completed']},
+     'reject': True, 'message': "Marked 'Completed' but missing data in: {fields}"},
+]}
+# Records are described and written this many at a time.
+REPORT_CHUNK = 10000
+
+
+def parse_date(text, formats=DATE_FORMATS):
+    """
+    Returns the datetime written in text (ISO 8601, or one of formats), or
+    None when it is not a date. Time zones are dropped.
+    """
+    text = text.strip()
+    try:
+        value = datetime.datetime.fromisoformat(text[:-1] + '+00:00' if text.endswith('Z') else text)
+        return value.replace(tzinfo=None)
+    except ValueError:
+        pass
+    for date_format in formats:
+        try:
+            return datetime.datetime.strptime(text, date_format)
+        except ValueError:
+            continue
+    return None
+
+
+def _date_bound(value):
+    if value is None:
+        return None
+    if value == 'today':
+        return np.datetime64(datetime.date.today() + datetime.timedelta(days=1), 's') - np.timedelta64(1, 's')
+    parsed = parse_date(str(value))
+    if parsed is None:
+        raise ValueError(f"'{value}' is not a date.")
+    return np.datetime64(parsed, 's')
+
+
+class Rule:
+    """
+    A compiled rule. check(columns) returns a boolean array marking the
+    records that break it and a detail array used by describe(columns,
+    detail, rows) to give the reason for some of those records.
+    """
+
+    def __init__(self, code, fields, reject, check, describe):
+        self.code = code
+        self.fields = fields
+        self.reject = reject
+        self.check = check
+        self.describe = describe
+
+
+def _when(conditions):
+    conditions = {field: {str(v).strip().lower() for v in values} for field, values in (conditions or {}).items()}
+
+    def applies(columns):
+        mask = np.ones(len(columns[ROW_COLUMN]), dtype=bool)
+        for field, values in conditions.items():
+            mask &= np.isin(np.char.lower(columns[field]), list(values))
+        return mask
+    return applies, list(conditions)
+
+
+def _required(spec, applies):
+    fields = list(spec['fields'])
+    message = spec.get('message', "Missing data in: {fields}")
+
+    def check(columns):
+        empty = np.stack([columns[field] == '' for field in fields])
+        return applies(columns) & empty.any(axis=0), empty
+
+    def describe(columns, empty, rows):
+        return [message.format(fields=', '.join(f for f, e in zip(fields, empty[:, row]) if e)) for row in rows]
+    return check, describe, fields
+
+
+def _date(spec, applies):
+    field = spec['field']
+    formats = spec.get('formats', DATE_FORMATS)
+    low, high = _date_bound(spec.get('min')), _date_bound(spec.get('max'))
+
+    def check(columns):
+        # Returns repeat the same few dates, so each distinct text is
+        # parsed once and the result spread back over the column.
+        texts, inverse = np.unique(columns[field], return_inverse=True)
+        parsed = [parse_date(text, formats) if text else None for text in texts.tolist()]
+        values = np.array(
+            [np.datetime64(p, 's') if p is not None else np.datetime64('NaT') for p in parsed], dtype='datetime64[s]'
+        )[inverse.reshape(-1)]
+        bad = np.isnat(values) & (columns[field] != '')
+        if low is not None:
+            bad |= values < low
+        if high is not None:
+            bad |= values > high
+        return applies(columns) & bad, values
+
+    def describe(columns, values, rows):
+        return [
+            f"'{field}' is not a date: {columns[field][row]}" if np.isnat(values[row])
+            else f"'{field}' {columns[field][row]} is outside {spec.get('min', '...')} to {spec.get('max', '...')}"
+            for row in rows
+        ]
+    return check, describe, [field]
+
+
+def _allowed(spec, applies):
+    field = spec['field']
+    values = [str(v).strip().lower() for v in spec['values']]
+    allow_empty = spec.get('allow_empty', True)
+
+    def check(columns):
+        text = np.char.lower(columns[field])
+        bad = ~np.isin(text, values)
+        if allow_empty:
+            bad &= text != ''
+        return applies(columns) & bad, None
+
+    def describe(columns, _, rows):
+        return [f"'{field}' value '{columns[field][row]}' is not allowed" for row in rows]
+    return check, describe, [field]
+
+
+def _duplicate(spec, applies):
+    fields = list(spec.get('fields', [ID_COLUMN]))
+
+    def check(columns):
+        applied = applies(columns)
+        if ID_COLUMN in fields:
+            applied &= columns[KEY_COLUMN] != ''
+        rows = np.flatnonzero(applied)
+        keyed = [columns[KEY_COLUMN if field == ID_COLUMN else field][rows] for field in fields]
+        key = keyed[0]
+        for column in keyed[1:]:
+            key = np.char.add(np.char.add(key, '\x1f'), column)
+        _, first, inverse = np.unique(key, return_index=True, return_inverse=True)
+        first_row = np.full(len(columns[ROW_COLUMN]), -1, dtype=np.int64)
+        first_row[rows] = rows[first][inverse.reshape(-1)]
+        return (first_row >= 0) & (first_row != np.arange(len(first_row))), first_row
+
+    def describe(columns, first_row, rows):
+        return [
+            f"Already reported in {columns[SOURCE_COLUMN][first_row[row]]} row {columns[ROW_COLUMN][first_row[row]]}"
+            for row in rows
+        ]
+    return check, describe, fields
+
+
+RULE_TYPES = {'required': _required, 'date': _date, 'allowed': _allowed, 'duplicate': _duplicate}
+
+
+def compile_rules(definition):
+    """
+    Compiles a rule definition (a dict, as read from JSON) into Rules.
+    Raises ValueError describing the first rule that cannot be used.
+    """
+    rules = []
+    for number, spec in enumerate(definition.get('rules', []), start=1):
+        code = spec.get('code') or f"RULE_{number}"
+        if spec.get('type') not in RULE_TYPES:
+            raise ValueError(f"Rule {code} has type '{spec.get('type')}'; use one of {', '.join(RULE_TYPES)}.")
+        try:
+            applies, when_fields = _when(spec.get('when'))
+            check, describe, fields = RULE_TYPES[spec['type']](spec, applies)
+        except KeyError as e:
+            raise ValueError(f"Rule {code} needs {e}.")
+        rules.append(Rule(code, list(dict.fromkeys(fields + when_fields)), bool(spec.get('reject')), check, describe))
+    return rules
+
+
+def read_rules(path):
+    """
+    Reads and compiles a JSON rule file; the default rules without one.
+    """
+    if not path:
+        return compile_rules(DEFAULT_RULES)
+    with open(path, encoding='utf-8') as f:
+        try:
+            definition = json.load(f)
+        except ValueError as e:
+            raise ValueError(f"The validation rules file is not valid JSON: {e}")
+    return compile_rules(definition)
+
+
+def rule_fields(rules):
+    """
+    Returns the record fields the rules read, besides the reserved columns.
+    """
+    return [f for f in dict.fromkeys(f for rule in rules for f in rule.fields) if not f.startswith('@')]
+
+
+def record_columns(values, ids, sources, rows, keys=None):
+    """
+    Returns the columns the rules work on: values maps each field the rules
+    read (rule_fields) to its attribute values, ids, sources and rows
+    describe each record and keys, when given, are the address keys
+    repeats are matched on (the ids otherwise). Values become stripped
+    fixed-width text once here, with NULL as '', so pass only the fields
+    the rules read: one long free-text note would widen every row.
+    """
+    def text(column):
+        column = [json_value(v) for v in column]
+        return np.char.strip(np.array(['' if v is None else str(v) for v in column], dtype=str).reshape(-1))
+
+    columns = {field: text(column) for field, column in values.items()}
+    columns[ID_COLUMN] = text(ids)
+    columns[KEY_COLUMN] = columns[ID_COLUMN] if keys is None else text(keys)
+    columns[SOURCE_COLUMN] = np.array(sources, dtype=object).reshape(-1)
+    columns[ROW_COLUMN] = np.asarray(rows, dtype=np.int64).reshape(-1)
+    return columns
+
+
+def evaluate(rules, columns):
+    """
+    Runs every rule over the columns. Returns the (mask, detail) pair of
+    each rule and the mask of records whose completion is rejected.
+    """
+    failures = [rule.check(columns) for rule in rules]
+    rejected = np.zeros(len(columns[ROW_COLUMN]), dtype=bool)
+    for rule, (mask, _) in zip(rules, failures):
+        if rule.reject:
+            rejected |= mask
+    return failures, rejected
+
+
+def exception_rows(rules, failures, columns):
+    """
+    Yields one report row per record that breaks any rule: its id, the
+    rule codes, the reasons, its source and row. Reasons are worked out
+    REPORT_CHUNK records at a time, so the report can be streamed.
+    """
+    failing = np.zeros(len(columns[ROW_COLUMN]), dtype=bool)
+    for mask, _ in failures:
+        failing |= mask
+    records = np.flatnonzero(failing)
+    for start in range(0, len(records), REPORT_CHUNK):
+        part = records[start:start + REPORT_CHUNK]
+        codes = [[] for _ in part]
+        reasons = [[] for _ in part]
+        for rule, (mask, detail) in zip(rules, failures):
+            hits = np.flatnonzero(mask[part])
+            for hit, reason in zip(hits.tolist(), rule.describe(columns, detail, part[hits].tolist())):
+                codes[hit].append(rule.code)
+                reasons[hit].append(reason)
+        for j, record in enumerate(part.tolist()):
+            yield [
+                columns[ID_COLUMN][record], ';'.join(codes[j]), '; '.join(reasons[j]),
+                columns[SOURCE_COLUMN][record], int(columns[ROW_COLUMN][record])
+            ]
@@ -0,0 +1,146 @@
+# coding=utf-8
+"""Tests for the preprocessed address store.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'Darren Green'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2025 by Darren Green'
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from ..door_knock_address_store import UNSORTED_FILE, AddressStore, build_store, is_store, write_store
+
+
+class Point:
+    """Stands in for the QGIS point, geometry and feature."""
+
+    def __init__(self, fid, xy, attributes):
+        self.fid, self.xy, self._attributes = fid, xy, attributes
+
+    def x(self):
+        return self.xy[0]
+
+    def y(self):
+        return self.xy[1]
+
+    def id(self):
+        return self.fid
+
+    def hasGeometry(self):
+        return self.xy is not None
+
+    def geometry(self):
+        return self
+
+    def centroid(self):
+        return self
+
+    def asPoint(self):
+        return self
+
+    def attributes(self):
+        return self._attributes
+
+
+class Layer:
+    """Stands in for a point layer without fields."""
+
+    def __init__(self, features):
+        self.features = features
+
+    def featureCount(self):
+        return len(self.features)
+
+    def getFeatures(self):
+        return iter(self.features)
+
+    def fields(self):
+        return []
+
+    def crs(self):
+        return self
+
+    def toWkt(self):
+        return ''
+
+
+class AddressStoreTest(unittest.TestCase):
+    """Test writing a store and reading it back by grid cell."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.folder = tempfile.mkdtemp()
+        rng = np.random.default_rng(3)
+        self.xy = rng.uniform(0, 1000, (500, 2))
+        self.fids = np.arange(500) + 100
+        rows = [[int(fid), f"{fid} Main St"] for fid in self.fids]
+        write_store(self.folder, self.fids, self.xy, rows, [('id', 'int'), ('address', 'text')], '', cell_size=100.0)
+        self.store = AddressStore(self.folder)
+
+    def tearDown(self):
+        """Runs after each test."""
+        shutil.rmtree(self.folder)
+
+    def test_round_trip(self):
+        """Every address is stored once with its coordinates and attributes."""
+        self.assertTrue(is_store(self.folder))
+        self.assertEqual(len(self.store), 500)
+        self.assertEqual(sorted(self.store.fid.tolist()), self.fids.tolist())
+        rows = [0, 250, 499]
+        for row, values in self.store.attributes(rows).items():
+            source = int(self.store.fid[row]) - 100
+            self.assertEqual(values, [int(self.store.fid[row]), f"{self.store.fid[row]} Main St"])
+            self.assertEqual([self.store.x[row], self.store.y[row]], self.xy[source].tolist())
+
+    def test_rows_in_rect(self):
+        """A rectangle query returns every address of the cells it overlaps and no others."""
+        rows = self.store.rows_in_rect((250, 250, 420, 610))
+        x, y = self.store.x[rows], self.store.y[rows]
+        self.assertTrue(np.all((x >= 200) & (x < 500) & (y >= 200) & (y < 700)))
+        expected = np.sum((self.xy[:, 0] >= 200) & (self.xy[:, 0] < 500) & (self.xy[:, 1] >= 200) & (self.xy[:, 1] < 700))
+        self.assertEqual(len(rows), expected)
+        self.assertEqual(len(self.store.rows_in_rect((2000, 2000, 3000, 3000))), 0)
+
+    def test_rows_in_cells(self):
+        """Reading cells one by one matches the rectangle query."""
+        x0, x1, y0, y1 = self.store.cell_range((250, 250, 420, 610))
+        cells = [cy * self.store.shape[0] + cx for cy in range(y0, y1 + 1) for cx in range(x0, x1 + 1)]
+        self.assertEqual(sorted(self.store.rows_in_cells(cells).tolist()),
+                         sorted(self.store.rows_in_rect((250, 250, 420, 610)).tolist()))
+
+    def test_require_field(self):
+        """Field names given for a store are checked against its schema."""
+        self.store.require_field('address')
+        self.store.require_field('id', numeric=True)
+        with self.assertRaisesRegex(ValueError, "no field 'ADDRESS_ID'"):
+            self.store.require_field('ADDRESS_ID')
+        with self.assertRaisesRegex(ValueError, 'not a number'):
+            self.store.require_field('address', numeric=True)
+
+    def test_build_store(self):
+        """Points are read from a layer, their rows streamed and put in cell order."""
+        folder = os.path.join(self.folder, 'built')
+        features = [Point(fid, self.xy[fid].tolist(), [fid, f"{fid} Main St"]) for fid in range(200)]
+        features.append(Point(999, None, [999, 'No geometry']))
+        self.assertEqual(build_store(Layer(features), folder), 200)
+        self.assertFalse(os.path.exists(os.path.join(folder, UNSORTED_FILE)))
+        store = AddressStore(folder)
+        rows = list(range(len(store)))
+        for row, values in store.attributes(rows).items():
+            self.assertEqual(values, [int(store.fid[row]), f"{store.fid[row]} Main St"])
+            self.assertEqual([store.x[row], store.y[row]], self.xy[int(store.fid[row])].tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+# coding=utf-8
+"""Tests for the columnar address table.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'Darren Green'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2025 by Darren Green'
+
+import math
+import unittest
+
+import numpy as np
+
+from ..door_knock_addresses import AddressTable
+
+
+class AddressTableTest(unittest.TestCase):
+    """Test the address columns and the lazy attribute store."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.requests = []
+
+        def read(fids):
+            self.requests.append(list(fids))
+            return {fid: [fid, f"address {fid}"] for fid in fids}
+
+        self.table = AddressTable([10, 11, 12], [[0, 0], [5, 0], [9, 1]], attribute_source=read)
+
+    def test_columns(self):
+        """Stage columns start unset and coordinates are kept as arrays."""
+        self.assertEqual(len(self.table), 3)
+        self.assertEqual(self.table.xy.tolist(), [[0, 0], [5, 0], [9, 1]])
+        self.assertEqual(self.table.source_xy.tolist(), self.table.xy.tolist())
+        self.assertEqual(self.table.cluster.tolist(), [-1, -1, -1])
+        self.assertTrue(all(math.isnan(c) for c in self.table.cost))
+        self.assertTrue(np.isnan(self.table.hazard).all())
+
+    def test_attributes_read_once(self):
+        """Attributes are fetched on first use, in one request, and reused."""
+        self.assertEqual(self.requests, [])
+        self.assertEqual(self.table.attributes(np.array([2, 0])), [[12, 'address 12'], [10, 'address 10']])
+        self.assertEqual(self.table.attributes([0, 1]), [[10, 'address 10'], [11, 'address 11']])
+        self.assertEqual(self.requests, [[12, 10], [11]])
+
+    def test_column(self):
+        """A column is read as numbers, with NaN where it is not one."""
+        values = self.table.column(0)
+        self.assertEqual(values.tolist(), [10.0, 11.0, 12.0])
+        self.assertTrue(np.isnan(self.table.column(1)).all())
+        self.assertEqual(len(self.requests), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
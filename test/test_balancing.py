@@ -0,0 +1,54 @@
+# coding=utf-8
+"""Tests for balancing crew workloads.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'Darren Green'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2025 by Darren Green'
+
+import unittest
+
+import numpy as np
+
+from ..door_knock_balancing import insertion_deltas, rebalance, removal_deltas
+
+
+class BalancingTest(unittest.TestCase):
+    """Test tour deltas and border rebalancing."""
+
+    def test_deltas(self):
+        """Insertion and removal deltas match the change in path length."""
+        path = np.array([[0, 0], [10, 0], [20, 0]], dtype=float)
+        added, after = insertion_deltas(path, np.array([[15.0, 5.0], [30.0, 0.0]]))
+        self.assertAlmostEqual(added[0], 2 * np.hypot(5, 5) - 10)
+        self.assertEqual(list(after), [1, 2])
+        self.assertEqual(added[1], 10.0)
+        self.assertEqual(list(removal_deltas(path, np.array([1, 2]))), [0.0, 10.0])
+
+    def test_rebalance_shortens_longest_day(self):
+        """Stops move from an overloaded crew to its neighbour."""
+        xy = np.array([(x, 0.0) for x in range(0, 100, 10)])
+        labels = np.array([0] * 8 + [1] * 2)
+        minutes = np.full(len(xy), 10.0)
+        starts = np.zeros((2, 2))
+        before = rebalance(xy, minutes, labels, starts, [0, 0], 10.0, max_moves=0)[1]
+        new_labels, after = rebalance(xy, minutes, labels, starts, [0, 0], 10.0)
+        self.assertLess(after.max(), before.max())
+        self.assertGreater((new_labels == 1).sum(), 2)
+
+    def test_rebalance_keeps_groups_apart(self):
+        """Crews of different depots never swap stops."""
+        xy = np.array([(x, 0.0) for x in range(0, 100, 10)])
+        labels = np.array([0] * 8 + [1] * 2)
+        new_labels, _ = rebalance(xy, np.ones(len(xy)), labels, np.zeros((2, 2)), [0, 1], 10.0)
+        self.assertEqual(list(new_labels), list(labels))
+
+
+if __name__ == '__main__':
+    unittest.main()
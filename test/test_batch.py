@@ -0,0 +1,50 @@
+# coding=utf-8
+"""Tests for reading batch planning scenario files.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'Darren Green'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2025 by Darren Green'
+
+import json
+import os
+import tempfile
+import unittest
+
+from ..door_knock_batch import read_scenarios
+
+
+class BatchScenarioTest(unittest.TestCase):
+    """Test scenario file parsing."""
+
+    def write(self, data):
+        handle, path = tempfile.mkstemp(suffix='.json')
+        with os.fdopen(handle, 'w') as f:
+            json.dump(data, f)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_defaults_are_applied(self):
+        """Scenario values override the shared defaults."""
+        path = self.write({
+            'defaults': {'INPUT_ROADS': 'roads.gpkg', 'INPUT_NUM_CREWS': 2},
+            'scenarios': [{'name': 'Four', 'INPUT_NUM_CREWS': 4}, {}],
+        })
+        scenarios = read_scenarios(path)
+        self.assertEqual(scenarios[0], ('Four', {'INPUT_ROADS': 'roads.gpkg', 'INPUT_NUM_CREWS': 4}))
+        self.assertEqual(scenarios[1], ('Scenario 2', {'INPUT_ROADS': 'roads.gpkg', 'INPUT_NUM_CREWS': 2}))
+
+    def test_plain_list(self):
+        """A bare list of parameter sets is accepted."""
+        path = self.write([{'INPUT_NUM_CREWS': 3}])
+        self.assertEqual(read_scenarios(path), [('Scenario 1', {'INPUT_NUM_CREWS': 3})])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+# coding=utf-8
+"""Tests for grouping stops into street blocks.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'Darren Green'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2025 by Darren Green'
+
+import math
+import unittest
+
+import numpy as np
+
+from ..door_knock_blocks import block_representatives, street_blocks, walk_blocks
+from ..door_knock_network import RoadNetwork
+
+
+class StreetBlocksTest(unittest.TestCase):
+    """Test street segments, blocks by side and walking blocks in order."""
+
+    def setUp(self):
+        """Runs before each test."""
+        # A street through two vertices that join nothing else, ending at a junction.
+        self.network = RoadNetwork.from_polylines([
+            [(0, 0), (100, 0), (200, 0), (300, 0)],
+            [(300, 0), (300, 100)],
+            [(300, 0), (400, 0)],
+        ])
+        self.stop_xy = np.array([[50, 5], [150, 5], [250, -5], [120, -5], [300, 50]], dtype=float)
+        _, _, self.edges, self.offsets = self.network.snap(self.stop_xy)
+
+    def test_street_segments(self):
+        """Edges joined at nodes of degree two form one street segment."""
+        street, start, _ = self.network.street_segments()
+        self.assertEqual(len(set(street.tolist())), 3)
+        first = street[self.edges[0]]
+        self.assertTrue(all(street[self.edges[k]] == first for k in range(4)))
+        self.assertNotEqual(street[self.edges[4]], first)
+        self.assertEqual(sorted(start[street == first].tolist()), [0.0, 100.0, 200.0])
+
+    def test_blocks_by_side(self):
+        """Stops on one side of a street share a block and are positioned along it."""
+        block, position = street_blocks(self.network, self.stop_xy, self.edges, self.offsets, max_length=1000)
+        self.assertEqual(block[0], block[1])
+        self.assertEqual(block[2], block[3])
+        self.assertNotEqual(block[0], block[2])
+        self.assertEqual(len(set(block.tolist())), 3)
+        self.assertAlmostEqual(abs(position[1] - position[0]), 100.0)
+        self.assertAlmostEqual(abs(position[2] - position[3]), 130.0)
+
+    def test_long_streets_are_cut(self):
+        """Stops further apart along a street than the block length are split."""
+        block, _ = street_blocks(self.network, self.stop_xy, self.edges, self.offsets, max_length=60)
+        self.assertNotEqual(block[0], block[1])
+
+    def test_walk_blocks(self):
+        """Blocks are walked from the nearer end and costs rise along the route."""
+        block, position = street_blocks(self.network, self.stop_xy, self.edges, self.offsets, max_length=1000)
+        order, bounds, middle = block_representatives(block, position)
+        self.assertEqual(len(middle), 3)
+        blocks = [block[0], block[2]]
+        stops, costs = walk_blocks(blocks, [40.0, 300.0], order, bounds, self.stop_xy, position, (0, 0))
+        self.assertEqual(stops.tolist(), [0, 1, 3, 2])
+        self.assertEqual(costs.tolist(), [40.0, 140.0, 400.0, 530.0])
+
+        stops, costs = walk_blocks(blocks, [40.0, math.inf], order, bounds, self.stop_xy, position, (0, 0))
+        self.assertTrue(np.all(np.isinf(costs[2:])))
+
+
+if __name__ == '__main__':
+    unittest.main()
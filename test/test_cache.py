@@ -0,0 +1,95 @@
+# coding=utf-8
+"""Tests for the session cache keys.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'Darren Green'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2025 by Darren Green'
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from .. import door_knock_cache as cache
+
+
+class Signal:
+    """The connect and emit parts of a Qt signal."""
+
+    def __init__(self):
+        self.slots = []
+
+    def connect(self, slot):
+        self.slots.append(slot)
+
+    def emit(self):
+        for slot in self.slots:
+            slot()
+
+
+class Extent:
+    def xMinimum(self): return 0.0
+    def yMinimum(self): return 0.0
+    def xMaximum(self): return 1.0
+    def yMaximum(self): return 1.0
+
+
+class Crs:
+    def authid(self): return 'EPSG:28356'
+
+
+class Layer:
+    """The parts of a vector layer layer_key reads."""
+
+    def __init__(self, layer_id, provider_type, source):
+        self._id, self._provider_type, self._source = layer_id, provider_type, source
+        self.dataChanged = Signal()
+        self.provider = type('Provider', (), {'dataChanged': Signal()})()
+
+    def id(self): return self._id
+    def providerType(self): return self._provider_type
+    def source(self): return self._source
+    def subsetString(self): return ''
+    def crs(self): return Crs()
+    def featureCount(self): return 10
+    def extent(self): return Extent()
+    def isModified(self): return False
+    def dataProvider(self): return self.provider
+
+
+class CacheTest(unittest.TestCase):
+    """Test that layers changed in place get new keys."""
+
+    def test_edited_memory_layer(self):
+        """Edits with the same count and extent still change the key."""
+        layer = Layer('roads_memory_1', 'memory', 'Point?crs=EPSG:28356')
+        key = cache.layer_key(layer)
+        self.assertEqual(cache.layer_key(layer), key)
+        layer.dataChanged.emit()
+        self.assertNotEqual(cache.layer_key(layer), key)
+        key = cache.layer_key(layer)
+        layer.provider.dataChanged.emit()
+        self.assertNotEqual(cache.layer_key(layer), key)
+
+    def test_rewritten_file(self):
+        """Writing to a layer's file changes the key."""
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder)
+        path = os.path.join(folder, 'roads.gpkg')
+        with open(path, 'w') as f:
+            f.write('1')
+        layer = Layer('roads_file_1', 'ogr', f'{path}|layername=roads')
+        key = cache.layer_key(layer)
+        os.utime(path, (0, os.path.getmtime(path) + 10))
+        self.assertNotEqual(cache.layer_key(layer), key)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+# coding=utf-8
+"""Tests for the clustering helpers used to divide addresses among crews.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'Darren Green'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2025 by Darren Green'
+
+import unittest
+
+import numpy as np
+
+from ..door_knock_clustering import group_colocated, kmeans
+
+
+class ClusteringTest(unittest.TestCase):
+    """Test K-Means and co-located address grouping."""
+
+    def test_kmeans_separates_groups(self):
+        """Two well separated groups end up in different clusters."""
+        rng = np.random.default_rng(0)
+        xy = np.vstack([rng.random((50, 2)), rng.random((50, 2)) + 100])
+        labels = kmeans(xy, 2)
+        self.assertEqual(len(set(labels[:50])), 1)
+        self.assertEqual(len(set(labels[50:])), 1)
+        self.assertNotEqual(labels[0], labels[50])
+
+    def test_group_colocated(self):
+        """Points within the tolerance (directly or via a chain) share a stop."""
+        xy = np.array([[0, 0], [0, 0], [0.5, 0], [3, 0], [3.9, 0], [10, 10], [10.99, 10], [20, 20]], dtype=float)
+        self.assertEqual(list(group_colocated(xy, 1.0)), [0, 0, 0, 1, 1, 2, 2, 3])
+
+    def test_group_colocated_disabled(self):
+        """A zero tolerance keeps every address as its own stop."""
+        xy = np.zeros((3, 2))
+        self.assertEqual(list(group_colocated(xy, 0)), [0, 1, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+# coding=utf-8
+"""Tests for choosing the working CRS.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'Darren Green'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2025 by Darren Green'
+
+import unittest
+
+from ..door_knock_crs import zone_authid
+
+
+class WorkingCrsTest(unittest.TestCase):
+    """Test the zone picked for the working CRS."""
+
+    def test_mga_zones(self):
+        """GDA data in Australia is planned in its MGA zone."""
+        self.assertEqual(zone_authid(151.2, -33.8, 'EPSG:7844'), 'EPSG:7856')
+        self.assertEqual(zone_authid(115.9, -31.9, 'EPSG:4283'), 'EPSG:28350')
+
+    def test_utm_zones(self):
+        """Other data is planned in the WGS 84 UTM zone."""
+        self.assertEqual(zone_authid(151.2, -33.8, 'EPSG:4326'), 'EPSG:32756')
+        self.assertEqual(zone_authid(-0.1, 51.5, 'EPSG:4326'), 'EPSG:32630')
+        self.assertEqual(zone_authid(174.8, -41.3, 'EPSG:7844'), 'EPSG:32760')
+
+    def test_zone_edges(self):
+        """Longitudes at the date line stay within zones 1 to 60."""
+        self.assertEqual(zone_authid(-180.0, 10.0), 'EPSG:32601')
+        self.assertEqual(zone_authid(180.0, 10.0), 'EPSG:32660')
+
+
+if __name__ == '__main__':
+    unittest.main()
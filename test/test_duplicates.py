@@ -0,0 +1,73 @@
+# coding=utf-8
+"""Tests for finding new addresses that are already on the master list.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'Darren Green'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2025 by Darren Green'
+
+import unittest
+
+import numpy as np
+
+from ..door_knock_duplicates import find_duplicates, label_similarity, normalise_label, pairs_within
+
+
+class DuplicatesTest(unittest.TestCase):
+    """Test the grid hash and the label matching."""
+
+    def test_normalise_label(self):
+        """Unit words, punctuation and street type spellings do not matter."""
+        self.assertEqual(normalise_label('Unit 3, 12 Smith Street'), '3 12 smith st')
+        self.assertEqual(normalise_label('3/12 SMITH ST'), '3 12 smith st')
+        self.assertEqual(normalise_label(None), '')
+
+    def test_label_similarity(self):
+        """Different house numbers and empty labels never match."""
+        self.assertEqual(label_similarity('12 smith st', '12 smith st'), 1.0)
+        self.assertGreater(label_similarity('12 smyth st', '12 smith st'), 0.8)
+        self.assertEqual(label_similarity('14 smith st', '12 smith st'), 0.0)
+        self.assertEqual(label_similarity('', ''), 0.0)
+
+    def test_pairs_within(self):
+        """The grid hash finds exactly the pairs a full comparison finds."""
+        rng = np.random.default_rng(4)
+        reference = rng.uniform(0, 500, (800, 2))
+        query = rng.uniform(0, 500, (300, 2))
+        q, r, d = pairs_within(reference, query, 12.0)
+        gaps = np.hypot(*(query[:, None, :] - reference[None, :, :]).transpose(2, 0, 1))
+        expected = set(zip(*np.nonzero(gaps <= 12.0)))
+        self.assertEqual(set(zip(q.tolist(), r.tolist())), {(int(a), int(b)) for a, b in expected})
+        np.testing.assert_allclose(d, gaps[q, r])
+        self.assertEqual(len(pairs_within(reference, query, 0)[0]), 0)
+
+    def test_many_points(self):
+        """100 000 new points against 100 000 listed ones are matched in one pass."""
+        rng = np.random.default_rng(5)
+        reference = rng.uniform(0, 50000, (100000, 2))
+        query = reference[:100000:2] + rng.uniform(-3, 3, (50000, 2))
+        q, r, _ = pairs_within(reference, query, 5.0)
+        self.assertTrue(np.all(np.isin(np.arange(50000), q[r == 2 * q])))
+
+    def test_find_duplicates(self):
+        """The same house under another id matches; the house next door does not."""
+        original_xy = [[0, 0], [15, 0]]
+        original_labels = ['12 Smith Street', '14 Smith Street']
+        new_xy = [[2, 1], [14, 2], [200, 0], [201, 0], [40, 0]]
+        new_labels = ['12 Smith St', '16 Smith St', '5 Jones Rd', '5 Jones Road', '14 Smith St']
+        match, distance, similarity = find_duplicates(original_xy, original_labels, new_xy, new_labels, 30.0, 0.8)
+        # 16 Smith St is new; the second 5 Jones Rd duplicates the first new one.
+        self.assertEqual(match.tolist(), [0, -1, -1, 2 + 2, 1])
+        self.assertAlmostEqual(distance[0], np.hypot(2, 1))
+        self.assertEqual(similarity[0], 1.0)
+        self.assertTrue(np.isnan(distance[1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+# coding=utf-8
+"""Tests for the change tracking of per-crew field packages.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'Darren Green'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2025 by Darren Green'
+
+import unittest
+
+from ..door_knock_field_packages import feature_signature, package_changes, removed_id, row_key, row_signature
+
+POINT = 'Point (151.2093123 -33.8688456)'
+
+
+class Stop:
+    """Stands in for a visit point feature and its geometry."""
+
+    def __init__(self, attributes, x):
+        self.attributes, self.x = attributes, x
+
+    def attribute(self, name):
+        return self.attributes[name]
+
+    def fields(self):
+        return self
+
+    def names(self):
+        return list(self.attributes)
+
+    def geometry(self):
+        return self
+
+    def isEmpty(self):
+        return False
+
+    def asWkt(self, precision):
+        return f"Point ({self.x:.{precision}f} 0)"
+
+
+class FieldPackagesTest(unittest.TestCase):
+    """Test the row signatures and the delta between two plans."""
+
+    def test_row_signature(self):
+        """Only the id, the crew and the geometry sign a row."""
+        signature = row_signature('12', [1], POINT)
+        self.assertEqual(signature, row_signature('12', [1], POINT))
+        self.assertNotEqual(signature, row_signature('12', [2], POINT))
+        self.assertNotEqual(signature, row_signature('12', [1], 'Point (151.2093124 -33.8688456)'))
+
+    def test_row_key(self):
+        """NULL and empty ids are not tracked."""
+        self.assertEqual(row_key(' 12 '), '12')
+        self.assertEqual(row_key(12), '12')
+        self.assertIsNone(row_key(None))
+        self.assertIsNone(row_key(''))
+        self.assertIsNone(row_key('NULL'))
+
+    def test_package_changes(self):
+        """A re-plan lists the added, updated and removed rows only."""
+        previous = {'1': 'a', '2': 'b', '3': 'c'}
+        current = {'4': 'd', '2': 'b', '1': 'x'}
+        self.assertEqual(package_changes(previous, current), (['4'], ['1'], ['3']))
+        self.assertEqual(package_changes(current, current), ([], [], []))
+
+    def test_removed_id(self):
+        """Removed rows keep their id; keys that are not numbers do not raise."""
+        self.assertEqual(removed_id('12', True), 12)
+        self.assertEqual(removed_id('12.0', True), 12)
+        self.assertIsNone(removed_id('NULL', True))
+        self.assertIsNone(removed_id('A-12', True))
+        self.assertEqual(removed_id('A-12', False), 'A-12')
+
+    def test_first_stop_removed(self):
+        """Dropping a crew's first stop only removes that row, although every later visit_order moves."""
+        def signatures(ids):
+            return {
+                str(i): feature_signature(Stop({'id': i, 'crew_id': 1, 'visit_order': n + 1}, 10.0 * i), 'id', 2)
+                for n, i in enumerate(ids)
+            }
+        self.assertEqual(package_changes(signatures([1, 2, 3, 4]), signatures([2, 3, 4])), ([], [], ['1']))
+
+
+if __name__ == '__main__':
+    unittest.main()
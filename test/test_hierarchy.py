@@ -0,0 +1,60 @@
+# coding=utf-8
+"""Tests for the contraction hierarchy.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'Darren Green'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2025 by Darren Green'
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from ..door_knock_hierarchy import ContractionHierarchy, load_or_build
+from ..door_knock_network import RoadNetwork
+
+
+class ContractionHierarchyTest(unittest.TestCase):
+    """Test hierarchy distances and persistence."""
+
+    def setUp(self):
+        """Runs before each test."""
+        # An 8 x 8 street grid with random block lengths and a detached road.
+        rng = np.random.default_rng(2)
+        lines = [[(x, y) for x in range(8)] for y in range(8)] + [[(x, y) for y in range(8)] for x in range(8)]
+        grid = RoadNetwork.from_polylines(lines + [[(20, 20), (21, 20)]])
+        self.network = RoadNetwork(grid.node_xy, grid.edge_from, grid.edge_to,
+                                   grid.edge_length * (1 + rng.random(grid.edge_count)))
+
+    def test_many_to_many_matches_dijkstra(self):
+        """Bucket queries give the same distances as plain searches."""
+        hierarchy = ContractionHierarchy.build(self.network)
+        nodes = np.arange(self.network.node_count)
+        expected = np.vstack([self.network.shortest_costs([n]) for n in nodes])
+        table = hierarchy.many_to_many(nodes, nodes)
+        self.assertTrue(np.array_equal(np.isinf(table), np.isinf(expected)))
+        finite = np.isfinite(expected)
+        self.assertTrue(np.allclose(table[finite], expected[finite]))
+
+    def test_saved_hierarchy_is_reused(self):
+        """A saved hierarchy is loaded for the same graph and rejected for another."""
+        with tempfile.TemporaryDirectory() as folder:
+            built = load_or_build(self.network, folder)
+            self.assertEqual(len(os.listdir(folder)), 1)
+            loaded = load_or_build(self.network, folder)
+            self.assertTrue(np.array_equal(built.indices, loaded.indices))
+            path = os.path.join(folder, os.listdir(folder)[0])
+            other = self.network.with_edge_lengths(self.network.edge_length * 2)
+            self.assertIsNone(ContractionHierarchy.load(path, other))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+# coding=utf-8
+"""Tests for the road network graph used by the planner.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'Darren Green'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2025 by Darren Green'
+
+import math
+import unittest
+
+import numpy as np
+
+from ..door_knock_network import RoadNetwork, network_from_layer
+
+
+class RoadNetworkTest(unittest.TestCase):
+    """Test graph building, shortest paths and snapping."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.network = RoadNetwork.from_polylines([
+            [(0, 0), (10, 0), (20, 0)],
+            [(10, 0), (10, 10)],
+            [(50, 50), (60, 50)],
+        ])
+
+    def test_shared_vertices_become_one_node(self):
+        """Lines meeting at a vertex are connected through one node."""
+        self.assertEqual(self.network.node_count, 6)
+        self.assertEqual(self.network.edge_count, 4)
+
+    def test_shortest_costs(self):
+        """Dijkstra returns network distances and inf when unreachable."""
+        start = self.network.nearest_nodes(np.array([[0.0, 0.0]]))[0][0]
+        costs = self.network.shortest_costs([start])
+        nodes, _ = self.network.nearest_nodes(np.array([[20.0, 0.0], [10.0, 10.0], [60.0, 50.0]]))
+        self.assertEqual(list(costs[nodes[:2]]), [20.0, 20.0])
+        self.assertTrue(math.isinf(costs[nodes[2]]))
+
+    def test_multi_source_origin(self):
+        """A multi-source search labels every node with its nearest source."""
+        nodes, _ = self.network.nearest_nodes(np.array([[0.0, 0.0], [20.0, 0.0], [10.0, 10.0]]))
+        costs, origin = self.network.shortest_costs(nodes[:2], return_origin=True)
+        self.assertEqual(origin[nodes[2]], 0)
+        self.assertEqual(costs[nodes[2]], 20.0)
+        self.assertEqual(list(origin[nodes[:2]]), [0, 1])
+        self.assertEqual(origin[self.network.nearest_nodes(np.array([[55.0, 50.0]]))[0][0]], -1)
+
+    def test_with_edge_lengths(self):
+        """New edge lengths reroute searches without changing the original graph."""
+        nodes, _ = self.network.nearest_nodes(np.array([[0.0, 0.0], [20.0, 0.0]]))
+        self.network.shortest_costs([nodes[0]])
+        edge_length = self.network.edge_length.copy()
+        edge_length[0] = math.inf
+        closed = self.network.with_edge_lengths(edge_length)
+        self.assertTrue(math.isinf(closed.shortest_costs([nodes[0]])[nodes[1]]))
+        self.assertEqual(self.network.shortest_costs([nodes[0]])[nodes[1]], 20.0)
+        self.assertIs(closed.indices, self.network.indices)
+
+    def test_nearest_nodes_matches_brute_force(self):
+        """Grid snapping finds the same node as a full scan."""
+        rng = np.random.default_rng(1)
+        points = rng.random((500, 2)) * 1000
+        network = RoadNetwork.from_polylines([[tuple(a), tuple(b)] for a, b in zip(points[:-1], points[1:])])
+        queries = rng.random((200, 2)) * 1200 - 100
+        nodes, _ = network.nearest_nodes(queries)
+        expected = np.argmin(np.hypot(
+            network.node_xy[None, :, 0] - queries[:, None, 0],
+            network.node_xy[None, :, 1] - queries[:, None, 1]), axis=1)
+        self.assertTrue((nodes == expected).all())
+
+    def test_snap_matches_brute_force(self):
+        """Bulk snapping finds the nearest edge, including for far points."""
+        rng = np.random.default_rng(3)
+        points = rng.random((300, 2)) * 1000
+        network = RoadNetwork.from_polylines([[tuple(a), tuple(b)] for a, b in zip(points[:-1], points[1:])])
+        queries = rng.random((500, 2)) * 1400 - 200
+        nodes, distances, edges, offsets = network.snap(queries)
+        a = network.node_xy[network.edge_from]
+        ab = network.node_xy[network.edge_to] - a
+        t = np.clip(((queries[:, None, :] - a) * ab).sum(axis=2) / (ab ** 2).sum(axis=1), 0, 1)
+        gaps = queries[:, None, :] - (a + t[..., None] * ab)
+        expected = np.hypot(gaps[..., 0], gaps[..., 1]).min(axis=1)
+        self.assertTrue(np.allclose(distances, expected))
+        self.assertTrue(((offsets >= 0) & (offsets <= network.edge_length[edges])).all())
+        self.assertTrue(np.isin(nodes, np.stack([network.edge_from[edges], network.edge_to[edges]])).all())
+
+    def test_costs_along(self):
+        """Points part way along an edge are reached from the cheaper end."""
+        start = self.network.nearest_nodes(np.array([[0.0, 0.0]]))[0][0]
+        node_costs = self.network.shortest_costs([start])
+        _, _, edges, offsets = self.network.snap(np.array([[4.0, 3.0], [10.0, 7.0]]))
+        fractions = offsets / self.network.edge_length[edges]
+        self.assertTrue(np.allclose(self.network.costs_along(node_costs, edges, fractions), [4.0, 17.0]))
+
+    def test_components(self):
+        """Connected components split where no road joins, and closed edges cut them."""
+        components = self.network.components()
+        node = {tuple(xy): i for i, xy in enumerate(self.network.node_xy.tolist())}
+        self.assertEqual(len(set(components.tolist())), 2)
+        self.assertEqual(components[node[(0.0, 0.0)]], components[node[(10.0, 10.0)]])
+        self.assertNotEqual(components[node[(0.0, 0.0)]], components[node[(50.0, 50.0)]])
+
+        lengths = self.network.edge_length.copy()
+        lengths[(self.network.edge_from == node[(10.0, 0.0)]) & (self.network.edge_to == node[(10.0, 10.0)])] = math.inf
+        closed = self.network.with_edge_lengths(lengths).components()
+        self.assertEqual(len(set(closed.tolist())), 3)
+        self.assertEqual(len(set(self.network.components().tolist())), 2)
+
+    def test_cancelled_build(self):
+        """A build cancelled part way returns no graph rather than a truncated one."""
+
+        class Feedback:
+            def __init__(self):
+                self.checks = 0
+
+            def isCanceled(self):
+                self.checks += 1
+                return self.checks > 1
+
+        class Line:
+            def geometry(self):
+                return None
+
+        class Layer:
+            def crs(self):
+                return self
+
+            def getFeatures(self, request):
+                return iter([Line(), Line(), Line()])
+
+        feedback = Feedback()
+        self.assertIsNone(network_from_layer(Layer(), feedback))
+        self.assertEqual(feedback.checks, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
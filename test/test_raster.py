@@ -0,0 +1,115 @@
+# coding=utf-8
+"""Tests for sampling hazard rasters at the addresses.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'Darren Green'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2025 by Darren Green'
+
+import os
+import unittest
+
+import numpy as np
+
+from ..door_knock_raster import block_array, pixel_window, sample_grid, split_window
+
+RASTER_PATH = os.path.join(os.path.dirname(__file__), 'tenbytenraster.asc')
+
+
+class RasterSamplingTest(unittest.TestCase):
+    """Test the pixel window and the vectorised lookup on the sample raster."""
+
+    def setUp(self):
+        """Runs before each test."""
+        with open(RASTER_PATH) as f:
+            lines = f.read().splitlines()
+        header = {}
+        for line in lines:
+            key, value = line.split()[:2]
+            if not key[0].isalpha():
+                break
+            header[key] = value
+        self.values = np.loadtxt(RASTER_PATH, skiprows=len(header), max_rows=int(header['NROWS']))
+        self.values[self.values == float(header['NODATA_VALUE'])] = np.nan
+        size = float(header['DX'])
+        xmin = float(header['XLLCENTER']) - size / 2
+        ymin = float(header['YLLCENTER']) - size / 2
+        self.extent = (xmin, ymin, xmin + size * self.values.shape[1], ymin + size * self.values.shape[0])
+        self.pixel_size = (size, size)
+
+    def test_sample_grid(self):
+        """Every point samples the pixel it falls in; points outside are NaN."""
+        xmin, ymin, xmax, ymax = self.extent
+        xy = [[xmin + 1, ymax - 1], [xmin + 35, ymin + 42], [xmax - 0.5, ymin + 0.5], [xmin - 1, ymin + 5], [xmax + 20, ymax]]
+        sampled = sample_grid(self.values, (xmin, ymax), self.pixel_size, xy)
+        self.assertEqual(sampled[:3].tolist(), [0.0, 3.0, 9.0])
+        self.assertTrue(np.isnan(sampled[3:]).all())
+
+    def test_window_matches_whole_raster(self):
+        """Sampling the window under the points gives the same values as the whole raster."""
+        xmin, ymin, xmax, ymax = self.extent
+        rng = np.random.default_rng(3)
+        xy = np.column_stack([rng.uniform(xmin + 22, xmin + 68, 200), rng.uniform(ymin + 11, ymin + 47, 200)])
+        col0, row0, col1, row1 = pixel_window(self.extent, self.pixel_size, (10, 10), (*xy.min(axis=0), *xy.max(axis=0)))
+        self.assertEqual((col0, row0, col1, row1), (2, 5, 7, 9))
+        window = self.values[row0:row1, col0:col1]
+        origin = (xmin + col0 * self.pixel_size[0], ymax - row0 * self.pixel_size[1])
+        np.testing.assert_array_equal(
+            sample_grid(window, origin, self.pixel_size, xy), sample_grid(self.values, (xmin, ymax), self.pixel_size, xy)
+        )
+        self.assertIsNone(pixel_window(self.extent, self.pixel_size, (10, 10), (xmax + 1, ymin, xmax + 5, ymax)))
+
+    def test_split_window(self):
+        """Above the pixel budget only small windows around the points are read."""
+        xmin, ymin, xmax, ymax = self.extent
+        rng = np.random.default_rng(5)
+        xy = np.column_stack([rng.uniform(xmin, xmin + 30, 20), rng.uniform(ymin + 60, ymax, 20)])
+        xy = np.vstack([xy, [[xmax - 5, ymin + 5]]])
+        window = pixel_window(self.extent, self.pixel_size, (10, 10), (*xy.min(axis=0), *xy.max(axis=0)))
+        self.assertEqual(list(split_window(self.extent, self.pixel_size, (10, 10), window, xy, 100))[0][0], window)
+        parts = list(split_window(self.extent, self.pixel_size, (10, 10), window, xy, 12))
+        self.assertEqual(sorted(np.concatenate([points for _, points in parts]).tolist()), list(range(len(xy))))
+        sampled = np.full(len(xy), np.nan)
+        for (col0, row0, col1, row1), points in parts:
+            self.assertLessEqual((col1 - col0) * (row1 - row0), 12)
+            origin = (xmin + col0 * self.pixel_size[0], ymax - row0 * self.pixel_size[1])
+            sampled[points] = sample_grid(self.values[row0:row1, col0:col1], origin, self.pixel_size, xy[points])
+        self.assertLess(sum((c1 - c0) * (r1 - r0) for (c0, r0, c1, r1), _ in parts), 50)
+        np.testing.assert_array_equal(sampled, sample_grid(self.values, (xmin, ymax), self.pixel_size, xy))
+
+    def test_block_array(self):
+        """A raster block's bytes become floats with no-data as NaN."""
+
+        class Block:
+            def data(self):
+                return np.array([[1.5, -9999], [0, 4]], dtype=np.float32).tobytes()
+
+            def dataType(self):
+                return 6
+
+            def width(self):
+                return 2
+
+            def height(self):
+                return 2
+
+            def hasNoDataValue(self):
+                return True
+
+            def noDataValue(self):
+                return -9999.0
+
+        values = block_array(Block())
+        self.assertEqual(values.shape, (2, 2))
+        self.assertEqual(values[0, 0], 1.5)
+        self.assertTrue(np.isnan(values[0, 1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
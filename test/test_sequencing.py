@@ -0,0 +1,133 @@
+# coding=utf-8
+"""Tests for sequencing crew tours.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'Darren Green'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2025 by Darren Green'
+
+import math
+import unittest
+
+import numpy as np
+
+from ..door_knock_network import RoadNetwork
+from ..door_knock_sequencing import (
+    crew_tour, hilbert_order, nearest_neighbour, or_opt, priority_tiers, straight_line_tour, two_opt, windowed_two_opt
+)
+
+
+class SequencingTest(unittest.TestCase):
+    """Test bounded searches, 2-opt and crew tours."""
+
+    def setUp(self):
+        """Runs before each test."""
+        # A 5 x 5 street grid with 10 m blocks.
+        lines = [[(x, y) for x in range(0, 50, 10)] for y in range(0, 50, 10)]
+        lines += [[(x, y) for y in range(0, 50, 10)] for x in range(0, 50, 10)]
+        self.network = RoadNetwork.from_polylines(lines)
+
+    def test_one_to_many_matches_full_search(self):
+        """Bounded searches agree with a full search for the targets they reach."""
+        nodes, _ = self.network.nearest_nodes(np.array([[0.0, 0.0], [40.0, 40.0], [20.0, 10.0]]))
+        full = self.network.shortest_costs([nodes[0]])
+        self.assertEqual(list(self.network.one_to_many(nodes[0], nodes[1:])), list(full[nodes[1:]]))
+        bounded = self.network.one_to_many(nodes[0], nodes[1:], max_cost=50.0)
+        self.assertTrue(math.isinf(bounded[0]))
+        self.assertEqual(bounded[1], 30.0)
+
+    def test_two_opt_removes_crossing(self):
+        """2-opt untangles a path that doubles back."""
+        xy = np.array([[0, 0], [1, 0], [3, 0], [2, 0], [4, 0]], dtype=float)
+        matrix = np.abs(xy[:, None, 0] - xy[None, :, 0])
+        path = two_opt(matrix, np.arange(5))
+        self.assertEqual(list(path), [0, 1, 3, 2, 4])
+        self.assertEqual(list(nearest_neighbour(matrix)), [0, 1, 3, 2, 4])
+
+    def test_crew_tour(self):
+        """Tours start at the depot, accumulate cost and leave unreachable stops last."""
+        xy = np.array([[40.0, 0.0], [10.0, 0.0], [30.0, 0.0], [20.0, 0.0]])
+        nodes, _ = self.network.nearest_nodes(xy)
+        start = self.network.shortest_costs([self.network.nearest_nodes(np.array([[0.0, 0.0]]))[0][0]])[nodes]
+        start[2] = math.inf
+        order, costs = crew_tour(self.network, nodes, start, xy)
+        self.assertEqual(list(order), [1, 3, 0, 2])
+        self.assertEqual(list(costs[:3]), [10.0, 20.0, 40.0])
+        self.assertTrue(math.isinf(costs[3]))
+
+    def test_hilbert_order_keeps_neighbours_together(self):
+        """Consecutive points along the curve are adjacent grid cells."""
+        xy = np.array([(x, y) for x in range(8) for y in range(8)], dtype=float)
+        steps = np.abs(np.diff(xy[hilbert_order(xy)], axis=0)).sum(axis=1)
+        self.assertTrue(np.all(steps == 1))
+
+    def test_windowed_two_opt_matches_two_opt(self):
+        """On a short path the windowed 2-opt untangles the same crossing."""
+        xy = np.array([[0, 0], [1, 0], [3, 0], [2, 0], [4, 0]], dtype=float)
+        self.assertEqual(list(windowed_two_opt(xy, np.arange(5))), [0, 1, 3, 2, 4])
+
+    def test_straight_line_tour(self):
+        """Straight-line tours visit every stop once and measure distance from the start."""
+        xy = np.array([[30.0, 0.0], [10.0, 0.0], [40.0, 0.0], [20.0, 0.0]])
+        order, costs = straight_line_tour([0.0, 0.0], xy)
+        self.assertEqual(list(order), [1, 3, 0, 2])
+        self.assertEqual(list(costs), [10.0, 20.0, 30.0, 40.0])
+
+        rng = np.random.default_rng(1)
+        xy = rng.random((500, 2)) * 1000
+        order, costs = straight_line_tour([0.0, 0.0], xy)
+        self.assertEqual(sorted(order.tolist()), list(range(500)))
+        self.assertTrue(np.all(np.diff(costs) >= 0))
+
+    def test_priority_tiers(self):
+        """Distinct positive priorities become evenly spaced tiers; the rest are 0."""
+        self.assertEqual(priority_tiers([np.nan, 0, 3, 1, 3, -2]).tolist(), [0.0, 0.0, 1.0, 0.5, 1.0, 0.0])
+
+    def test_or_opt_moves_priority_forward(self):
+        """Or-opt moves an urgent stop forward only when the penalty outweighs the detour."""
+        xy = np.array([[0, 0], [1, 0], [2, 0], [3, 0], [4, 0], [5, 0]], dtype=float)
+        matrix = np.abs(xy[:, None, 0] - xy[None, :, 0])
+        priority = np.array([0, 0, 0, 0, 0, 1.0])
+        path, moved = or_opt(matrix, np.arange(6), priority, 0.1)
+        self.assertFalse(moved)
+        self.assertEqual(path.tolist(), list(range(6)))
+        path, moved = or_opt(matrix, np.arange(6), priority, 5.0)
+        self.assertTrue(moved)
+        self.assertEqual(path[1], 5)
+        self.assertEqual(sorted(path.tolist()), list(range(6)))
+
+    def test_priority_tours_stay_efficient(self):
+        """Urgent stops come much earlier at a modest cost in tour length."""
+        rng = np.random.default_rng(1)
+        xy = rng.uniform(0, 1000, (80, 2))
+        nodes = np.arange(80)
+        network = RoadNetwork(xy, np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0))
+        priority = np.zeros(80)
+        priority[rng.choice(80, 8, replace=False)] = 1.0
+        start = np.hypot(*(xy - 500.0).T)
+        order, _ = straight_line_tour([500.0, 500.0], xy, priority)
+        self.assertEqual(sorted(order.tolist()), list(range(80)))
+
+        # Complete straight-line legs stand in for the road network here.
+        network.cost_matrix = lambda n, max_cost=math.inf: np.hypot(*(xy[n][:, None] - xy[n][None]).transpose(2, 0, 1))
+        plain, plain_costs = crew_tour(network, nodes, start, xy)
+        order, costs = crew_tour(network, nodes, start, xy, priority=priority)
+        self.assertEqual(sorted(order.tolist()), list(range(80)))
+        rank = {stop: position for position, stop in enumerate(order.tolist())}
+        plain_rank = {stop: position for position, stop in enumerate(plain.tolist())}
+        urgent = np.flatnonzero(priority).tolist()
+        self.assertLess(np.mean([rank[s] for s in urgent]), np.mean([plain_rank[s] for s in urgent]) / 2)
+        self.assertLess(costs[-1], plain_costs[-1] * 1.5)
+        by_priority = np.argsort(-priority, kind='stable')
+        sorted_length = start[by_priority[0]] + np.hypot(*np.diff(xy[by_priority], axis=0).T).sum()
+        self.assertLess(costs[-1], sorted_length)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+# coding=utf-8
+"""Tests for the local planning service.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'Darren Green'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2025 by Darren Green'
+
+import unittest
+
+import numpy as np
+
+from ..door_knock_network import RoadNetwork
+from ..door_knock_service import PlanningService
+
+
+class PlanningServiceTest(unittest.TestCase):
+    """Test incremental re-planning on an in-memory plan."""
+
+    def setUp(self):
+        """Runs before each test."""
+        # A straight road from the depot at 0 with an address every 10 m.
+        network = RoadNetwork.from_polylines([[(x, 0) for x in range(0, 70, 10)]])
+        address_xy = np.array([[x, 0] for x in range(10, 70, 10)], dtype=float)
+        address_nodes, _ = network.nearest_nodes(address_xy)
+        depot_nodes, _ = network.nearest_nodes(np.array([[0.0, 0.0]]))
+        self.service = PlanningService(
+            network, depot_nodes, ['a', 'b', 'c', 'd', 'e', 'f'], address_nodes, address_xy,
+            [2, 1, 2, 1, 2, 1], {1: 0, 2: 0}
+        )
+
+    def test_tours_are_ordered_by_cost(self):
+        """Each crew visits its addresses nearest first."""
+        tour = self.service.tour(1)
+        self.assertEqual([v['id'] for v in tour['visits']], ['b', 'd', 'f'])
+        self.assertEqual(tour['crew_cost'], 60.0)
+
+    def test_resequence_excludes_addresses(self):
+        """Excluded addresses leave the tour and become unassigned."""
+        result = self.service.resequence(1, ['f'])
+        self.assertEqual([v['id'] for v in result['tours'][0]['visits']], ['b', 'd'])
+        self.assertEqual(result['unassigned'], ['f'])
+
+    def test_reassign_returns_affected_crews(self):
+        """Both the losing and the gaining crew are returned."""
+        result = self.service.reassign(['a'], 1)
+        self.assertEqual([t['crew'] for t in result['tours']], [1, 2])
+        self.assertEqual([v['id'] for v in result['tours'][0]['visits']], ['a', 'b', 'd', 'f'])
+
+    def test_merge_status(self):
+        """Valid completions close addresses; incomplete ones are rejected."""
+        result = self.service.merge_status([
+            {'id': 'c', 'Outcome': 'Completed', 'Inquiry Date': '2025-10-01', 'Inquirer ID': '7', 'Inquirer Org': 'SES'},
+            {'id': 'e', 'Outcome': 'Completed'},
+            {'id': 'z', 'Outcome': 'Completed'},
+        ])
+        self.assertEqual([v['id'] for v in result['tours'][0]['visits']], ['a', 'e'])
+        self.assertEqual([r['id'] for r in result['rejected']], ['e', 'z'])
+
+    def test_unknown_crew(self):
+        """Requests for crews that are not in the plan are refused."""
+        with self.assertRaises(ValueError):
+            self.service.reassign(['a'], 9)
+
+    def test_crew_without_depot(self):
+        """A crew whose addresses have no depot is refused with a reason."""
+        service = PlanningService(
+            self.service.network, self.service.depot_nodes, self.service.address_ids, self.service.address_nodes,
+            self.service.address_metres, [2, 1, 2, 1, 2, 1], {1: 0, 2: None}
+        )
+        self.assertEqual([t['crew'] for t in service.tours()], [1])
+        with self.assertRaisesRegex(ValueError, 'without a depot_id'):
+            service.resequence(2, ['a'])
+
+    def test_plan_order_is_kept(self):
+        """The planner's visit order is kept and only joining legs change."""
+        service = PlanningService(
+            self.service.network, self.service.depot_nodes, self.service.address_ids, self.service.address_nodes,
+            self.service.address_metres, [1, 1, 1, 1, 1, 1], {1: 0},
+            address_order=[5, 0, 1, 2, 3, 4]
+        )
+        tour = service.tour(1)
+        self.assertEqual([v['id'] for v in tour['visits']], ['b', 'c', 'd', 'e', 'f', 'a'])
+        result = service.resequence(1, ['c', 'a'])
+        visits = result['tours'][0]['visits']
+        self.assertEqual([v['id'] for v in visits], ['b', 'd', 'e', 'f'])
+        self.assertEqual([v['cost'] for v in visits], [20.0, 40.0, 50.0, 60.0])
+
+    def test_reassign_inserts_cheapest(self):
+        """A moved address goes where it adds the least travel."""
+        service = PlanningService(
+            self.service.network, self.service.depot_nodes, self.service.address_ids, self.service.address_nodes,
+            self.service.address_metres, [1, 2, 1, 1, 2, 1], {1: 0, 2: 0},
+            address_order=[0, 0, 1, 2, 1, 3]
+        )
+        result = service.reassign(['b'], 1)
+        self.assertEqual([v['id'] for v in result['tours'][0]['visits']], ['a', 'b', 'c', 'd', 'f'])
+
+    def test_street_blocks(self):
+        """Each street block is walked whole, from its nearer end."""
+        service = PlanningService(
+            self.service.network, self.service.depot_nodes, self.service.address_ids, self.service.address_nodes,
+            self.service.address_metres, [1, 1, 1, 1, 1, 1], {1: 0},
+            address_block=[1, 0, 1, 0, 1, 0], address_position=[10, 20, 30, 40, 50, 60]
+        )
+        self.assertEqual([v['id'] for v in service.tour(1)['visits']], ['a', 'c', 'e', 'f', 'd', 'b'])
+
+    def test_string_ids_match_numeric_ids(self):
+        """Ids posted as text find addresses in a numeric ID field, as in the tracker."""
+        service = PlanningService(
+            self.service.network, self.service.depot_nodes, [101, 102, 103, 104, 105, 106], self.service.address_nodes,
+            self.service.address_metres, [2, 1, 2, 1, 2, 1], {1: 0, 2: 0}
+        )
+        result = service.reassign(['101', '0103'], 1)
+        self.assertEqual([v['id'] for v in result['tours'][0]['visits']], [101, 102, 103, 104, 106])
+        result = service.merge_status([{'id': '105.0', 'Outcome': 'Completed', 'Inquiry Date': '2025-10-01',
+                                        'Inquirer ID': '7', 'Inquirer Org': 'SES'}])
+        self.assertEqual(result['tours'][0]['visits'], [])
+        self.assertEqual(result['rejected'], [])
+        with self.assertRaisesRegex(ValueError, "'107'"):
+            service.resequence(1, ['107'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+# coding=utf-8
+"""Tests for the field operation simulator.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'Darren Green'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2025 by Darren Green'
+
+import csv
+import datetime
+import json
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from ..door_knock_simulator import (
+    SIMULATION_DEFAULTS, new_address_ids, read_simulation, simulate_returns, write_returns
+)
+
+SHIFT_START = datetime.datetime(2026, 10, 19, 8)
+
+
+class SimulatorTest(unittest.TestCase):
+    """Test the simulated crew returns and the simulation settings."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+        self.config = dict(SIMULATION_DEFAULTS)
+        # Two crews of 100 doors, reached one every 6 minutes.
+        self.visits = [(crew * 1000 + n, crew, n * 6.0) for crew in (1, 2) for n in range(100)]
+
+    def test_read_simulation(self):
+        """Defaults fill in what the file leaves out; required settings are checked."""
+        path = os.path.join(self.folder, 'simulation.json')
+        with open(path, 'w') as f:
+            json.dump({'visit_points': 'plan.gpkg', 'unique_id': 'ID', 'planner': {'INPUT_NUM_CREWS': 2}, 'shifts': 3}, f)
+        config = read_simulation(path)
+        self.assertEqual(config['shifts'], 3)
+        self.assertEqual(config['outcomes'], SIMULATION_DEFAULTS['outcomes'])
+        with open(path, 'w') as f:
+            json.dump({'visit_points': 'plan.gpkg', 'planner': {}}, f)
+        with self.assertRaises(ValueError):
+            read_simulation(path)
+
+    def test_doors_within_the_shift(self):
+        """Crews report only the doors they reach within the shift."""
+        returns, lost = simulate_returns(self.visits, self.config, random.Random(1), SHIFT_START)
+        self.assertEqual(lost, [])
+        self.assertEqual(sorted(returns), [1, 2])
+        self.assertEqual([len(records) for records in returns.values()], [81, 81])
+        self.assertEqual(returns[1][10]['Inquiry Date'], '2026-10-19T09:00:00')
+
+    def test_outcomes_and_missing_data(self):
+        """Outcomes follow their shares and completed records lose fields at the missing rates."""
+        config = dict(self.config, shift_minutes=0, outcomes={'Completed': 3, 'No Person/s home': 1},
+                      missing_rates={'Inquirer ID': 0.5})
+        visits = [(n, 1 + n % 10, 1.0) for n in range(4000)]
+        returns, _ = simulate_returns(visits, config, random.Random(2), SHIFT_START)
+        records = [record for crew in returns.values() for record in crew]
+        completed = [record for record in records if record['Outcome'] == 'Completed']
+        self.assertAlmostEqual(len(completed) / len(records), 0.75, delta=0.03)
+        self.assertAlmostEqual(sum(not r['Inquirer ID'] for r in completed) / len(completed), 0.5, delta=0.04)
+        self.assertTrue(all(r['Inquirer ID'] for r in records if r['Outcome'] != 'Completed'))
+
+    def test_lost_returns(self):
+        """A lost crew return leaves out every record of that crew."""
+        returns, lost = simulate_returns(self.visits, dict(self.config, lost_return_rate=1.0), random.Random(1), SHIFT_START)
+        self.assertEqual((returns, lost), ({}, [1, 2]))
+
+    def test_same_seed_same_returns(self):
+        """A seeded run gives the same returns every time."""
+        first = simulate_returns(self.visits, self.config, random.Random(5), SHIFT_START)
+        self.assertEqual(first, simulate_returns(self.visits, self.config, random.Random(5), SHIFT_START))
+
+    def test_new_address_ids(self):
+        """New ids never clash with existing ones."""
+        self.assertEqual(new_address_ids([3, 17.0, None], 2, 1, True), [18, 19])
+        self.assertEqual(new_address_ids(['SIM-02-00001', 'A'], 2, 2, False), ['SIM-02-00002', 'SIM-02-00003'])
+
+    def test_write_returns(self):
+        """Each crew gets a CSV with the tracker's columns."""
+        returns, _ = simulate_returns(self.visits[:3], self.config, random.Random(1), SHIFT_START)
+        paths = write_returns(self.folder, returns, 'ID')
+        self.assertEqual([os.path.basename(p) for p in paths], ['crew_01.csv'])
+        with open(paths[0], newline='') as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual([row['ID'] for row in rows], ['1000', '1001', '1002'])
+        self.assertEqual(set(rows[0]), {'ID', 'crew_id', 'Outcome', 'Inquiry Date', 'Inquirer ID', 'Inquirer Org', 'Notes'})
+        self.assertEqual(len(write_returns(os.path.join(self.folder, 'empty'), {}, 'ID')), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+# coding=utf-8
+"""Tests for the travel-time weights used by fastest routing.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'Darren Green'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2025 by Darren Green'
+
+import math
+import unittest
+
+import numpy as np
+
+from ..door_knock_network import RoadNetwork
+from ..door_knock_speeds import average_metres_per_minute, edge_speeds, parse_speed_lookup, travel_minutes
+
+
+class SpeedsTest(unittest.TestCase):
+    """Test the speed lookup and the minutes per edge."""
+
+    def setUp(self):
+        """Runs before each test."""
+        # A 1 km highway (feature 7) and a 1 km lane (feature 8) in parallel.
+        self.network = RoadNetwork.from_polylines([
+            [(0, 0), (500, 0), (1000, 0)],
+            [(0, 0), (500, 300), (1000, 0)],
+        ], line_ids=[7, 8])
+
+    def test_parse_speed_lookup(self):
+        """Classes are matched case-insensitively and bad entries are rejected."""
+        self.assertEqual(parse_speed_lookup('Motorway=100; residential = 40\nfootway=0,'),
+                         {'motorway': 100.0, 'residential': 40.0, 'footway': 0.0})
+        self.assertEqual(parse_speed_lookup(''), {})
+        with self.assertRaises(ValueError):
+            parse_speed_lookup('motorway')
+
+    def test_edges_keep_their_feature(self):
+        """Every edge knows the road feature it came from."""
+        self.assertEqual(sorted(self.network.edge_feature.tolist()), [7, 7, 8, 8])
+        sub, _ = self.network.subgraph(self.network.node_xy[:, 1] == 0)
+        self.assertEqual(sub.edge_feature.tolist(), [7, 7])
+
+    def test_edge_speeds(self):
+        """Classes use the lookup, numbers are speeds and anything else the default."""
+        lookup = {'highway': 100.0}
+        speeds = edge_speeds(self.network, {7: 'Highway', 8: '30'}, lookup, 50.0)
+        self.assertEqual(speeds[self.network.edge_feature == 7].tolist(), [100.0, 100.0])
+        self.assertEqual(speeds[self.network.edge_feature == 8].tolist(), [30.0, 30.0])
+        speeds = edge_speeds(self.network, {7: 'gravel', 8: None}, lookup, 50.0)
+        self.assertEqual(speeds.tolist(), [50.0] * 4)
+
+    def test_fastest_route_prefers_faster_roads(self):
+        """Travel-time weights change the best route and give minutes."""
+        speeds = edge_speeds(self.network, {7: 'lane', 8: 'highway'}, {'lane': 10.0, 'highway': 100.0}, 50.0)
+        minutes = travel_minutes(self.network.edge_length, speeds)
+        timed = self.network.with_edge_lengths(minutes)
+        start = int(np.flatnonzero((self.network.node_xy == [0, 0]).all(axis=1))[0])
+        end = int(np.flatnonzero((self.network.node_xy == [1000, 0]).all(axis=1))[0])
+        self.assertAlmostEqual(self.network.shortest_costs([start])[end], 1000.0)
+        lane_length = 2 * math.hypot(500, 300)
+        self.assertAlmostEqual(timed.shortest_costs([start])[end], lane_length / (100 * 1000 / 60))
+        self.assertGreater(average_metres_per_minute(self.network.edge_length, minutes), 10 * 1000 / 60)
+
+    def test_unusable_roads(self):
+        """Roads with a speed of 0 cannot be travelled."""
+        minutes = travel_minutes(np.array([100.0, 100.0]), np.array([0.0, 6.0]))
+        self.assertTrue(math.isinf(minutes[0]))
+        self.assertAlmostEqual(minutes[1], 1.0)
+        self.assertIsNone(average_metres_per_minute(np.array([100.0]), np.array([math.inf])))
+
+
+if __name__ == '__main__':
+    unittest.main()
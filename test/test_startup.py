@@ -0,0 +1,66 @@
+# coding=utf-8
+"""Tests that registering the Processing provider does not load the planning engine.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'Darren Green'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2025 by Darren Green'
+
+import os
+import subprocess
+import sys
+import unittest
+
+ENGINE_MODULES = (
+    'numpy', 'scipy', 'door_knock_address_store', 'door_knock_addresses', 'door_knock_balancing', 'door_knock_blocks',
+    'door_knock_closures', 'door_knock_clustering', 'door_knock_crs', 'door_knock_duplicates', 'door_knock_hierarchy',
+    'door_knock_network', 'door_knock_raster', 'door_knock_sequencing', 'door_knock_speeds', 'door_knock_tiling',
+    'door_knock_validation'
+)
+
+PLUGIN_PACKAGE = __package__.rsplit('.', 1)[0]
+PLUGIN_PARENT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+IMPORT_SCRIPT = f"""
+import sys
+import time
+import qgis.core
+before = set(sys.modules)
+started = time.perf_counter()
+import {PLUGIN_PACKAGE}
+plugin = {PLUGIN_PACKAGE}.classFactory(None)
+from {PLUGIN_PACKAGE}.door_knock_planner_provider import doorknockplannerProvider
+from {PLUGIN_PACKAGE} import door_knock_pipeline_algorithm, door_knock_planner_algorithm, door_knock_tracker_algorithm
+from {PLUGIN_PACKAGE} import door_knock_address_store_algorithm
+print(time.perf_counter() - started)
+print(' '.join(sorted(set(sys.modules) - before)))
+"""
+
+
+class StartupTest(unittest.TestCase):
+    """Test the cost of loading the plugin's algorithms."""
+
+    def run_import(self):
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [PLUGIN_PARENT, env.get('PYTHONPATH')]))
+        result = subprocess.run([sys.executable, '-c', IMPORT_SCRIPT], env=env, capture_output=True, text=True, check=True)
+        elapsed, modules = result.stdout.strip().split('\n')
+        return float(elapsed), modules.split()
+
+    def test_engine_not_imported(self):
+        """Loading the plugin and its algorithms does not import NumPy, SciPy or the planning engine."""
+        elapsed, modules = self.run_import()
+        # The time depends on the machine, so it is reported, not checked.
+        sys.stderr.write(f"Plugin and algorithm modules imported in {elapsed:.3f} s.\n")
+        loaded = [name for name in modules if name.split('.')[0] in ENGINE_MODULES or name.rsplit('.', 1)[-1] in ENGINE_MODULES]
+        self.assertEqual(loaded, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+# coding=utf-8
+"""Tests for splitting large areas into tiles and sharing crews.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'Darren Green'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2025 by Darren Green'
+
+import unittest
+
+import numpy as np
+
+from ..door_knock_tiling import allocate_crews, split_tiles
+
+
+class TilingTest(unittest.TestCase):
+    """Test the tile split and the crew allocation."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.xy = np.random.default_rng(3).uniform(0, 10000, (1000, 2))
+
+    def test_split_tiles(self):
+        """Tiles partition the points and stay under the size limit."""
+        tiles = split_tiles(self.xy, 300, 10)
+        self.assertEqual(len(tiles), 4)
+        self.assertEqual(sorted(np.concatenate(tiles).tolist()), list(range(1000)))
+        self.assertTrue(all(len(tile) <= 300 for tile in tiles))
+
+    def test_split_tiles_limits(self):
+        """The tile count limit wins; a small area stays one tile."""
+        self.assertEqual(len(split_tiles(self.xy, 10, 3)), 3)
+        self.assertEqual(len(split_tiles(self.xy, 5000, 10)), 1)
+
+    def test_split_tiles_weights(self):
+        """Weighted points are split by weight, not count."""
+        weights = np.where(self.xy[:, 0] < 5000, 9.0, 1.0)
+        tiles = split_tiles(self.xy, weights.sum() / 2, 2, weights)
+        self.assertEqual(len(tiles), 2)
+        self.assertAlmostEqual(weights[tiles[0]].sum(), weights[tiles[1]].sum(), delta=18.0)
+        self.assertNotAlmostEqual(len(tiles[0]), len(tiles[1]), delta=100)
+
+    def test_allocate_crews(self):
+        """Crews follow the workload; every tile gets one."""
+        self.assertEqual(allocate_crews([300, 100, 100], 5), [3, 1, 1])
+        self.assertEqual(allocate_crews([1000, 1], 3), [2, 1])
+        self.assertEqual(sum(allocate_crews([7, 5, 3, 2], 9)), 9)
+        self.assertEqual(allocate_crews([0, 0], 4), [2, 2])
+        with self.assertRaises(ValueError):
+            allocate_crews([1, 1, 1], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+# coding=utf-8
+"""Tests for the validation rules applied to crew returns.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'Darren Green'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2025 by Darren Green'
+
+import unittest
+
+import numpy as np
+
+from ..door_knock_fields import address_key
+from ..door_knock_validation import (
+    DEFAULT_RULES, compile_rules, evaluate, exception_rows, parse_date, record_columns, rule_fields
+)
+
+RETURNS = [
+    # id, Outcome, Inquiry Date, Inquirer ID, Inquirer Org
+    ('1', 'Completed', '2026-10-19T09:30:00', 'A1', 'SES'),
+    ('2', 'completed ', '2026-10-19 10:00', '', 'SES'),
+    ('3', 'No Person/s home', '', '', ''),
+    ('1', 'Completed', '19/10/2026', 'A2', 'SES'),
+    ('4', 'Completed', 'yesterday', 'A3', 'SES'),
+    ('5', 'Gone fishing', '2026-10-19', 'A4', 'SES'),
+]
+
+
+def columns(records=RETURNS):
+    ids, outcomes, dates, inquirers, orgs = zip(*records)
+    values = {'Outcome': outcomes, 'Inquiry Date': dates, 'Inquirer ID': inquirers, 'Inquirer Org': orgs}
+    return record_columns(values, ids, ['shift_1'] * len(records), range(1, len(records) + 1))
+
+
+class ValidationTest(unittest.TestCase):
+    """Test rule compilation, the column checks and the report rows."""
+
+    def test_parse_date(self):
+        """ISO dates, QField times and day-first dates parse; words do not."""
+        self.assertEqual(parse_date('2026-10-19T09:30:00Z').hour, 9)
+        self.assertEqual(parse_date('19/10/2026').month, 10)
+        self.assertIsNone(parse_date('yesterday'))
+
+    def test_default_rules(self):
+        """Without a rules file only completions missing data are reported and rejected."""
+        rules = compile_rules(DEFAULT_RULES)
+        self.assertEqual(rule_fields(rules), ['Inquiry Date', 'Inquirer ID', 'Inquirer Org', 'Outcome'])
+        cols = columns()
+        failures, rejected = evaluate(rules, cols)
+        self.assertEqual(rejected.tolist(), [False, True, False, False, False, False])
+        rows = list(exception_rows(rules, failures, cols))
+        self.assertEqual(rows, [['2', 'MISSING_DATA', "Marked 'Completed' but missing data in: Inquirer ID", 'shift_1', 2]])
+
+    def test_duplicate_keys(self):
+        """Repeats are matched on the address key, not the ID text."""
+        rules = compile_rules({'rules': [
+            {'code': 'DUPLICATE_VISIT', 'type': 'duplicate', 'fields': ['@id'], 'when': {'Outcome': ['Completed']}},
+        ]})
+        ids = ['00123', '123', '123.0', 'A7 ', 'a7']
+        values = {'Outcome': ['Completed'] * len(ids)}
+        numeric = record_columns(values, ids, ['shift_1'] * 5, range(1, 6), [address_key(i, True) for i in ids])
+        rows = list(exception_rows(rules, evaluate(rules, numeric)[0], numeric))
+        self.assertEqual([row[0] for row in rows], ['123', '123.0'])
+        self.assertEqual(rows[0][2], 'Already reported in shift_1 row 1')
+        text = record_columns(values, ids, ['shift_1'] * 5, range(1, 6), [address_key(i, False) for i in ids])
+        rows = list(exception_rows(rules, evaluate(rules, text)[0], text))
+        self.assertEqual([row[0] for row in rows], ['a7'])
+
+    def test_configured_rules(self):
+        """A record breaking several rules gets one row with every code."""
+        rules = compile_rules({'rules': [
+            {'code': 'BAD_OUTCOME', 'type': 'allowed', 'field': 'Outcome',
+             'values': ['Completed', 'No Person/s home'], 'reject': True},
+            {'code': 'OLD_DATE', 'type': 'date', 'field': 'Inquiry Date', 'min': '2026-10-19T10:00:00'},
+            {'code': 'NO_ORG', 'type': 'required', 'fields': ['Inquirer Org']},
+        ]})
+        cols = columns()
+        failures, rejected = evaluate(rules, cols)
+        self.assertEqual(np.flatnonzero(rejected).tolist(), [5])
+        rows = {row[0]: row for row in exception_rows(rules, failures, cols)}
+        self.assertEqual(sorted(rows), ['1', '3', '4', '5'])
+        self.assertEqual(rows['3'][1], 'NO_ORG')
+        self.assertEqual(rows['4'][1:3], ['OLD_DATE', "'Inquiry Date' is not a date: yesterday"])
+        self.assertEqual(rows['5'][1:3], [
+            'BAD_OUTCOME;OLD_DATE',
+            "'Outcome' value 'Gone fishing' is not allowed; 'Inquiry Date' 2026-10-19 is outside 2026-10-19T10:00:00 to ..."
+        ])
+
+    def test_bad_definition(self):
+        """Unknown rule types and missing settings are reported by code."""
+        with self.assertRaisesRegex(ValueError, 'X1'):
+            compile_rules({'rules': [{'code': 'X1', 'type': 'regex'}]})
+        with self.assertRaisesRegex(ValueError, 'RULE_1 needs'):
+            compile_rules({'rules': [{'type': 'allowed', 'field': 'Outcome'}]})
+
+    def test_many_records(self):
+        """A large batch is checked in one pass and streamed in chunks."""
+        count = 50000
+        records = [(str(i % 40000), 'Completed', '2026-10-19', 'A' if i % 7 else '', 'SES') for i in range(count)]
+        rules = compile_rules(DEFAULT_RULES)
+        cols = columns(records)
+        failures, rejected = evaluate(rules, cols)
+        self.assertEqual(int(rejected.sum()), sum(1 for i in range(count) if not i % 7))
+        rows = exception_rows(rules, failures, cols)
+        self.assertEqual(sum(1 for _ in rows), int(rejected.sum()))
+
+
+if __name__ == '__main__':
+    unittest.main()